@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+主机实时能力测试启动脚本
+Host Real-time Capability Benchmark Launcher
+
+使用方法:
+python run_benchmark.py [--samples N] [--output-dir DIR]
+
+或者:
+python -m src.rt_benchmark
+"""
+
+import sys
+import os
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+def main():
+    """启动测试"""
+    try:
+        from src.rt_benchmark import main as run_main
+        run_main()
+    except ImportError as e:
+        print(f"导入错误: {e}")
+        print("请确保所有依赖包已安装")
+    except Exception as e:
+        print(f"程序运行错误: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == '__main__':
+    main()
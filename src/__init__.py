@@ -5,16 +5,68 @@ __version__ = "1.0.0"
 __author__ = "Laoda"
 
 from .timer import Timer
+from .tick_source import TickSource
+from .loop_profiler import StageProfiler
+from .experiment_clock import ExperimentClock
 from .pressure_sensor import PressureSensor
+from .fake_adc import FakeADS1015
+from .pressure_acquisition import PressureAcquisition
+from .pressure_array import PressureSensorArray
+from .pressure_filters import BoxcarFilter, MedianFilter, IIRFilter
+from .video_encoder import StreamingVideoEncoder
+from .raw_frame_ring import RawFrameRing
+from .frame_archive import FrameArchiveWriter, FrameArchiveReader
+from .frame_metadata import FrameMetadataLog
+from .frame_arena import FrameArena
+from .video_overlay import OverlayRenderer
+from .event_capture import EventTriggers, TriggeredFrameBuffer
+from .ball_detector import ContourBallDetector, ProfileBallDetector
+from .frame_backends import FrameBackend, create_backend
 from .frame_storage import FrameStorage
 from .pid_controller import PIDController, FuzzyPID
-from .camera_controller import CameraController
-from .experiment_runner import ExperimentRunner
 from .data_processor import DataProcessor
 
+# 依赖硬件驱动的模块（camera_controller需要mvsdk，experiment_runner需要rpi_hardware_pwm）在首次访问时才导入，
+# 使基准测试等子模块（python -m src.fake_adc等）在非树莓派环境下也能运行
+_HARDWARE_MODULES = {
+    'CameraController': '.camera_controller',
+    'ExperimentRunner': '.experiment_runner',
+}
+
+
+def __getattr__(name):
+    if name in _HARDWARE_MODULES:
+        import importlib
+        value = getattr(importlib.import_module(_HARDWARE_MODULES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     'Timer',
+    'TickSource',
+    'StageProfiler',
+    'ExperimentClock',
     'PressureSensor', 
+    'FakeADS1015',
+    'PressureAcquisition',
+    'PressureSensorArray',
+    'BoxcarFilter',
+    'MedianFilter',
+    'IIRFilter',
+    'StreamingVideoEncoder',
+    'RawFrameRing',
+    'FrameArchiveWriter',
+    'FrameArchiveReader',
+    'FrameMetadataLog',
+    'FrameArena',
+    'OverlayRenderer',
+    'EventTriggers',
+    'TriggeredFrameBuffer',
+    'ContourBallDetector',
+    'ProfileBallDetector',
+    'FrameBackend',
+    'create_backend',
     'FrameStorage',
     'PIDController',
     'FuzzyPID',
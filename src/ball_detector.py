@@ -0,0 +1,249 @@
+# coding=utf-8
+"""
+球位置检测器
+Ball detectors for the tracking strip
+
+ContourBallDetector为原有的连通区域+轮廓圆度检测；ProfileBallDetector把ROI条带压缩为一维列暗像素分布，
+画面明确时直接由分布计算亚像素质心，分布不明确时回退到轮廓检测
+
+精度和速度对比（在录制的帧上运行两种检测器）:
+python -m src.ball_detector raw_frames_YYYYMMDD_HHMMSS.npy
+python -m src.ball_detector frames_YYYYMMDD_HHMMSS.vfa
+"""
+import argparse
+import math
+import time
+import cv2
+import numpy as np
+
+DETECTION_ROI = (7, 220, 570, 43)  # 球位置检测区域(x, y, 宽, 高)，640x480坐标系
+
+
+class ContourBallDetector:
+    """连通区域+轮廓圆度检测（原CameraController中的检测流程）"""
+    def __init__(self, threshold=128, min_area=500, circularity_range=(0.40, 1.15)):
+        """
+        threshold: 反二值化阈值，不高于该值的像素视为球
+        min_area: 连通区域最小面积（像素），小于该面积的区域忽略
+        circularity_range: 圆度阈值范围
+        """
+        self.threshold = threshold
+        self.min_area = min_area
+        self.circularity_range = circularity_range
+
+    def __call__(self, roi):
+        """
+        检测ROI条带中的球
+        返回(是否检测到, 质心x, 质心y, 面积, 圆度)，坐标为ROI内坐标
+        """
+        # 反二值化
+        _, binary = cv2.threshold(roi, self.threshold, 255, cv2.THRESH_BINARY_INV)
+
+        # 移除小于min_area像素的连通区域
+        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary)
+
+        # 处理连通区域
+        result = (False, np.nan, np.nan, 0, 0.0)
+        low, high = self.circularity_range
+        for i in range(1, num_labels):
+            area = stats[i, cv2.CC_STAT_AREA]
+            if area >= self.min_area:
+                # 获取轮廓mask
+                contour_mask = (labels == i).astype(np.uint8) * 255
+
+                # 查找轮廓
+                contours, _ = cv2.findContours(contour_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                if contours:
+                    # 计算圆度过滤非圆形物体
+                    perimeter = cv2.arcLength(contours[0], True)
+                    if perimeter > 0:
+                        circularity = 4 * math.pi * area / (perimeter ** 2)
+                        if low < circularity < high:  # 圆度阈值范围
+                            result = (True, centroids[i][0], centroids[i][1], int(area), circularity)
+        return result
+
+
+class ProfileBallDetector:
+    """
+    列分布快速检测
+    ROI条带按阈值取暗像素后沿列求和得到一维分布，连续非零的列段即为可能的连通区域（每个连通区域必定落在一个列段内）。
+    只有一个面积不小于min_area的列段、其行范围连续、未贯穿条带上下边缘且宽高比和填充率接近圆时，
+    直接以该列段计算亚像素质心；其余情况（多个候选、形状不像球等）回退到ContourBallDetector。
+    快速路径返回的圆度为相对于外接椭圆的填充率
+    """
+    def __init__(self, threshold=128, min_area=500, circularity_range=(0.40, 1.15),
+                 aspect_range=(0.6, 1.6), fill_range=(0.65, 1.2)):
+        """
+        threshold/min_area/circularity_range: 同ContourBallDetector，也用于回退检测
+        aspect_range: 快速路径允许的宽高比范围
+        fill_range: 快速路径允许的填充率（面积/外接椭圆面积）范围
+        """
+        self.threshold = threshold
+        self.min_area = min_area
+        self.aspect_range = aspect_range
+        self.fill_range = fill_range
+        self.fallback = ContourBallDetector(threshold, min_area, circularity_range)
+        self.fast_count = 0  # 由列分布直接得到结果的帧数
+        self.fallback_count = 0  # 回退到轮廓检测的帧数
+
+    def __call__(self, roi):
+        """
+        检测ROI条带中的球
+        返回(是否检测到, 质心x, 质心y, 面积, 圆度)，坐标为ROI内坐标
+        """
+        mask = roi <= self.threshold
+        profile = mask.sum(axis=0, dtype=np.int32)
+
+        # 连续非零列段的起止位置
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], profile > 0, [0])).astype(np.int8)))
+        starts, ends = edges[0::2], edges[1::2]
+        if len(starts) == 0:
+            self.fast_count += 1
+            return (False, np.nan, np.nan, 0, 0.0)
+
+        cumulative = np.concatenate(([0], np.cumsum(profile)))
+        areas = cumulative[ends] - cumulative[starts]
+        candidates = np.flatnonzero(areas >= self.min_area)
+        if len(candidates) == 0:
+            # 所有连通区域都小于min_area，轮廓检测同样不会检测到
+            self.fast_count += 1
+            return (False, np.nan, np.nan, 0, 0.0)
+        if len(candidates) > 1:
+            return self._fall_back(roi)
+
+        k = candidates[0]
+        x0, x1 = starts[k], ends[k]
+        area = int(areas[k])
+        rows = mask[:, x0:x1].sum(axis=1, dtype=np.int32)
+        row_indices = np.flatnonzero(rows)
+        y0, y1 = row_indices[0], row_indices[-1] + 1
+        width, height = x1 - x0, y1 - y0
+
+        # 行范围不连续（可能有多个连通区域）或贯穿整个条带时回退
+        if len(row_indices) != height or height >= roi.shape[0]:
+            return self._fall_back(roi)
+        aspect = width / height
+        fill = area / (math.pi / 4 * width * height)
+        if not (self.aspect_range[0] <= aspect <= self.aspect_range[1] and
+                self.fill_range[0] <= fill <= self.fill_range[1]):
+            return self._fall_back(roi)
+
+        # 亚像素质心（像素中心坐标，与connectedComponentsWithStats一致）
+        columns = np.arange(x0, x1, dtype=np.float64)
+        cx = float(np.dot(columns, profile[x0:x1])) / area
+        cy = float(np.dot(np.arange(y0, y1, dtype=np.float64), rows[y0:y1])) / area
+        self.fast_count += 1
+        return (True, cx, cy, area, fill)
+
+    def _fall_back(self, roi):
+        self.fallback_count += 1
+        return self.fallback(roi)
+
+    def reset_stats(self):
+        self.fast_count = 0
+        self.fallback_count = 0
+
+
+def _load_frames(path, limit=None):
+    """读取录制的帧：原始帧/ROI条带.npy（FrameStorage 'raw'/'roi'模式）或帧归档.vfa"""
+    if path.endswith('.vfa'):
+        from .frame_archive import FrameArchiveReader
+        reader = FrameArchiveReader(path)
+        n = len(reader.timestamps) if limit is None else min(limit, len(reader.timestamps))
+        frames = [reader.decode(i) for i in range(n)]
+        reader.close()
+        return frames
+    frames = np.load(path, mmap_mode='r')
+    return frames[:limit] if limit is not None else frames
+
+
+def synthetic_frames(count=500, frame_shape=(480, 640), roi=DETECTION_ROI):
+    """带噪声的背景加一个沿ROI移动的暗圆（无录制数据时使用）"""
+    rng = np.random.default_rng(0)
+    roi_x, roi_y, roi_width, roi_height = roi
+    frames = []
+    for i in range(count):
+        frame = rng.integers(150, 220, size=frame_shape, dtype=np.uint8)
+        x = roi_x + 20 + (i * 0.73) % (roi_width - 40)
+        center = (int(round(x * 16)), int(round((roi_y + roi_height / 2) * 16)))
+        cv2.circle(frame, center, 14 * 16, 30, -1, cv2.LINE_AA, shift=4)
+        frames.append(frame)
+    return frames
+
+
+def benchmark_detectors(frames, roi=DETECTION_ROI, repeats=3):
+    """
+    在同一组帧上比较两种检测器
+    frames: 完整帧或已裁剪的ROI条带（尺寸等于ROI时直接使用）
+    返回: 检测一致性、质心偏差（像素）、回退比例和每帧耗时（微秒）
+    """
+    roi_x, roi_y, roi_width, roi_height = roi
+    strips = []
+    for frame in frames:
+        if frame.shape == (roi_height, roi_width):
+            strips.append(np.ascontiguousarray(frame))
+        else:
+            strips.append(np.ascontiguousarray(frame[roi_y:roi_y+roi_height, roi_x:roi_x+roi_width]))
+
+    contour = ContourBallDetector()
+    profile = ProfileBallDetector()
+    reference = [contour(strip) for strip in strips]
+    results = [profile(strip) for strip in strips]
+    fallback_rate = profile.fallback_count / len(strips)
+
+    # 每帧耗时取多次重复中的最小值，减少调度抖动的影响
+    timings = {}
+    for name, detector in (('contour', contour), ('profile', profile)):
+        best = np.full(len(strips), np.inf)
+        for _ in range(repeats):
+            for i, strip in enumerate(strips):
+                t0 = time.perf_counter_ns()
+                detector(strip)
+                best[i] = min(best[i], time.perf_counter_ns() - t0)
+        best *= 1e-3
+        timings[name] = {'p50_us': float(np.percentile(best, 50)),
+                         'p99_us': float(np.percentile(best, 99)),
+                         'mean_us': float(np.mean(best))}
+
+    found_ref = np.array([r[0] for r in reference])
+    found_new = np.array([r[0] for r in results])
+    both = found_ref & found_new
+    dx = np.array([results[i][1] - reference[i][1] for i in np.flatnonzero(both)])
+    dy = np.array([results[i][2] - reference[i][2] for i in np.flatnonzero(both)])
+    return {
+        'frames': len(strips),
+        'found_contour': int(np.sum(found_ref)),
+        'found_profile': int(np.sum(found_new)),
+        'agreement': float(np.mean(found_ref == found_new)),
+        'dx_mean_px': float(np.mean(np.abs(dx))) if len(dx) else 0.0,
+        'dx_max_px': float(np.max(np.abs(dx))) if len(dx) else 0.0,
+        'dy_max_px': float(np.max(np.abs(dy))) if len(dy) else 0.0,
+        'fallback_rate': fallback_rate,
+        'timing': timings,
+    }
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="球位置检测器精度和速度对比")
+    parser.add_argument('path', nargs='?', help="录制的帧（raw_frames_*.npy、roi_frames_*.npy或*.vfa），省略时使用合成帧")
+    parser.add_argument('--limit', type=int, default=None, help="最多使用的帧数")
+    args = parser.parse_args()
+
+    frames = _load_frames(args.path, args.limit) if args.path else synthetic_frames()
+    report = benchmark_detectors(frames)
+
+    print(f"帧数: {report['frames']}")
+    print(f"检测到球: 轮廓 {report['found_contour']} 帧, 列分布 {report['found_profile']} 帧, "
+          f"结果一致 {report['agreement'] * 100:.2f}%")
+    print(f"质心偏差: x平均 {report['dx_mean_px']:.3f}px, x最大 {report['dx_max_px']:.3f}px, "
+          f"y最大 {report['dy_max_px']:.3f}px")
+    print(f"回退到轮廓检测: {report['fallback_rate'] * 100:.1f}%")
+    baseline = report['timing']['contour']['p50_us']
+    for name, timing in report['timing'].items():
+        print(f"{name:8s} p50 {timing['p50_us']:7.1f}us  p99 {timing['p99_us']:7.1f}us  "
+              f"加速比 {baseline / timing['p50_us']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,47 @@
 # coding=utf-8
 import mvsdk
-import cv2
 import numpy as np
-import math
 import time
 from threading import Lock
+from .frame_metadata import FrameMetadataLog
+from .ball_detector import DETECTION_ROI, ContourBallDetector, ProfileBallDetector
+
+# CameraGetImageBufferPriority的取图优先级（CameraDefine.h，mvsdk.py中未定义）
+CAMERA_GET_IMAGE_PRIORITY_OLDEST = 0  # 取缓存中最旧的一帧
+CAMERA_GET_IMAGE_PRIORITY_NEWEST = 1  # 取缓存中最新的一帧，更旧的帧全部丢弃
 
 class CameraController:
     """相机控制器类"""
-    def __init__(self):
+    ROI = DETECTION_ROI  # 球位置检测区域(x, y, 宽, 高)，640x480坐标系
+    SENSOR_ROI_ALIGN = 16  # 传感器ROI的偏移和尺寸按16像素对齐，满足大多数传感器的步进要求
+    
+    def __init__(self, acquisition='trigger', sensor_roi=False, exposure_us=4000, detector='contour'):
+        """
+        acquisition: 'trigger'每个控制周期软触发一帧并等待曝光和传输完成；
+                     'continuous'相机连续采集，帧到达即处理，处理不及时的旧帧由SDK丢弃，只取最新一帧
+        sensor_roi: 为True时相机只读出和传输包含ROI的条带，并使用最高帧速模式，
+                    与'continuous'配合可达到数百Hz的位置测量
+        exposure_us: 曝光时间（微秒），连续采集的帧率不超过1/曝光时间
+        detector: 'contour'为连通区域+轮廓圆度检测；'profile'先用列暗像素分布快速检测，不明确时回退到轮廓检测
+                  （见ball_detector.py，切换前可用python -m src.ball_detector在录制的帧上对比两者）
+        """
+        if acquisition not in ('trigger', 'continuous'):
+            raise ValueError(f"未知的采集模式: {acquisition}")
+        if detector not in ('contour', 'profile'):
+            raise ValueError(f"未知的检测器: {detector}")
+        self.detector = ProfileBallDetector() if detector == 'profile' else ContourBallDetector()
+        self.acquisition = acquisition
+        self.sensor_roi = sensor_roi
+        self.exposure_us = exposure_us
+        self.frame_origin = (0, 0)  # 相机输出帧左上角在640x480坐标系中的位置
+        self.frame_shape = (480, 640)  # 相机输出帧尺寸(H, W)，FrameStorage的frame_shape应与之一致
         self.hCamera = None
         self.pFrameBuffer = None
         self.frame_buffer_size = None
         self.global_ball_position = 0.0
         self.position_lock = Lock()
+        self.ball_detected = False  # 最近一帧是否检测到球
+        self.frame_metadata = None  # 最近一次采集的逐帧元数据（FrameMetadataLog）
         
     def ensure_camera_closed(self):
         """在程序启动时确保相机设备已经关闭"""
@@ -84,13 +112,18 @@ class CameraController:
         # 设置ISP输出MONO8格式
         mvsdk.CameraSetIspOutFormat(self.hCamera, mvsdk.CAMERA_MEDIA_TYPE_MONO8)
         
-        # 相机模式切换成软触发模式
-        mvsdk.CameraSetTriggerMode(self.hCamera, 1)  # 设置为软触发模式
-        print("Camera set to software trigger mode")
+        if self.acquisition == 'continuous':
+            # 相机模式切换成连续采集模式，帧率由曝光时间和帧速模式决定
+            mvsdk.CameraSetTriggerMode(self.hCamera, 0)
+            print("Camera set to continuous acquisition mode")
+        else:
+            # 相机模式切换成软触发模式
+            mvsdk.CameraSetTriggerMode(self.hCamera, 1)  # 设置为软触发模式
+            print("Camera set to software trigger mode")
 
         # 手动曝光设置
         mvsdk.CameraSetAeState(self.hCamera, 0)
-        mvsdk.CameraSetExposureTime(self.hCamera, 4 * 1000)  # 曝光时间4ms
+        mvsdk.CameraSetExposureTime(self.hCamera, self.exposure_us)  # 默认曝光时间4ms
         mvsdk.CameraSetAnalogGain(self.hCamera, 100)          # 模拟增益
         mvsdk.CameraSetGamma(self.hCamera, 250)               # 伽马
         mvsdk.CameraSetContrast(self.hCamera, 200)            # 对比度
@@ -100,8 +133,14 @@ class CameraController:
         resolution.iIndex = 0  # 使用索引0对应640*480分辨率
         mvsdk.CameraSetImageResolution(self.hCamera, resolution)
 
-        # 设置高帧率模式
-        mvsdk.CameraSetFrameSpeed(self.hCamera, 2)           # 2:高速模式
+        if self.sensor_roi and self._apply_sensor_roi(cap):
+            # 只传输ROI条带时使用相机支持的最高帧速模式
+            speed = cap.iFrameSpeedDesc - 1
+            mvsdk.CameraSetFrameSpeed(self.hCamera, speed)
+            print(f"Frame speed: {cap.pFrameSpeedDesc[speed].GetDescription()}")
+        else:
+            # 设置高帧率模式
+            mvsdk.CameraSetFrameSpeed(self.hCamera, 2)           # 2:高速模式
 
         # 让SDK内部取图线程开始工作
         mvsdk.CameraPlay(self.hCamera)
@@ -112,6 +151,54 @@ class CameraController:
         
         return True
     
+    def _apply_sensor_roi(self, cap):
+        """
+        在640x480预设分辨率的基础上设置自定义分辨率，只读出包含ROI的条带
+        预设分辨率可能带有BIN/SKIP，条带按预设分辨率的视场比例换算到传感器坐标，
+        设置后读回实际生效的窗口，更新frame_origin和frame_shape，失败时保持完整帧
+        """
+        base = mvsdk.CameraGetImageResolution(self.hCamera)
+        scale_x = base.iWidthFOV / base.iWidth
+        scale_y = base.iHeightFOV / base.iHeight
+        
+        # 条带向外扩展到对齐边界
+        align = self.SENSOR_ROI_ALIGN
+        roi_x, roi_y, roi_width, roi_height = self.ROI
+        x0 = roi_x // align * align
+        y0 = roi_y // align * align
+        width = min(-(-(roi_x + roi_width - x0) // align) * align, base.iWidth - x0)
+        height = min(-(-(roi_y + roi_height - y0) // align) * align, base.iHeight - y0)
+        
+        resolution = mvsdk.CameraGetImageResolution(self.hCamera)
+        resolution.iIndex = 0xff  # 自定义分辨率
+        resolution.iHOffsetFOV = base.iHOffsetFOV + int(x0 * scale_x)
+        resolution.iVOffsetFOV = base.iVOffsetFOV + int(y0 * scale_y)
+        resolution.iWidthFOV = int(width * scale_x)
+        resolution.iHeightFOV = int(height * scale_y)
+        resolution.iWidth = width
+        resolution.iHeight = height
+        err_code = mvsdk.CameraSetImageResolution(self.hCamera, resolution)
+        if err_code != 0:
+            print(f"Failed to set sensor ROI({err_code}), using full frame")
+            mvsdk.CameraSetImageResolution(self.hCamera, base)
+            return False
+        
+        # 读回实际窗口（传感器可能进一步调整偏移），换算回640x480坐标系
+        actual = mvsdk.CameraGetImageResolution(self.hCamera)
+        origin_x = int(round((actual.iHOffsetFOV - base.iHOffsetFOV) / scale_x))
+        origin_y = int(round((actual.iVOffsetFOV - base.iVOffsetFOV) / scale_y))
+        if (origin_x > roi_x or origin_y > roi_y or
+                origin_x + actual.iWidth < roi_x + roi_width or
+                origin_y + actual.iHeight < roi_y + roi_height):
+            print("Sensor ROI does not cover the detection ROI, using full frame")
+            mvsdk.CameraSetImageResolution(self.hCamera, base)
+            return False
+        
+        self.frame_origin = (origin_x, origin_y)
+        self.frame_shape = (actual.iHeight, actual.iWidth)
+        print(f"Sensor ROI: {actual.iWidth}x{actual.iHeight} at ({origin_x}, {origin_y})")
+        return True
+    
     def pixel_to_physical(self, pixel_x, zero_pixel_x, scale_factor):
         """
         将像素坐标转换为物理坐标
@@ -121,34 +208,50 @@ class CameraController:
         """
         return (pixel_x - zero_pixel_x) * scale_factor
     
-    def capture_frames(self, frame_storage=None, experiment_running=None):
-        """相机采集线程 - 移除显示相关功能，专注于位置检测和视频录制"""
-        # ROI参数
-        roi_x = 7
-        roi_y = 220
-        roi_width = 570
-        roi_height = 43
-        zero_pixel_x = 19.7  # 修改为X方向的零点
-        scale_factor = 165/572  # 24mm/167pixel
+    def capture_frames(self, frame_storage=None, experiment_clock=None, metadata_capacity=65536):
+        """
+        相机采集线程 - 移除显示相关功能，专注于位置检测和视频录制
+        experiment_clock: 与控制线程共用的ExperimentClock，帧时间戳以其t0为零点
+        metadata_capacity: 逐帧元数据的最大帧数，采集结束后保存到frame_storage的目录
+        """
+        # 等待实验开始（与控制线程在同一时刻开始）
+        if experiment_clock is None or not experiment_clock.wait_for_start():
+            return
         
-        # 等待实验开始
-        while not experiment_running:
-            time.sleep(0.001)
+        # 逐帧元数据：SDK帧ID、硬件时间戳、接收时间、处理耗时和检测结果
+        self.frame_metadata = FrameMetadataLog(metadata_capacity)
+        if isinstance(self.detector, ProfileBallDetector):
+            self.detector.reset_stats()
+        # 相机触发不需要亚毫秒精度，只睡眠不忙等待，避免与控制线程争抢CPU
+        timer = experiment_clock.create_timer(spin_margin=0)
         
-        # 实验开始后，与控制循环同步，每10ms采集一帧
-        experiment_start_time = time.time()
-        frame_interval = 0.01  # 10ms间隔，与控制循环同步
-        next_frame_time = experiment_start_time
+        if self.acquisition == 'continuous':
+            self._capture_continuous(timer, experiment_clock, frame_storage)
+        else:
+            self._capture_triggered(timer, experiment_clock, frame_storage)
         
-        while experiment_running:
+        if isinstance(self.detector, ProfileBallDetector):
+            total = self.detector.fast_count + self.detector.fallback_count
+            if total > 0:
+                print(f"列分布检测: {total} 帧, 回退到轮廓检测 {self.detector.fallback_count} 帧 "
+                      f"({self.detector.fallback_count / total * 100:.1f}%)")
+        
+        # 逐帧元数据与帧数据保存在同一目录
+        if frame_storage is not None:
+            self.frame_metadata.save(frame_storage.save_path, time.strftime("%Y%m%d_%H%M%S"))
+    
+    def _capture_triggered(self, timer, experiment_clock, frame_storage):
+        """软触发采集：与控制循环同步，每10ms触发一帧"""
+        frame_interval_ns = 10000000  # 10ms间隔，与控制循环同步
+        next_frame_ns = 0
+        
+        while experiment_clock.running:
             try:
                 # 等待到下一个预定的采集时间
-                current_time = time.time()
-                if current_time < next_frame_time:
-                    time.sleep(max(0, next_frame_time - current_time))
+                timer.deadline_wait_ns(next_frame_ns)
                 
                 # 计算实验经过时间
-                elapsed_time = time.time() - experiment_start_time
+                elapsed_time = timer.get_time_ns() * 1e-9
                 
                 # 如果实验时间超过84秒，停止采集
                 if elapsed_time > 84.0:
@@ -160,66 +263,108 @@ class CameraController:
                 
                 # 取一帧图像，添加200ms超时
                 pRawData, FrameHead = mvsdk.CameraGetImageBuffer(self.hCamera, 200)
-                mvsdk.CameraImageProcess(self.hCamera, pRawData, self.pFrameBuffer, FrameHead)
-                
-                # 将图像数据转换成OpenCV格式
-                frame_data = (mvsdk.c_ubyte * FrameHead.uBytes).from_address(self.pFrameBuffer)
-                frame = np.frombuffer(frame_data, dtype=np.uint8)
-                frame = frame.reshape(FrameHead.iHeight, FrameHead.iWidth)
+                self._process_frame(pRawData, FrameHead, timer, frame_storage, elapsed_time)
                 
-                # 保存原始帧到帧存储器 - 优先处理以减少实时计算负担
-                if frame_storage and frame_storage.recording:
-                    frame_storage.add_frame(frame, elapsed_time)
-                
-                # ROI裁剪用于球位置检测
-                roi = frame[roi_y:roi_y+roi_height, roi_x:roi_x+roi_width]
-                
-                # 反二值化
-                _, binary = cv2.threshold(roi, 128, 255, cv2.THRESH_BINARY_INV)
+                # 计算下一帧时间
+                next_frame_ns += frame_interval_ns
                 
-                # 移除小于500像素的连通区域
-                num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary)
+            except mvsdk.CameraException as e:
+                if e.error_code != mvsdk.CAMERA_STATUS_TIME_OUT:  # 忽略超时错误
+                    print("Camera error({}): {}".format(e.error_code, e.message))
+                # 调整下一帧时间，避免因错误导致时间偏移
+                next_frame_ns = timer.get_time_ns() + frame_interval_ns
+            except Exception as e:
+                print(f"Error in capture loop: {e}")
+                next_frame_ns = timer.get_time_ns() + frame_interval_ns
+    
+    def _capture_continuous(self, timer, experiment_clock, frame_storage):
+        """
+        连续采集：阻塞等待SDK取图线程送来新帧，帧到达即处理，不再等待触发、曝光和传输
+        按最新优先取图，处理期间积压的旧帧由SDK直接丢弃，控制循环读到的总是最近一帧的位置
+        """
+        stats_start = mvsdk.CameraGetFrameStatistic(self.hCamera)
+        mvsdk.CameraClearBuffer(self.hCamera)  # 丢弃实验开始前缓存的帧
+        
+        while experiment_clock.running:
+            try:
+                pRawData, FrameHead = mvsdk.CameraGetImageBufferPriority(
+                    self.hCamera, 200, CAMERA_GET_IMAGE_PRIORITY_NEWEST)
+                elapsed_time = timer.get_time_ns() * 1e-9
                 
-                # 处理连通区域
-                for i in range(1, num_labels):
-                    if stats[i, cv2.CC_STAT_AREA] >= 500:
-                        # 获取轮廓mask
-                        contour_mask = (labels == i).astype(np.uint8) * 255
-        
-                        # 查找轮廓并计算最小包围圆
-                        contours, _ = cv2.findContours(contour_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                        if contours:
-                            # 计算最小包围圆
-                            (x, y), radius = cv2.minEnclosingCircle(contours[0])
-            
-                            # 计算圆度过滤非圆形物体
-                            perimeter = cv2.arcLength(contours[0], True)
-                            if perimeter > 0:
-                                circularity = 4 * math.pi * stats[i, cv2.CC_STAT_AREA] / (perimeter ** 2)
-                                if 0.40 < circularity < 1.15:  # 圆度阈值范围
-                                    # 找到小球，计算质心并更新位置
-                                    centroid_x = centroids[i][0]
-                                    pixel_x = centroid_x + roi_x  # 转换回原图坐标系
-                                    physical_x = self.pixel_to_physical(pixel_x, zero_pixel_x, scale_factor)
-                                    
-                                    # 更新全局球位置
-                                    with self.position_lock:
-                                        self.global_ball_position = physical_x
-            
-                # 释放图像缓冲区
-                mvsdk.CameraReleaseImageBuffer(self.hCamera, pRawData)
+                # 如果实验时间超过84秒，停止采集
+                if elapsed_time > 84.0:
+                    mvsdk.CameraReleaseImageBuffer(self.hCamera, pRawData)
+                    break
                 
-                # 计算下一帧时间
-                next_frame_time += frame_interval
+                self._process_frame(pRawData, FrameHead, timer, frame_storage, elapsed_time)
                 
             except mvsdk.CameraException as e:
                 if e.error_code != mvsdk.CAMERA_STATUS_TIME_OUT:  # 忽略超时错误
                     print("Camera error({}): {}".format(e.error_code, e.message))
-                # 调整下一帧时间，避免因错误导致时间偏移
-                next_frame_time = time.time() + frame_interval
             except Exception as e:
                 print(f"Error in capture loop: {e}")
-                next_frame_time = time.time() + frame_interval
+        
+        # 丢帧统计：SDK统计的传输丢帧，以及按帧ID间隔得到的未处理帧（含最新优先取图丢弃的旧帧）
+        try:
+            stats = mvsdk.CameraGetFrameStatistic(self.hCamera)
+            captured = stats.iCapture - stats_start.iCapture
+            lost = stats.iLost - stats_start.iLost
+            processed = self.frame_metadata.count + self.frame_metadata.overflow
+            skipped = self.frame_metadata.dropped_frames()
+            print(f"连续采集: 相机采集 {captured} 帧, 传输丢帧 {lost} 帧, 处理 {processed} 帧, "
+                  f"未处理的旧帧 {skipped} 帧")
+        except Exception as e:
+            print(f"Error reading frame statistics: {e}")
+    
+    def _process_frame(self, pRawData, FrameHead, timer, frame_storage, elapsed_time):
+        """处理一帧：记录帧信息、保存帧、检测球位置并释放SDK缓冲区"""
+        # ROI参数
+        roi_x, roi_y, roi_width, roi_height = self.ROI
+        zero_pixel_x = 19.7  # 修改为X方向的零点
+        scale_factor = 165/572  # 24mm/167pixel
+        
+        receive_ns = timer.get_time_ns()
+        frame_id = mvsdk.CameraGetFrameID(self.hCamera)
+        hw_timestamp = mvsdk.CameraGetFrameTimeStamp(self.hCamera)
+        try:
+            mvsdk.CameraImageProcess(self.hCamera, pRawData, self.pFrameBuffer, FrameHead)
+        finally:
+            # 释放图像缓冲区
+            mvsdk.CameraReleaseImageBuffer(self.hCamera, pRawData)
+        
+        # 将图像数据转换成OpenCV格式
+        frame_data = (mvsdk.c_ubyte * FrameHead.uBytes).from_address(self.pFrameBuffer)
+        frame = np.frombuffer(frame_data, dtype=np.uint8)
+        frame = frame.reshape(FrameHead.iHeight, FrameHead.iWidth)
+        
+        # 保存原始帧到帧存储器 - 优先处理以减少实时计算负担
+        if frame_storage and frame_storage.recording:
+            frame_storage.add_frame(frame, elapsed_time)
+        
+        # ROI裁剪用于球位置检测（传感器ROI模式下帧只包含条带，按帧原点换算偏移）
+        origin_x, origin_y = self.frame_origin
+        frame_roi_x, frame_roi_y = roi_x - origin_x, roi_y - origin_y
+        roi = frame[frame_roi_y:frame_roi_y+roi_height, frame_roi_x:frame_roi_x+roi_width]
+        
+        # 检测球位置（ROI内坐标）
+        found, centroid_x, centroid_y, ball_area, ball_circularity = self.detector(roi)
+        ball_x = ball_y = np.nan
+        if found:
+            # 找到小球，计算质心并更新位置
+            pixel_x = centroid_x + roi_x  # 转换回原图坐标系
+            physical_x = self.pixel_to_physical(pixel_x, zero_pixel_x, scale_factor)
+            
+            # 更新全局球位置
+            with self.position_lock:
+                self.global_ball_position = physical_x
+            
+            ball_x = pixel_x
+            ball_y = centroid_y + roi_y
+        
+        self.ball_detected = found
+        self.frame_metadata.record(frame_id, hw_timestamp, receive_ns,
+                                   timer.get_time_ns() - receive_ns,
+                                   ball_x, ball_y, ball_area, ball_circularity, found)
     
     def get_ball_position(self):
         """获取当前球位置"""
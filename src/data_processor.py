@@ -1,5 +1,6 @@
 # coding=utf-8
 import os
+import json
 import time
 import numpy as np
 import matplotlib.pyplot as plt
@@ -38,6 +39,9 @@ class DataProcessor:
                     error_data_trimmed = experiment_runner.error_data[:last_valid_idx]
                     output_data_trimmed = experiment_runner.output_data[:last_valid_idx]
                     jitter_data_trimmed = experiment_runner.jitter_data[:last_valid_idx]
+                    wake_error_data_trimmed = experiment_runner.wake_error_data[:last_valid_idx]
+                    timestamp_ns_data_trimmed = experiment_runner.timestamp_ns_data[:last_valid_idx]
+                    missed_periods_data_trimmed = experiment_runner.missed_periods_data[:last_valid_idx]
                     
                     # 裁剪PID参数数据
                     kp_data_trimmed = experiment_runner.kp_data[:last_valid_idx]
@@ -67,6 +71,9 @@ class DataProcessor:
                 error_data_trimmed = experiment_runner.error_data
                 output_data_trimmed = experiment_runner.output_data
                 jitter_data_trimmed = experiment_runner.jitter_data
+                wake_error_data_trimmed = experiment_runner.wake_error_data
+                timestamp_ns_data_trimmed = experiment_runner.timestamp_ns_data
+                missed_periods_data_trimmed = experiment_runner.missed_periods_data
                 kp_data_trimmed = experiment_runner.kp_data
                 ki_data_trimmed = experiment_runner.ki_data
                 kd_data_trimmed = experiment_runner.kd_data
@@ -94,7 +101,9 @@ class DataProcessor:
                 d_term_data_trimmed,
                 pressure_a0_data_trimmed,  # 新增
                 pressure_a1_data_trimmed,  # 新增
-                pressure_a2_data_trimmed   # 新增
+                pressure_a2_data_trimmed,  # 新增
+                wake_error_data_trimmed,
+                missed_periods_data_trimmed
             ))
             
             # 保存到CSV文件
@@ -102,7 +111,7 @@ class DataProcessor:
             filename = os.path.join(self.save_path, f"control_data_{timestamp}.csv")
             
             # 添加表头并保存（更新表头包含压力传感器数据）
-            header = "Time(s),x_set(mm),x_meas(mm),e_x(mm),Output(V),Jitter(ms),Kp,Ki,Kd,P_term(V),I_term(V),D_term(V),Pressure_A0(Bar),Pressure_A1(Bar),Pressure_A2(Bar)"
+            header = "Time(s),x_set(mm),x_meas(mm),e_x(mm),Output(V),Jitter(ms),Kp,Ki,Kd,P_term(V),I_term(V),D_term(V),Pressure_A0(Bar),Pressure_A1(Bar),Pressure_A2(Bar),Wake_error(us),Missed_periods"
             np.savetxt(filename, data, delimiter=',', header=header, comments='')
             
             # 单独保存phase数据（因为它是字符串）
@@ -111,7 +120,44 @@ class DataProcessor:
                 for phase in phase_data_trimmed:
                     f.write(f"{phase}\n")
             
+            # 单独保存整数纳秒原始时间戳（避免在浮点CSV中丢失精度）
+            timestamp_ns_filename = os.path.join(self.save_path, f"timestamps_ns_{timestamp}.csv")
+            np.savetxt(timestamp_ns_filename, np.asarray(timestamp_ns_data_trimmed, dtype=np.int64),
+                       fmt='%d', header="Timestamp_raw(ns)", comments='')
+            
+            # 保存压力原始码值和本次实验的校准参数，便于之后重新校准
+            pressure_raw_data = np.asarray(experiment_runner.pressure_raw_data)
+            if pressure_raw_data.ndim == 2:
+                raw_filename = os.path.join(self.save_path, f"pressure_raw_{timestamp}.csv")
+                raw_fmt = '%d' if np.issubdtype(pressure_raw_data.dtype, np.integer) else '%.4f'
+                np.savetxt(raw_filename, pressure_raw_data[:len(time_data_trimmed)], fmt=raw_fmt, delimiter=',',
+                           header=",".join(f"Raw_{name}" for name in experiment_runner.pressure_channel_names),
+                           comments='')
+                calibration_filename = os.path.join(self.save_path, f"pressure_calibration_{timestamp}.json")
+                with open(calibration_filename, 'w') as f:
+                    json.dump(experiment_runner.pressure_calibration_params, f, indent=2)
+                print(f"Raw pressure codes saved to {raw_filename}")
+                
+                # 各通道压力值在记录时距实际读取的时间（微秒），连续转换模式下用于识别未更新的值
+                pressure_age_data = np.asarray(experiment_runner.pressure_age_data)
+                if pressure_age_data.shape == pressure_raw_data.shape:
+                    age_filename = os.path.join(self.save_path, f"pressure_age_{timestamp}.csv")
+                    np.savetxt(age_filename, pressure_age_data[:len(time_data_trimmed)] // 1000, fmt='%d',
+                               delimiter=',', comments='',
+                               header=",".join(f"Age_{name}(us)" for name in experiment_runner.pressure_channel_names))
+                    print(f"Pressure sample ages saved to {age_filename}")
+            
             print(f"Data saved to {filename}")
+            
+            # 保存控制循环分阶段计时和直方图
+            stage_profiler = getattr(experiment_runner, 'stage_profiler', None)
+            if stage_profiler is not None:
+                stage_profiler.save(self.save_path, timestamp)
+            print(f"Raw timestamps saved to {timestamp_ns_filename}")
+            if len(wake_error_data_trimmed) > 0:
+                print(f"唤醒误差: 平均 {np.mean(wake_error_data_trimmed):.1f}us, "
+                      f"最大 {np.max(wake_error_data_trimmed):.1f}us")
+                print(f"错过的控制周期: {int(np.sum(missed_periods_data_trimmed))}")
             print(f"Phase data saved to {phase_filename}")
             
             # 生成图表
@@ -0,0 +1,193 @@
+# coding=utf-8
+import os
+import queue
+from collections import deque
+from threading import Thread
+from .raw_frame_ring import RawFrameRing
+from .frame_archive import FrameArchiveWriter
+
+class EventTriggers:
+    """
+    事件触发条件，由控制循环每个周期调用check()，只做常数次比较
+    各条件在由不满足变为满足时触发一次（边沿触发），持续满足期间不重复触发
+    """
+    def __init__(self, error_threshold=10.0, output_limits=(0.0, 3.3), missing_cycles=10,
+                 pressure_step=None):
+        """
+        error_threshold: 跟踪误差绝对值阈值（mm），None为不启用
+        output_limits: 输出饱和判定的上下限（V），None为不启用；出现第一个未饱和的输出后才开始判定，
+                       避免实验开始时输出从0 V起步被误判为饱和
+        missing_cycles: 连续多少个周期未检测到球时触发，None为不启用
+        pressure_step: 相邻周期压力原始码值的跳变阈值（ADC码值），None为不启用
+        """
+        self.error_threshold = error_threshold
+        self.output_limits = output_limits
+        self.missing_cycles = missing_cycles
+        self.pressure_step = pressure_step
+        self.reset()
+
+    def reset(self):
+        self.active = {'error': False, 'saturation': False, 'missing': False, 'pressure_step': False}
+        self.missing_count = 0
+        self.prev_pressure = None
+        self.saturation_armed = False
+
+    def _edge(self, name, condition):
+        """条件由假变真时返回True"""
+        fired = condition and not self.active[name]
+        self.active[name] = condition
+        return fired
+
+    def check(self, error, output, pressure_codes=None, ball_detected=True):
+        """
+        检查本周期是否触发事件
+        返回触发原因（'error'、'saturation'、'missing'、'pressure_step'），未触发返回None
+        """
+        reason = None
+
+        if self.error_threshold is not None:
+            if self._edge('error', abs(error) > self.error_threshold):
+                reason = 'error'
+
+        if self.output_limits is not None:
+            low, high = self.output_limits
+            saturated = output <= low or output >= high
+            if not saturated:
+                self.saturation_armed = True
+            if self._edge('saturation', saturated and self.saturation_armed) and reason is None:
+                reason = 'saturation'
+
+        if self.missing_cycles is not None:
+            self.missing_count = 0 if ball_detected else self.missing_count + 1
+            if self._edge('missing', self.missing_count >= self.missing_cycles) and reason is None:
+                reason = 'missing'
+
+        if self.pressure_step is not None and pressure_codes is not None:
+            step = False
+            if self.prev_pressure is None:
+                self.prev_pressure = [0] * len(pressure_codes)
+            else:
+                for c in range(len(pressure_codes)):
+                    if abs(pressure_codes[c] - self.prev_pressure[c]) > self.pressure_step:
+                        step = True
+            for c in range(len(pressure_codes)):
+                self.prev_pressure[c] = pressure_codes[c]
+            if self._edge('pressure_step', step) and reason is None:
+                reason = 'pressure_step'
+
+        return reason
+
+
+class TriggeredFrameBuffer:
+    """
+    事件触发录像缓冲区
+    最近若干秒的完整帧保存在固定大小的内存环形缓冲区中；事件触发后等到触发时刻之后post_seconds的帧到达，
+    由后台线程把[触发时刻-pre_seconds, 触发时刻+post_seconds]内的帧写入帧归档文件
+    """
+    def __init__(self, save_path, stamp, frame_shape=(480, 640), fps=100.0, pre_seconds=2.0,
+                 post_seconds=2.0, max_events=50, codec='jpeg'):
+        """
+        save_path: 保存目录
+        stamp: 文件名时间戳
+        fps: 相机帧率，用于确定缓冲区大小
+        pre_seconds/post_seconds: 保存触发时刻之前/之后的时长（秒）
+        max_events: 最多保存的事件数，防止长时间运行写满存储卡
+        codec: 事件片段的压缩方式（见FrameArchiveWriter）
+        """
+        self.save_path = save_path
+        self.stamp = stamp
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_events = max_events
+        self.codec = codec
+
+        # 比事件窗口多留1秒，给后台线程读取留出余量，避免正在写出的帧被覆盖
+        capacity = int((pre_seconds + post_seconds + 1.0) * fps)
+        self.ring = RawFrameRing(capacity, frame_shape, wrap=True)
+
+        self.events = []  # (序号, 触发时间, 原因, 帧数, 文件名)
+        self.pending = deque()  # 等待触发后帧到达的事件
+        self.last_event_end = float('-inf')
+        self.lost_frames = 0  # 写出前已被覆盖的帧数
+
+        self.write_queue = queue.Queue()
+        self.writer = Thread(target=self._write_loop, name="event-writer")
+        self.writer.daemon = True
+        self.writer.start()
+
+    def trigger(self, timestamp, reason):
+        """
+        登记一个事件（控制线程调用），返回是否被接受
+        上一事件窗口内的新触发已包含在该窗口中，不再单独保存
+        """
+        if len(self.events) >= self.max_events or timestamp < self.last_event_end:
+            return False
+        self.last_event_end = timestamp + self.post_seconds
+        index = len(self.events)
+        self.events.append([index, timestamp, reason, 0, None])
+        self.pending.append(index)
+        print(f"事件触发: {reason} @ {timestamp:.2f}s")
+        return True
+
+    def add_frame(self, frame, timestamp):
+        """写入一帧（相机线程调用），触发后帧已到齐的事件交给后台线程写出"""
+        self.ring.append(frame, timestamp)
+        while self.pending and timestamp >= self.events[self.pending[0]][1] + self.post_seconds:
+            self.write_queue.put((self.pending.popleft(), self.ring.write_count))
+
+    def _write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            try:
+                self._write_event(*item)
+            except Exception as e:
+                print(f"保存事件片段时出错: {e}")
+
+    def _write_event(self, index, end):
+        """把事件窗口内的帧写入帧归档，end为事件到齐时已写入的帧数"""
+        event = self.events[index]
+        t_event, reason = event[1], event[2]
+        ring = self.ring
+        capacity = ring.capacity
+
+        # 从最新的帧往前找到窗口起点
+        start = end
+        oldest = max(0, ring.write_count - capacity + 1)
+        while start - 1 >= oldest and ring.timestamps[(start - 1) % capacity] >= t_event - self.pre_seconds:
+            start -= 1
+
+        filename = os.path.join(self.save_path,
+                                f"event_{self.stamp}_{index:03d}_{reason}_{t_event:.2f}s.vfa")
+        frames = 0
+        with FrameArchiveWriter(filename, frame_shape=ring.frame_shape, codec=self.codec) as writer:
+            for n in range(start, end):
+                if ring.write_count - n >= capacity:
+                    self.lost_frames += 1  # 已被相机线程覆盖
+                    continue
+                slot = n % capacity
+                writer.append(ring.frames[slot], ring.timestamps[slot])
+                frames += 1
+        event[3] = frames
+        event[4] = filename
+
+    def close(self):
+        """写出尚未到齐的事件，等待后台线程结束并保存事件列表"""
+        while self.pending:
+            self.write_queue.put((self.pending.popleft(), self.ring.write_count))
+        self.write_queue.put(None)
+        self.writer.join()
+
+        if not self.events:
+            print("未触发任何事件")
+            return
+
+        log_filename = os.path.join(self.save_path, f"event_log_{self.stamp}.csv")
+        with open(log_filename, 'w') as f:
+            f.write("Index,Time(s),Reason,Frames,File\n")
+            for index, t_event, reason, frames, filename in self.events:
+                f.write(f"{index},{t_event:.4f},{reason},{frames},{os.path.basename(filename or '')}\n")
+        print(f"共保存 {len(self.events)} 个事件片段，事件列表: {log_filename}")
+        if self.lost_frames:
+            print(f"写出前被覆盖的帧: {self.lost_frames}")
@@ -0,0 +1,60 @@
+# coding=utf-8
+from threading import Barrier, BrokenBarrierError, Event
+from .timer import Timer, raw_time_ns, monotonic_ns
+
+class ExperimentClock:
+    """实验统一时钟：所有线程共用同一个t0，并通过屏障在同一时刻开始"""
+    def __init__(self, parties=1):
+        """
+        parties: 需要同步开始的线程数（如相机采集线程和控制线程）
+        """
+        self.t0_raw_ns = None   # t0对应的CLOCK_MONOTONIC_RAW时间（纳秒）
+        self.t0_mono_ns = None  # t0对应的CLOCK_MONOTONIC时间（纳秒），供timerfd等使用
+        self.start_event = Event()
+        self.stop_event = Event()
+        self._barrier = Barrier(parties, action=self._mark_start)
+    
+    def _mark_start(self):
+        """屏障动作：最后一个到达的线程记录t0并发出开始信号"""
+        self.t0_mono_ns = monotonic_ns()
+        self.t0_raw_ns = raw_time_ns()
+        self.start_event.set()
+    
+    def wait_for_start(self, timeout=None):
+        """
+        参与同步开始的线程调用，阻塞直到所有参与线程到达
+        返回: 是否正常开始，实验在开始前被停止或等待超时返回False
+        """
+        try:
+            self._barrier.wait(timeout)
+            return True
+        except BrokenBarrierError:
+            return False
+    
+    def wait_started(self, timeout=None):
+        """不参与屏障的线程调用，等待实验开始"""
+        return self.start_event.wait(timeout)
+    
+    def create_timer(self, **kwargs):
+        """创建一个以t0为起点的Timer，每个线程应使用各自的Timer"""
+        timer = Timer(**kwargs)
+        timer.set_start_time_ns(self.t0_raw_ns)
+        return timer
+    
+    def now_ns(self):
+        """相对于t0的时间（整数纳秒）"""
+        return raw_time_ns() - self.t0_raw_ns
+    
+    def elapsed(self):
+        """相对于t0的时间（秒）"""
+        return self.now_ns() * 1e-9
+    
+    def stop(self):
+        """结束实验，尚在屏障等待的线程会被释放"""
+        self.stop_event.set()
+        self._barrier.abort()
+    
+    @property
+    def running(self):
+        """实验是否已开始且尚未结束"""
+        return self.start_event.is_set() and not self.stop_event.is_set()
@@ -2,17 +2,26 @@
 import time
 import gc
 import os
+import copy
 import psutil
 import numpy as np
 from threading import Thread
 from rpi_hardware_pwm import HardwarePWM
 from .timer import Timer
-from .pressure_sensor import PressureSensor
+from .tick_source import TickSource
+from .loop_profiler import StageProfiler
+from .experiment_clock import ExperimentClock
+from .pressure_sensor import PressureSensor, lookup_pressure
 from .pid_controller import FuzzyPID
 
 class ExperimentRunner:
     """实验运行器类"""
-    def __init__(self):
+    def __init__(self, wait_mode='busy', spin_margin=300e-6):
+        """
+        wait_mode: 周期等待方式，'busy'为纯忙等待，'hybrid'为先睡眠后忙等待，
+                   'timerfd'为在内核中阻塞等待timerfd周期节拍
+        spin_margin: 'hybrid'模式下留给忙等待的余量（秒）
+        """
         self.experiment_running = False
         self.data_already_saved = False
         
@@ -23,6 +32,9 @@ class ExperimentRunner:
         self.error_data = []
         self.output_data = []
         self.jitter_data = []
+        self.timestamp_ns_data = []  # 每个周期的CLOCK_MONOTONIC_RAW原始时间戳（整数纳秒）
+        self.wake_error_data = []  # 周期等待的唤醒误差（微秒）
+        self.missed_periods_data = []  # 每次循环新错过的周期数
         
         # PID参数记录
         self.kp_data = []
@@ -35,10 +47,15 @@ class ExperimentRunner:
         self.i_term_data = []
         self.d_term_data = []
         
-        # 压力传感器数据记录
-        self.pressure_a0_data = []
-        self.pressure_a1_data = []
-        self.pressure_a2_data = []
+        # 压力传感器数据记录：只记录原始码值（int16），校准压力按需由查找表换算
+        self.pressure_raw_data = []
+        self.pressure_age_data = []               # 每个周期记录的各通道压力值距读取时的时间（纳秒）
+        self.pressure_channels = [0, 1, 2]        # 压力源的通道（查找表行号）
+        self.pressure_channel_names = ['A0', 'A1', 'A2']
+        self.pressure_filtered = False            # 压力源是否返回过采样滤波后的码值
+        self.pressure_lut = None                  # 本次实验所用校准参数对应的查找表
+        self.pressure_calibration_params = None   # 本次实验所用的校准参数
+        self._calibrated_pressure_cache = None
         
         # 实验参数
         self.cycle_time = 28.0
@@ -46,6 +63,14 @@ class ExperimentRunner:
         self.experiment_duration = 84.0  # 实验时长84秒，刚好3个周期
         self.expected_points = int(self.experiment_duration / self.DT)  # 预期数据点数：8400
         
+        # 控制循环分阶段计时
+        self.stage_names = ['wait', 'camera', 'pid', 'pwm', 'pressure', 'logging']
+        self.stage_profiler = None
+        
+        # 定时参数
+        self.wait_mode = wait_mode
+        self.spin_margin = spin_margin
+        
         # 轨迹参数
         self.x_min = 0.0  # 轨迹的最小位置，单位mm
         self.x_max = 156.75  # 轨迹的最大位置，单位mm
@@ -127,6 +152,9 @@ class ExperimentRunner:
         self.error_data.clear()
         self.output_data.clear()
         self.jitter_data.clear()
+        self.timestamp_ns_data.clear()
+        self.wake_error_data.clear()
+        self.missed_periods_data.clear()
         self.kp_data.clear()
         self.ki_data.clear()
         self.kd_data.clear()
@@ -134,9 +162,9 @@ class ExperimentRunner:
         self.p_term_data.clear()
         self.i_term_data.clear()
         self.d_term_data.clear()
-        self.pressure_a0_data.clear()
-        self.pressure_a1_data.clear()
-        self.pressure_a2_data.clear()
+        self.pressure_raw_data.clear()
+        self.pressure_age_data.clear()
+        self._calibrated_pressure_cache = None
     
     def preallocate_arrays(self):
         """预分配数据数组"""
@@ -146,6 +174,9 @@ class ExperimentRunner:
         self.error_data = np.zeros(self.expected_points)
         self.output_data = np.zeros(self.expected_points)
         self.jitter_data = np.zeros(self.expected_points)
+        self.timestamp_ns_data = np.zeros(self.expected_points, dtype=np.int64)
+        self.wake_error_data = np.zeros(self.expected_points)
+        self.missed_periods_data = np.zeros(self.expected_points, dtype=np.int32)
         self.kp_data = np.zeros(self.expected_points)
         self.ki_data = np.zeros(self.expected_points)
         self.kd_data = np.zeros(self.expected_points)
@@ -153,12 +184,79 @@ class ExperimentRunner:
         self.p_term_data = np.zeros(self.expected_points)
         self.i_term_data = np.zeros(self.expected_points)
         self.d_term_data = np.zeros(self.expected_points)
-        self.pressure_a0_data = np.zeros(self.expected_points)
-        self.pressure_a1_data = np.zeros(self.expected_points)
-        self.pressure_a2_data = np.zeros(self.expected_points)
+        # 采集端启用过采样滤波时码值带有小数部分，改用float32记录
+        raw_dtype = np.float32 if self.pressure_filtered else np.int16
+        # 未读取或读取失败的周期保持为INVALID_CODE，换算后为NaN，不会被当作有效的压力值
+        self.pressure_raw_data = np.full((self.expected_points, len(self.pressure_channels)),
+                                         PressureSensor.INVALID_CODE, dtype=raw_dtype)
+        self.pressure_age_data = np.zeros((self.expected_points, len(self.pressure_channels)), dtype=np.int64)
+        self.stage_profiler = StageProfiler(self.stage_names, self.expected_points)
+    
+    def recalibrate(self, pressure_sensor):
+        """
+        使用pressure_sensor当前的校准参数作为本次实验的换算依据
+        实验开始时自动调用；修改校准参数后再次调用即可批量重新换算已记录的原始码值
+        """
+        self.pressure_channels = list(pressure_sensor.channels)
+        self.pressure_channel_names = [pressure_sensor.channel_names[c] for c in self.pressure_channels]
+        self.pressure_filtered = getattr(pressure_sensor, 'filtered', False)
+        self.pressure_lut = pressure_sensor.pressure_lut.copy()
+        self.pressure_calibration_params = copy.deepcopy(pressure_sensor.calibration_params)
+        self._calibrated_pressure_cache = None
+    
+    def calibrated_pressures(self):
+        """
+        由原始码值换算得到的校准压力，形状为(数据点数, 通道数)，结果会被缓存
+        读取失败（码值为INVALID_CODE）的数据点为NaN
+        """
+        if self._calibrated_pressure_cache is None:
+            raw = np.asarray(self.pressure_raw_data)
+            if raw.ndim != 2:
+                # 未预分配时为各周期码值的列表；没有压力通道时无法按列数恢复形状
+                raw = raw.reshape(-1, len(self.pressure_channels)) if self.pressure_channels else np.zeros((0, 0))
+            invalid = raw == PressureSensor.INVALID_CODE
+            if self.pressure_lut is None:
+                pressures = np.zeros(raw.shape)
+            else:
+                pressures = lookup_pressure(self.pressure_lut, self.pressure_channels, np.where(invalid, 0, raw))
+            pressures[invalid] = np.nan
+            self._calibrated_pressure_cache = pressures
+        return self._calibrated_pressure_cache
+    
+    def pressure_column(self, c):
+        """
+        第c列的校准压力 (Bar)，压力源的通道数不足c+1时返回全为NaN的列
+        （如只有1–2个测点的PressureSensorArray），DataProcessor仍可按A0–A2三列保存
+        """
+        pressures = self.calibrated_pressures()
+        if c < pressures.shape[1]:
+            return pressures[:, c]
+        return np.full(len(pressures), np.nan)
+    
+    @property
+    def pressure_a0_data(self):
+        """A0校准压力 (Bar)"""
+        return self.pressure_column(0)
     
-    def run_control_experiment(self, camera_controller, frame_storage=None, pressure_sensor=None):
-        """进行控制实验的主要函数"""
+    @property
+    def pressure_a1_data(self):
+        """A1校准压力 (Bar)"""
+        return self.pressure_column(1)
+    
+    @property
+    def pressure_a2_data(self):
+        """A2校准压力 (Bar)"""
+        return self.pressure_column(2)
+    
+    def run_control_experiment(self, camera_controller, frame_storage=None, pressure_sensor=None,
+                               experiment_clock=None):
+        """
+        进行控制实验的主要函数
+        experiment_clock: 与相机采集线程共用的ExperimentClock，为None时单独创建
+        """
+        if experiment_clock is None:
+            experiment_clock = ExperimentClock(parties=1)
+        
         # 标记实验已开始
         self.experiment_running = True
         
@@ -176,7 +274,8 @@ class ExperimentRunner:
         self.set_realtime_priority()
         
         # 创建高精度定时器
-        timer = Timer()
+        timer = Timer(spin_margin=self.spin_margin)
+        print(f"Timer wait mode: {self.wait_mode}")
         
         # 初始化压力传感器
         if pressure_sensor is None:
@@ -187,6 +286,10 @@ class ExperimentRunner:
                 print(f"压力传感器初始化失败: {e}")
                 pressure_sensor = None
         
+        # 记录本次实验的通道和校准参数，用于之后由原始码值换算压力
+        if pressure_sensor is not None:
+            self.recalibrate(pressure_sensor)
+        
         # 预分配数据数组
         self.preallocate_arrays()
         
@@ -200,31 +303,81 @@ class ExperimentRunner:
         # 创建实时动态PID控制器
         pid_controller = FuzzyPID(kp_base=0.11, ki_base=0.1, kd_base=0.05)
         
+        tick_source = None
+        total_missed = 0
+        
         try:
-            # 实验开始时间
+            # 等待所有参与线程就绪，以共同的t0作为实验开始时间
             print(f"Starting {self.experiment_duration}-second experiment with {self.expected_points} data points...")
-            start_time = timer.get_time()
-            prev_elapsed_time = 0
+            if not experiment_clock.wait_for_start():
+                print("实验在开始前被停止")
+                return
+            timer.set_start_time_ns(experiment_clock.t0_raw_ns)
+            start_ns = 0
+            dt_ns = int(round(self.DT * 1e9))
+            prev_elapsed_ns = 0
+            prev_behind = 0
+            
+            # timerfd模式下第一个节拍在t0到期，之后每DT到期一次
+            # 错过的节拍不补做，tick_index记录已到期的节拍编号，节拍编号达到expected_points时结束，
+            # 实验时长保持不变，数据行保持连续（行数少于expected_points）
+            tick_index = -1
+            if self.wait_mode == 'timerfd':
+                tick_source = TickSource(self.DT)
+                tick_source.start(start_ns=experiment_clock.t0_mono_ns)
+            
+            # 帧存储为事件触发模式时，每个周期用已计算的值检查触发条件
+            check_triggers = frame_storage is not None and frame_storage.mode == 'triggered'
+            
+            # 分阶段时间戳直接写入预分配数组，热路径中不分配内存
+            stage_stamps = self.stage_profiler.stamps
+            read_ns = timer.get_raw_time_ns
+            
+            # 连续转换/后台采集时各通道的值不一定在本周期更新，同时记录各值的时间
+            pressure_ages = getattr(pressure_sensor, 'code_ages_ns', None)
             
             # 控制循环 - 确保运行8400次（84秒）
             for i in range(self.expected_points):
-                # 计算下一个采样时间点 - 这是关键部分，确保固定时间步长
-                next_sample_time = start_time + (i * self.DT)
+                stage_stamps[i, 0] = read_ns()
                 
                 # 以高精度等待到下一个采样时间
-                timer.busy_wait(next_sample_time)
+                if self.wait_mode == 'timerfd':
+                    # 到期次数大于1说明上一轮超时，错过了周期
+                    expirations = tick_source.wait()
+                    tick_index += expirations
+                    if tick_index >= self.expected_points:
+                        break
+                    current_ns = timer.get_time_ns()
+                    wake_error_ns = tick_source.last_wake_error_ns
+                    missed_periods = expirations - 1
+                else:
+                    # 计算下一个采样时间点 - 这是关键部分，确保固定时间步长（整数纳秒，无累计误差）
+                    next_sample_ns = start_ns + i * dt_ns
+                    if self.wait_mode == 'hybrid':
+                        wake_error_ns = timer.deadline_wait_ns(next_sample_ns)
+                        current_ns = next_sample_ns + wake_error_ns
+                    else:
+                        current_ns = timer.busy_wait_ns(next_sample_ns)
+                        wake_error_ns = current_ns - next_sample_ns
+                    # 追赶模式下只统计新落后的周期，避免同一次超时被重复计数
+                    behind = max(0, wake_error_ns // dt_ns)
+                    missed_periods = max(0, behind - prev_behind)
+                    prev_behind = behind
+                total_missed += missed_periods
                 
                 # 获取当前时间
-                current_time = timer.get_time()
-                elapsed_time = current_time - start_time
+                elapsed_ns = current_ns - start_ns
+                elapsed_time = elapsed_ns * 1e-9
                 
-                # 计算定时抖动
-                actual_dt = elapsed_time - prev_elapsed_time if i > 0 else self.DT
-                jitter_ms = (actual_dt - self.DT) * 1000  # 转换为毫秒
-                prev_elapsed_time = elapsed_time
+                # 计算定时抖动（整数纳秒相减，结果精确）
+                actual_dt_ns = elapsed_ns - prev_elapsed_ns if i > 0 else dt_ns
+                jitter_ms = (actual_dt_ns - dt_ns) * 1e-6  # 转换为毫秒
+                prev_elapsed_ns = elapsed_ns
                 
                 # 获取当前小球位置
+                stage_stamps[i, 1] = read_ns()
                 current_position = camera_controller.get_ball_position()
+                stage_stamps[i, 2] = read_ns()
                 
                 # 计算设定点 - 使用全局cycle_time变量
                 setpoint = self.generate_setpoint_curve(elapsed_time)
@@ -239,18 +392,23 @@ class ExperimentRunner:
                 duty_cycle = (output / 3.3) * 100
                 
                 # 设置PWM占空比
+                stage_stamps[i, 3] = read_ns()
                 pwm.change_duty_cycle(duty_cycle)
+                stage_stamps[i, 4] = read_ns()
                 
                 # 读取压力传感器数据
-                pressure_readings = [0.0, 0.0, 0.0]  # 默认值
+                pressure_codes = None
                 if pressure_sensor is not None:
                     try:
-                        readings = pressure_sensor.read_all_channels()
-                        # 提取校准后的压力值
-                        pressure_readings = [reading[3] for reading in readings]  # reading[3]是校准后的压力值
+                        # 只记录原始码值，校准压力在实验结束后批量换算
+                        self.pressure_raw_data[i] = pressure_sensor.read_codes()
+                        pressure_codes = self.pressure_raw_data[i]
+                        if pressure_ages is not None:
+                            self.pressure_age_data[i] = pressure_ages()
                     except Exception as e:
                         if i % 100 == 0:  # 每100次循环打印一次错误，避免日志过多
                             print(f"压力传感器读取错误: {e}")
+                stage_stamps[i, 5] = read_ns()
                 
                 # 记录数据
                 self.time_data[i] = elapsed_time
@@ -258,7 +416,10 @@ class ExperimentRunner:
                 self.position_data[i] = current_position
                 self.error_data[i] = error
                 self.output_data[i] = output
+                self.timestamp_ns_data[i] = timer.start_time_ns + current_ns
                 self.jitter_data[i] = jitter_ms
+                self.wake_error_data[i] = wake_error_ns * 1e-3
+                self.missed_periods_data[i] = missed_periods
                 self.kp_data[i] = current_kp
                 self.ki_data[i] = current_ki
                 self.kd_data[i] = current_kd
@@ -266,9 +427,11 @@ class ExperimentRunner:
                 self.p_term_data[i] = p_term
                 self.i_term_data[i] = i_term
                 self.d_term_data[i] = d_term
-                self.pressure_a0_data[i] = pressure_readings[0]
-                self.pressure_a1_data[i] = pressure_readings[1]
-                self.pressure_a2_data[i] = pressure_readings[2]
+                if check_triggers:
+                    frame_storage.check_triggers(elapsed_time, error, output, pressure_codes,
+                                                 camera_controller.ball_detected)
+                stage_stamps[i, 6] = read_ns()
+                self.stage_profiler.count = i + 1
                 
                 # 打印控制信息
                 if i % 100 == 0:  # 每100个点打印一次
@@ -281,6 +444,10 @@ class ExperimentRunner:
         except KeyboardInterrupt:
             print("\nExperiment interrupted!")
         finally:
+            # 关闭节拍源
+            if tick_source is not None:
+                tick_source.stop()
+            
             # 停止PWM
             if 'pwm' in locals():
                 pwm.stop()
@@ -291,8 +458,12 @@ class ExperimentRunner:
             
             # 标记实验结束
             self.experiment_running = False
+            self._calibrated_pressure_cache = None
+            experiment_clock.stop()
             
             # 打印最终统计
-            print(f"{self.experiment_duration}秒控制实验完成！总共运行了 {i+1} 次循环")
-            cycles_completed = (i+1) * self.DT / self.cycle_time
-            print(f"完成了 {cycles_completed:.2f} 个{self.cycle_time}秒周期") 
\ No newline at end of file
+            completed = self.stage_profiler.count
+            print(f"{self.experiment_duration}秒控制实验完成！总共运行了 {completed} 次循环")
+            cycles_completed = (completed + total_missed) * self.DT / self.cycle_time
+            print(f"完成了 {cycles_completed:.2f} 个{self.cycle_time}秒周期")
+            print(f"错过的控制周期总数: {total_missed}") 
\ No newline at end of file
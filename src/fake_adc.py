@@ -0,0 +1,145 @@
+# coding=utf-8
+"""
+模拟ADS1015，用于在非树莓派环境下测试和评估压力采集的时序逻辑
+
+使用方法:
+python -m src.fake_adc
+"""
+import math
+import time
+
+class _FakeI2CDevice:
+    """模拟Adafruit_GPIO.I2C.Device，只支持写配置寄存器（PressureSensor不阻塞地切换通道时使用）"""
+    DATA_RATES = {0x0000: 128, 0x0020: 250, 0x0040: 490, 0x0060: 920, 0x0080: 1600, 0x00A0: 2400, 0x00C0: 3300}
+
+    def __init__(self, adc):
+        self.adc = adc
+
+    def writeList(self, register, data):
+        self.adc._i2c()
+        if register != 0x01:
+            return
+        config = (data[0] << 8) | data[1]
+        mux = (config >> 12) & 0x07
+        if config & 0x0100:
+            # 单次转换模式
+            self.adc._channel = None
+            return
+        self.adc._begin_continuous(mux - 0x04, self.DATA_RATES[config & 0x00E0])
+
+
+class FakeADS1015:
+    """
+    接口与Adafruit_ADS1x15.ADS1015一致的模拟ADC，模拟I2C传输耗时和转换时间
+    与Adafruit库相同，read_adc/start_adc/start_adc_comparator写配置后休眠一个转换时间再读取结果
+    """
+    def __init__(self, i2c_latency=150e-6, signal=None, address=0x48, busnum=1):
+        """
+        i2c_latency: 每次I2C读写事务的模拟耗时（秒）
+        signal: 信号函数signal(channel, t) -> 12位ADC码值，默认为缓慢变化的正弦信号
+        """
+        self.address = address
+        self.busnum = busnum
+        self.i2c_latency = i2c_latency
+        self.signal = signal if signal is not None else self._default_signal
+        self.transactions = 0  # 累计I2C事务数
+        
+        # 连续转换状态
+        self._channel = None
+        self._data_rate = 3300
+        self._start_time = 0.0
+        self._last_result = 0
+        self._device = _FakeI2CDevice(self)
+    
+    @staticmethod
+    def _default_signal(channel, t):
+        """默认信号：每个通道一个不同相位的1Hz正弦，幅值在码值200~1800之间"""
+        return int(1000 + 800 * math.sin(2 * math.pi * t + channel))
+    
+    def _i2c(self):
+        """模拟一次I2C事务的耗时"""
+        self.transactions += 1
+        end = time.perf_counter() + self.i2c_latency
+        while time.perf_counter() < end:
+            pass
+    
+    def _conversion_time(self, data_rate):
+        return 1.0 / data_rate
+    
+    def read_adc(self, channel, gain=1, data_rate=None):
+        """单次转换：写配置、等待转换完成、读取结果"""
+        data_rate = data_rate or 1600
+        self._i2c()
+        time.sleep(self._conversion_time(data_rate) + 0.0001)
+        self._i2c()
+        return self.signal(channel, time.monotonic())
+    
+    def _begin_continuous(self, channel, data_rate):
+        """配置寄存器写入后ADC按数据速率持续转换"""
+        self._channel = channel
+        self._data_rate = data_rate
+        self._start_time = time.monotonic()
+    
+    def start_adc(self, channel, gain=1, data_rate=None):
+        """开始连续转换：与库函数相同，写配置、等待一次转换完成并读取结果"""
+        data_rate = data_rate or 1600
+        self._i2c()
+        self._begin_continuous(channel, data_rate)
+        time.sleep(self._conversion_time(data_rate) + 0.0001)
+        return self.get_last_result()
+    
+    def start_adc_comparator(self, channel, high_threshold, low_threshold, gain=1, data_rate=None,
+                             active_low=True, traditional=True, latching=False, num_readings=1):
+        """开始带比较器（ALERT/RDY）的连续转换"""
+        self._i2c()  # 阈值寄存器
+        self._i2c()
+        return self.start_adc(channel, gain, data_rate)
+    
+    def get_last_result(self):
+        """读取转换寄存器：只有在切换通道后至少完成一次转换时才返回新通道的数据"""
+        self._i2c()
+        if self._channel is not None:
+            now = time.monotonic()
+            if now - self._start_time >= self._conversion_time(self._data_rate):
+                self._last_result = self.signal(self._channel, now)
+        return self._last_result
+    
+    def stop_adc(self):
+        """停止连续转换"""
+        self._i2c()
+        self._channel = None
+
+
+def benchmark_read_modes(iterations=500, channels=(0, 1, 2)):
+    """
+    使用模拟ADC比较各模式下read_all_channels的耗时
+    'single'为单次转换；'continuous'为连续转换、直接写配置寄存器切换通道；
+    'continuous_library'为连续转换、用库函数start_adc切换通道（每次切换阻塞一个转换时间）
+    返回: {模式: (每次调用的平均耗时（微秒）, 各通道数据的平均时间（毫秒）)}
+    """
+    from .pressure_sensor import PressureSensor
+    results = {}
+    for name in ('single', 'continuous', 'continuous_library'):
+        adc = FakeADS1015()
+        if name == 'continuous_library':
+            adc._device = None
+        sensor = PressureSensor(channels=list(channels), mode='single' if name == 'single' else 'continuous',
+                                adc=adc)
+        # 每次调用之间间隔一个控制周期，使连续模式下的转换已经完成
+        elapsed = 0.0
+        age_ns = 0
+        for _ in range(iterations):
+            time.sleep(0.01)
+            start = time.perf_counter()
+            sensor.read_all_channels()
+            elapsed += time.perf_counter() - start
+            age_ns += sum(sensor.code_ages_ns()) / len(channels)
+        sensor.close()
+        results[name] = (elapsed / iterations * 1e6, age_ns / iterations * 1e-6)
+    return results
+
+
+if __name__ == '__main__':
+    print("模拟ADC下read_all_channels耗时（每10ms调用一次）")
+    for mode, (cost_us, age_ms) in benchmark_read_modes().items():
+        print(f"{mode:20s} {cost_us:8.1f} us/call  数据平均时间 {age_ms:6.2f} ms")
@@ -0,0 +1,220 @@
+# coding=utf-8
+import mmap
+import struct
+import zlib
+import cv2
+import numpy as np
+
+# 文件布局:
+#   文件头   FILE_HEADER: 魔数、版本、编码方式、帧高、帧宽
+#   数据块   CHUNK_HEADER(魔数, 帧数) + 帧数×CHUNK_ENTRY(帧序号, 时间戳, 字节数) + 各帧压缩数据
+#   索引     INDEX_DTYPE数组（帧序号、时间戳、字节偏移、字节数）
+#   文件尾   FILE_TRAILER: 索引偏移、帧数、魔数
+# 每帧单独压缩，按时间读取时只解码目标帧；缺少文件尾（如程序异常退出）时可扫描数据块重建索引
+FILE_MAGIC = b'VFRA'
+CHUNK_MAGIC = b'CHNK'
+TRAILER_MAGIC = b'VFRI'
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct('<4sHHII')
+CHUNK_HEADER = struct.Struct('<4sI')
+CHUNK_ENTRY = struct.Struct('<qdI')
+FILE_TRAILER = struct.Struct('<QQ4s')
+
+CODECS = {'jpeg': 0, 'png': 1, 'zlib': 2}
+CODEC_NAMES = {v: k for k, v in CODECS.items()}
+
+INDEX_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('timestamp', '<f8'),
+    ('offset', '<i8'),
+    ('length', '<i8'),
+])
+
+
+class FrameArchiveWriter:
+    """分块写入帧归档文件，每个数据块包含chunk_frames帧"""
+    def __init__(self, path, frame_shape=(480, 640), codec='jpeg', chunk_frames=100,
+                 jpeg_quality=85, png_compression=1, zlib_level=1):
+        """
+        path: 归档文件路径
+        frame_shape: 帧尺寸(H, W)，MONO8
+        codec: 'jpeg'、'png'或'zlib'（zlib为无损压缩的原始像素）
+        chunk_frames: 每个数据块的帧数
+        """
+        if codec not in CODECS:
+            raise ValueError(f"未知的编码方式: {codec}")
+
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.codec = codec
+        self.chunk_frames = max(1, int(chunk_frames))
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression
+        self.zlib_level = zlib_level
+
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, FORMAT_VERSION, CODECS[codec],
+                                         self.frame_shape[0], self.frame_shape[1]))
+        self.offset = FILE_HEADER.size
+
+        self.pending = []  # 当前数据块中的(帧序号, 时间戳, 压缩数据)
+        self.index = []  # 已写入数据块的(帧序号, 时间戳, 偏移, 字节数)
+        self.frame_count = 0
+
+    def encode(self, frame):
+        """按编码方式压缩一帧，返回bytes"""
+        if self.codec == 'jpeg':
+            _, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            return data.tobytes()
+        if self.codec == 'png':
+            _, data = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+            return data.tobytes()
+        return zlib.compress(np.ascontiguousarray(frame).data, self.zlib_level)
+
+    def append(self, frame, timestamp):
+        """压缩并追加一帧，数据块满时写入文件"""
+        self.pending.append((self.frame_count, timestamp, self.encode(frame)))
+        self.frame_count += 1
+        if len(self.pending) >= self.chunk_frames:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+        """把当前数据块写入文件"""
+        if not self.pending:
+            return
+
+        header = [CHUNK_HEADER.pack(CHUNK_MAGIC, len(self.pending))]
+        header.extend(CHUNK_ENTRY.pack(n, t, len(data)) for n, t, data in self.pending)
+        header = b''.join(header)
+
+        # 数据块头之后依次是各帧压缩数据
+        data_offset = self.offset + len(header)
+        for n, t, data in self.pending:
+            self.index.append((n, t, data_offset, len(data)))
+            data_offset += len(data)
+
+        self.file.write(header)
+        for _, _, data in self.pending:
+            self.file.write(data)
+        self.offset = data_offset
+        self.pending = []
+
+    def close(self):
+        """写入剩余数据块、索引和文件尾"""
+        if self.file is None:
+            return
+
+        self.flush_chunk()
+        index = np.array(self.index, dtype=INDEX_DTYPE)
+        self.file.write(index.tobytes())
+        self.file.write(FILE_TRAILER.pack(self.offset, len(index), TRAILER_MAGIC))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FrameArchiveReader:
+    """通过mmap随机读取帧归档文件，按帧序号或实验时间定位"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, codec, height, width = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"不是帧归档文件: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"不支持的帧归档版本: {version}")
+        self.codec = CODEC_NAMES[codec]
+        self.frame_shape = (height, width)
+
+        self.index = self._read_index()
+        self.timestamps = self.index['timestamp']
+
+    def _read_index(self):
+        """读取文件尾的索引；没有文件尾时扫描数据块重建"""
+        if len(self.mm) >= FILE_HEADER.size + FILE_TRAILER.size:
+            index_offset, count, magic = FILE_TRAILER.unpack_from(self.mm, len(self.mm) - FILE_TRAILER.size)
+            if magic == TRAILER_MAGIC:
+                return np.frombuffer(self.mm, dtype=INDEX_DTYPE, count=count, offset=index_offset).copy()
+
+        print(f"帧归档缺少索引，扫描数据块重建: {self.path}")
+        entries = []
+        offset = FILE_HEADER.size
+        while offset + CHUNK_HEADER.size <= len(self.mm):
+            magic, n = CHUNK_HEADER.unpack_from(self.mm, offset)
+            if magic != CHUNK_MAGIC:
+                break
+            offset += CHUNK_HEADER.size
+            if offset + n * CHUNK_ENTRY.size > len(self.mm):
+                break  # 最后一个数据块的帧表未写完整
+            chunk = [CHUNK_ENTRY.unpack_from(self.mm, offset + k * CHUNK_ENTRY.size) for k in range(n)]
+            data_offset = offset + n * CHUNK_ENTRY.size
+            complete = True
+            for frame_number, timestamp, length in chunk:
+                if data_offset + length > len(self.mm):
+                    complete = False  # 最后一个数据块未写完整
+                    break
+                entries.append((frame_number, timestamp, data_offset, length))
+                data_offset += length
+            if not complete:
+                break
+            offset = data_offset
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def decode(self, i):
+        """解码第i帧（索引中的位置），返回灰度图"""
+        offset = int(self.index['offset'][i])
+        length = int(self.index['length'][i])
+        if self.codec == 'zlib':
+            data = zlib.decompress(self.mm[offset:offset + length])
+            return np.frombuffer(data, dtype=np.uint8).reshape(self.frame_shape)
+        buf = np.frombuffer(self.mm, dtype=np.uint8, count=length, offset=offset)
+        frame = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+        del buf  # 释放对mmap的引用，否则无法关闭
+        return frame
+
+    def find(self, t):
+        """返回时间戳最接近t的帧在索引中的位置"""
+        i = int(np.searchsorted(self.timestamps, t))
+        if i >= len(self.timestamps):
+            return len(self.timestamps) - 1
+        if i > 0 and t - self.timestamps[i - 1] <= self.timestamps[i] - t:
+            return i - 1
+        return i
+
+    def get_frame(self, t):
+        """读取时间最接近t（秒）的帧，返回(帧序号, 时间戳, 灰度图)"""
+        if len(self.index) == 0:
+            return None
+        i = self.find(t)
+        return int(self.index['frame'][i]), float(self.timestamps[i]), self.decode(i)
+
+    def iter_frames(self, t0, t1):
+        """按顺序产出时间戳在[t0, t1]内的(帧序号, 时间戳, 灰度图)"""
+        lo = int(np.searchsorted(self.timestamps, t0, side='left'))
+        hi = int(np.searchsorted(self.timestamps, t1, side='right'))
+        for i in range(lo, hi):
+            yield int(self.index['frame'][i]), float(self.timestamps[i]), self.decode(i)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,111 @@
+# coding=utf-8
+import os
+import numpy as np
+
+class FrameArena:
+    """
+    压缩帧的连续内存池
+    压缩数据依次拷贝到大块预分配的bytearray中，偏移和长度记录在预分配的数组里，
+    每帧不再单独保留一个numpy对象；内存块总量达到memory_budget后，后续帧写入磁盘上的溢出文件
+    """
+    def __init__(self, capacity, chunk_bytes=32 * 1024 * 1024, memory_budget=512 * 1024 * 1024,
+                 spill_path=None):
+        """
+        capacity: 最大帧数
+        chunk_bytes: 每个内存块的字节数，内存池按块增长
+        memory_budget: 内存块总字节数上限
+        spill_path: 超出内存上限后使用的溢出文件路径，为None时丢弃超出的帧
+        """
+        self.capacity = int(capacity)
+        self.chunk_bytes = int(chunk_bytes)
+        self.memory_budget = int(memory_budget)
+        self.spill_path = spill_path
+
+        # 每帧所在的内存块（-1为溢出文件）、块内偏移和长度
+        self.chunk_ids = np.zeros(self.capacity, dtype=np.int32)
+        self.offsets = np.zeros(self.capacity, dtype=np.int64)
+        self.lengths = np.zeros(self.capacity, dtype=np.int32)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.count = 0
+
+        # 预先分配第一个内存块
+        self.chunks = [bytearray(self.chunk_bytes)]
+        self.cursor = 0
+        self.spill_file = None
+        self.spill_offset = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def memory_bytes(self):
+        """内存块占用的总字节数"""
+        return len(self.chunks) * self.chunk_bytes
+
+    @property
+    def used_bytes(self):
+        """已写入的压缩数据总字节数"""
+        return int(np.sum(self.lengths[:self.count]))
+
+    def _open_spill(self):
+        self.spill_file = open(self.spill_path, 'wb+')
+        self.spill_offset = 0
+        print(f"帧内存池达到上限 {self.memory_budget / 1024 / 1024:.0f} MB，后续帧写入: {self.spill_path}")
+
+    def append(self, data, timestamp):
+        """
+        追加一帧压缩数据（如cv2.imencode的输出），返回是否写入成功
+        """
+        data = memoryview(data).cast('B')  # imencode的输出为(N, 1)数组，按字节展开
+        n = data.nbytes
+        if self.count >= self.capacity or n > self.chunk_bytes:
+            self.dropped += 1
+            return False
+
+        if self.spill_file is None and self.cursor + n > self.chunk_bytes:
+            # 当前块剩余空间不足，按块增长，超过内存上限时改为写入溢出文件
+            if self.memory_bytes + self.chunk_bytes <= self.memory_budget:
+                self.chunks.append(bytearray(self.chunk_bytes))
+                self.cursor = 0
+            elif self.spill_path is not None:
+                self._open_spill()
+            else:
+                self.dropped += 1
+                return False
+
+        i = self.count
+        if self.spill_file is None:
+            self.chunks[-1][self.cursor:self.cursor + n] = data
+            self.chunk_ids[i] = len(self.chunks) - 1
+            self.offsets[i] = self.cursor
+            self.cursor += n
+        else:
+            self.spill_file.write(data)
+            self.chunk_ids[i] = -1
+            self.offsets[i] = self.spill_offset
+            self.spill_offset += n
+
+        self.lengths[i] = n
+        self.timestamps[i] = timestamp
+        self.count += 1
+        return True
+
+    def get(self, i):
+        """返回第i帧的压缩数据（uint8数组，内存块中的帧不拷贝）"""
+        offset = int(self.offsets[i])
+        length = int(self.lengths[i])
+        chunk_id = int(self.chunk_ids[i])
+        if chunk_id >= 0:
+            return np.frombuffer(self.chunks[chunk_id], dtype=np.uint8, count=length, offset=offset)
+        self.spill_file.flush()
+        return np.frombuffer(os.pread(self.spill_file.fileno(), length, offset), dtype=np.uint8)
+
+    def close(self):
+        """释放内存块并删除溢出文件"""
+        self.chunks = []
+        self.count = 0
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+            os.remove(self.spill_path)
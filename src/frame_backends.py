@@ -0,0 +1,387 @@
+# coding=utf-8
+import os
+import cv2
+import numpy as np
+from .video_encoder import StreamingVideoEncoder
+from .raw_frame_ring import RawFrameRing
+from .frame_archive import FrameArchiveWriter, FrameArchiveReader
+from .frame_arena import FrameArena
+from .event_capture import EventTriggers, TriggeredFrameBuffer
+
+class FrameBackend:
+    """
+    帧存储后端接口
+    FrameStorage负责录制状态、帧数限制和视频生成，后端只负责保存帧：
+    start()在录制开始前分配资源，add()在相机线程中保存一帧，stop()在录制结束后落盘，
+    timestamps()/load()供create_video读取，release()在视频生成后释放资源
+    """
+    name = None
+    creates_video = True  # 是否由create_video在实验结束后生成视频
+    no_video_message = ""  # 不生成视频时的提示
+    requires_max_frames = False  # 是否需要max_frames预分配存储空间
+
+    def __init__(self, save_path, max_frames):
+        if self.requires_max_frames and max_frames is None:
+            raise ValueError(f"'{self.name}'模式需要指定max_frames以预分配存储空间")
+        self.save_path = save_path
+        self.max_frames = max_frames
+
+    def start(self, stamp):
+        """录制开始前调用，stamp为输出文件名中的时间戳"""
+        pass
+
+    def add(self, frame, timestamp):
+        """保存一帧灰度图（相机线程调用），返回是否保存成功"""
+        raise NotImplementedError
+
+    def stop(self):
+        """录制结束后调用"""
+        pass
+
+    def timestamps(self, count):
+        """按记录顺序返回前count帧的时间戳"""
+        raise NotImplementedError
+
+    def load(self, i):
+        """读取第i帧灰度图（可在多个线程中并行调用）"""
+        raise NotImplementedError
+
+    def release(self):
+        """视频生成后释放帧数据"""
+        pass
+
+    def check_triggers(self, timestamp, error, output, pressure_codes=None, ball_detected=True):
+        """控制循环每个周期调用，只有事件触发后端使用"""
+        pass
+
+
+class JpegListBackend(FrameBackend):
+    """在内存列表中保存JPEG压缩帧"""
+    name = 'jpeg'
+
+    def __init__(self, save_path, max_frames, jpeg_quality=85):
+        super().__init__(save_path, max_frames)
+        self.jpeg_quality = jpeg_quality
+        self.frames = []  # 存储帧数据
+        self.frame_timestamps = []  # 存储时间戳
+
+    def start(self, stamp):
+        self.frames.clear()
+        self.frame_timestamps.clear()
+
+    def add(self, frame, timestamp):
+        # 压缩帧以节省内存
+        _, compressed_frame = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        self.frames.append(compressed_frame)
+        self.frame_timestamps.append(timestamp)
+        return True
+
+    def timestamps(self, count):
+        return self.frame_timestamps[:count]
+
+    def load(self, i):
+        return cv2.imdecode(self.frames[i], cv2.IMREAD_GRAYSCALE)
+
+    def release(self):
+        self.frames.clear()
+        self.frame_timestamps.clear()
+
+
+class StreamingBackend(FrameBackend):
+    """通过有界队列交给后台编码线程，录制过程中直接写入视频（video_encoder.py）"""
+    name = 'stream'
+    creates_video = False
+    no_video_message = "流式模式下视频已在录制过程中生成"
+
+    def __init__(self, save_path, max_frames, fps=100.0, queue_size=256):
+        super().__init__(save_path, max_frames)
+        self.fps = fps
+        self.queue_size = queue_size
+        self.encoder = None
+
+    def start(self, stamp):
+        video_filename = os.path.join(self.save_path, f"control_experiment_{stamp}.mp4")
+        self.encoder = StreamingVideoEncoder(video_filename, fps=self.fps,
+                                             queue_size=self.queue_size,
+                                             total_frames=self.max_frames)
+        self.encoder.start()
+
+    def add(self, frame, timestamp):
+        # 相机帧缓冲区会被下一帧覆盖，入队前复制一份；队列满时丢帧，不阻塞相机线程
+        return self.encoder.submit(frame.copy(), timestamp)
+
+    def stop(self):
+        # 等待编码线程写完队列中剩余的帧
+        self.encoder.finish()
+        self.encoder.print_stats()
+
+
+class RawMemmapBackend(FrameBackend):
+    """把原始帧拷贝到预分配的内存映射文件中，编码留到实验结束后（raw_frame_ring.py）"""
+    name = 'raw'
+    requires_max_frames = True
+
+    def __init__(self, save_path, max_frames, frame_shape=(480, 640)):
+        super().__init__(save_path, max_frames)
+        self.frame_shape = tuple(frame_shape)
+        self.ring = None
+        self.filename = None
+
+    def start(self, stamp):
+        # 在录制开始前一次性创建内存映射文件，相机线程中只做内存拷贝
+        self.filename = os.path.join(self.save_path, f"raw_frames_{stamp}.npy")
+        self.ring = RawFrameRing(self.max_frames, self.frame_shape, path=self.filename)
+
+    def add(self, frame, timestamp):
+        # 从SDK缓冲区一次内存拷贝写入内存映射
+        return self.ring.append(frame, timestamp)
+
+    def stop(self):
+        # 时间戳与原始帧文件同名保存，帧文件可用np.load(mmap_mode='r')直接读取
+        self.ring.flush()
+        np.save(self.filename.replace("_frames_", "_timestamps_"), self.ring.timestamps[:len(self.ring)])
+        print(f"原始帧已保存到: {self.filename}")
+
+    def timestamps(self, count):
+        return self.ring.timestamps[:count]
+
+    def load(self, i):
+        return self.ring.frames[i]
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class RoiStripBackend(FrameBackend):
+    """每帧只保存检测ROI条带，完整帧按full_frame_interval抽样保存"""
+    name = 'roi'
+    requires_max_frames = True
+
+    def __init__(self, save_path, max_frames, roi=None, frame_shape=(480, 640), full_frame_interval=50):
+        """
+        roi: 保存的条带(x, y, 宽, 高)，通常传入CameraController.ROI
+        frame_shape: 完整帧尺寸(H, W)
+        full_frame_interval: 每隔多少帧保存一帧完整帧
+        """
+        super().__init__(save_path, max_frames)
+        if roi is None:
+            raise ValueError("'roi'模式需要指定roi=(x, y, 宽, 高)")
+        self.roi = tuple(roi)
+        self.frame_shape = tuple(frame_shape)
+        self.full_frame_interval = max(1, int(full_frame_interval))
+        self.ring = None  # ROI条带
+        self.filename = None
+        self.snapshot_ring = None  # 抽样保存的完整帧
+        self.snapshot_frame_numbers = None  # 抽样完整帧对应的帧序号
+
+    def start(self, stamp):
+        # ROI条带逐帧保存，完整帧按间隔抽样保存，两路均预分配内存映射文件
+        _, _, roi_width, roi_height = self.roi
+        self.filename = os.path.join(self.save_path, f"roi_frames_{stamp}.npy")
+        self.ring = RawFrameRing(self.max_frames, (roi_height, roi_width), path=self.filename)
+        snapshot_capacity = (self.max_frames - 1) // self.full_frame_interval + 1
+        self.snapshot_ring = RawFrameRing(snapshot_capacity, self.frame_shape,
+                                          path=os.path.join(self.save_path, f"full_frames_{stamp}.npy"))
+        self.snapshot_frame_numbers = np.zeros(snapshot_capacity, dtype=np.int64)
+
+    def add(self, frame, timestamp):
+        frame_number = self.ring.write_count
+        roi_x, roi_y, roi_width, roi_height = self.roi
+        if not self.ring.append(frame[roi_y:roi_y+roi_height, roi_x:roi_x+roi_width], timestamp):
+            return False
+        if frame_number % self.full_frame_interval == 0:
+            self.snapshot_frame_numbers[len(self.snapshot_ring)] = frame_number
+            self.snapshot_ring.append(frame, timestamp)
+        return True
+
+    def stop(self):
+        self.ring.flush()
+        np.save(self.filename.replace("_frames_", "_timestamps_"), self.ring.timestamps[:len(self.ring)])
+        print(f"ROI条带已保存到: {self.filename}")
+
+        # 抽样完整帧的时间戳和帧序号，可与ROI条带按时间戳或帧序号对应
+        self.snapshot_ring.flush()
+        n = len(self.snapshot_ring)
+        np.save(self.snapshot_ring.path.replace("full_frames_", "full_timestamps_"),
+                self.snapshot_ring.timestamps[:n])
+        np.save(self.snapshot_ring.path.replace("full_frames_", "full_frame_numbers_"),
+                self.snapshot_frame_numbers[:n])
+        print(f"抽样完整帧已保存到: {self.snapshot_ring.path} ({n} 帧)")
+
+    def timestamps(self, count):
+        return self.ring.timestamps[:count]
+
+    def load(self, i):
+        # 以最近一帧抽样完整帧为底图，贴上该帧的ROI条带
+        k = np.searchsorted(self.snapshot_frame_numbers[:len(self.snapshot_ring)], i, side='right') - 1
+        frame = self.snapshot_ring.frames[k].copy()
+        roi_x, roi_y, roi_width, roi_height = self.roi
+        frame[roi_y:roi_y+roi_height, roi_x:roi_x+roi_width] = self.ring.frames[i]
+        return frame
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.snapshot_ring is not None:
+            self.snapshot_ring.close()
+            self.snapshot_ring = None
+
+
+class ArchiveBackend(FrameBackend):
+    """逐帧压缩写入带时间索引的分块归档文件（frame_archive.py）"""
+    name = 'archive'
+
+    def __init__(self, save_path, max_frames, frame_shape=(480, 640), archive_codec='jpeg', chunk_frames=100):
+        """
+        archive_codec: 压缩方式，'jpeg'、'png'或'zlib'
+        chunk_frames: 每个数据块的帧数
+        """
+        super().__init__(save_path, max_frames)
+        self.frame_shape = tuple(frame_shape)
+        self.archive_codec = archive_codec
+        self.chunk_frames = chunk_frames
+        self.writer = None
+        self.reader = None
+
+    def start(self, stamp):
+        self.writer = FrameArchiveWriter(
+            os.path.join(self.save_path, f"frames_{stamp}.vfa"),
+            frame_shape=self.frame_shape,
+            codec=self.archive_codec,
+            chunk_frames=self.chunk_frames
+        )
+
+    def add(self, frame, timestamp):
+        self.writer.append(frame, timestamp)
+        return True
+
+    def stop(self):
+        # 写入索引后以只读方式重新打开，供create_video和按时间读取使用
+        self.writer.close()
+        self.reader = FrameArchiveReader(self.writer.path)
+        self.writer = None
+        print(f"帧归档已保存到: {self.reader.path}")
+
+    def timestamps(self, count):
+        return self.reader.timestamps[:count]
+
+    def load(self, i):
+        return self.reader.decode(i)
+
+    def release(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+class ArenaBackend(FrameBackend):
+    """JPEG压缩帧拷贝到大块预分配的内存池中（frame_arena.py）"""
+    name = 'arena'
+    requires_max_frames = True
+
+    def __init__(self, save_path, max_frames, arena_chunk_bytes=32 * 1024 * 1024,
+                 memory_budget=512 * 1024 * 1024, jpeg_quality=85):
+        """
+        arena_chunk_bytes: 内存池每次增长的字节数
+        memory_budget: 内存池的字节数上限，超过后写入溢出文件
+        """
+        super().__init__(save_path, max_frames)
+        self.arena_chunk_bytes = arena_chunk_bytes
+        self.memory_budget = memory_budget
+        self.jpeg_quality = jpeg_quality
+        self.arena = None
+
+    def start(self, stamp):
+        self.arena = FrameArena(self.max_frames, self.arena_chunk_bytes, self.memory_budget,
+                                spill_path=os.path.join(self.save_path, f"frames_spill_{stamp}.bin"))
+
+    def add(self, frame, timestamp):
+        # 压缩结果拷贝进内存池后即释放，不再为每帧保留单独的对象
+        _, compressed_frame = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return self.arena.append(compressed_frame, timestamp)
+
+    def stop(self):
+        print(f"帧内存池: 压缩数据 {self.arena.used_bytes / 1024 / 1024:.1f} MB, "
+              f"内存块 {self.arena.memory_bytes / 1024 / 1024:.0f} MB, "
+              f"溢出文件 {self.arena.spill_offset / 1024 / 1024:.1f} MB, 丢弃 {self.arena.dropped} 帧")
+
+    def timestamps(self, count):
+        return self.arena.timestamps[:count]
+
+    def load(self, i):
+        return cv2.imdecode(self.arena.get(i), cv2.IMREAD_GRAYSCALE)
+
+    def release(self):
+        if self.arena is not None:
+            self.arena.close()
+            self.arena = None
+
+
+class TriggeredBackend(FrameBackend):
+    """只在内存中保留最近几秒的帧，事件触发时保存前后的片段（event_capture.py）"""
+    name = 'triggered'
+    creates_video = False
+    no_video_message = "事件触发模式下只保存事件片段（event_*.vfa），不生成完整视频"
+
+    def __init__(self, save_path, max_frames, frame_shape=(480, 640), fps=100.0, triggers=None,
+                 pre_seconds=2.0, post_seconds=2.0, max_events=50):
+        """
+        triggers: 触发条件（EventTriggers），默认使用EventTriggers()
+        pre_seconds/post_seconds: 保存触发时刻之前/之后的时长（秒）
+        max_events: 最多保存的事件数
+        """
+        super().__init__(save_path, max_frames)
+        self.frame_shape = tuple(frame_shape)
+        self.fps = fps
+        self.triggers = triggers if triggers is not None else EventTriggers()
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_events = max_events
+        self.event_buffer = None
+
+    def start(self, stamp):
+        self.triggers.reset()
+        self.event_buffer = TriggeredFrameBuffer(self.save_path, stamp, self.frame_shape, fps=self.fps,
+                                                 pre_seconds=self.pre_seconds,
+                                                 post_seconds=self.post_seconds,
+                                                 max_events=self.max_events)
+
+    def add(self, frame, timestamp):
+        self.event_buffer.add_frame(frame, timestamp)
+        return True
+
+    def check_triggers(self, timestamp, error, output, pressure_codes=None, ball_detected=True):
+        if self.event_buffer is None:
+            return
+        reason = self.triggers.check(error, output, pressure_codes, ball_detected)
+        if reason is not None:
+            self.event_buffer.trigger(timestamp, reason)
+
+    def stop(self):
+        self.event_buffer.close()
+        self.event_buffer = None
+
+
+class NullBackend(FrameBackend):
+    """不保存任何帧，用于只需要位置检测的实验和基准测试"""
+    name = 'null'
+    creates_video = False
+    no_video_message = "未保存帧数据（'null'模式）"
+
+    def add(self, frame, timestamp):
+        return True
+
+
+BACKENDS = {backend.name: backend for backend in (
+    JpegListBackend, StreamingBackend, RawMemmapBackend, RoiStripBackend,
+    ArchiveBackend, ArenaBackend, TriggeredBackend, NullBackend)}
+
+
+def create_backend(name, save_path, max_frames, **options):
+    """按名称创建存储后端，options为该后端的构造参数"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知的帧存储模式: {name}")
+    return BACKENDS[name](save_path, max_frames, **options)
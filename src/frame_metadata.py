@@ -0,0 +1,82 @@
+# coding=utf-8
+import os
+import numpy as np
+
+class FrameMetadataLog:
+    """逐帧元数据记录，每帧一行写入预分配的结构化数组，事后保存为.npy"""
+    DTYPE = np.dtype([
+        ('frame_id', '<u4'),        # SDK帧ID（CameraGetFrameID）
+        ('hw_timestamp', '<u8'),    # 相机硬件时间戳（CameraGetFrameTimeStamp）
+        ('host_time_ns', '<i8'),    # 主机收到帧的时间（相对实验t0，纳秒）
+        ('processing_ns', '<i8'),   # 收到帧到检测完成的耗时（纳秒）
+        ('cx', '<f4'),              # 检测到的球质心x（像素，完整帧坐标系），未检测到为NaN
+        ('cy', '<f4'),              # 检测到的球质心y（像素，完整帧坐标系），未检测到为NaN
+        ('area', '<i4'),            # 连通区域面积（像素）
+        ('circularity', '<f4'),     # 圆度
+        ('found', '?'),             # 是否检测到球
+    ])
+
+    def __init__(self, capacity=65536):
+        """capacity: 最大帧数，超过后不再记录并计数"""
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=self.DTYPE)
+        self.count = 0
+        self.overflow = 0
+
+    def reset(self):
+        """清空上次记录"""
+        self.count = 0
+        self.overflow = 0
+
+    def record(self, frame_id, hw_timestamp, host_time_ns, processing_ns,
+               cx=np.nan, cy=np.nan, area=0, circularity=0.0, found=False):
+        """记录一帧"""
+        if self.count >= self.capacity:
+            self.overflow += 1
+            return
+        self.records[self.count] = (frame_id, hw_timestamp, host_time_ns, processing_ns,
+                                    cx, cy, area, circularity, found)
+        self.count += 1
+
+    @property
+    def data(self):
+        """已记录的元数据"""
+        return self.records[:self.count]
+
+    def dropped_frames(self):
+        """根据SDK帧ID的间隔估计丢失的帧数"""
+        if self.count < 2:
+            return 0
+        gaps = np.diff(self.data['frame_id'].astype(np.int64))
+        return int(np.sum(gaps[gaps > 1] - 1))
+
+    def summary(self):
+        """返回帧数、检测率、丢帧数和处理耗时统计（微秒）"""
+        data = self.data
+        if self.count == 0:
+            return {}
+        processing_us = data['processing_ns'] * 1e-3
+        p50, p99 = np.percentile(processing_us, [50, 99])
+        return {'frames': self.count, 'found_rate': float(np.mean(data['found'])),
+                'dropped': self.dropped_frames(), 'processing_p50': p50,
+                'processing_p99': p99, 'processing_max': float(np.max(processing_us))}
+
+    def save(self, save_path, timestamp):
+        """
+        保存为frame_metadata_{timestamp}.npy（结构化数组，可用np.load直接读取）
+        save_path: 保存目录（与帧数据相同）
+        """
+        if self.count == 0:
+            print("没有逐帧元数据")
+            return
+
+        metadata_filename = os.path.join(save_path, f"frame_metadata_{timestamp}.npy")
+        np.save(metadata_filename, self.data)
+
+        stats = self.summary()
+        print(f"Frame metadata saved to {metadata_filename}")
+        print(f"帧元数据: {stats['frames']} 帧, 检测率 {stats['found_rate'] * 100:.1f}%, "
+              f"按帧ID估计丢帧 {stats['dropped']} 帧, 处理耗时 p50 {stats['processing_p50']:.0f}us / "
+              f"p99 {stats['processing_p99']:.0f}us / max {stats['processing_max']:.0f}us")
+        if self.overflow:
+            print(f"帧元数据超出容量，{self.overflow} 帧未记录")
@@ -3,37 +3,58 @@ import os
 import time
 import cv2
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .frame_backends import FrameBackend, create_backend
 
 class FrameStorage:
-    def __init__(self, save_path, max_frames=8400):
+    def __init__(self, save_path, max_frames=8400, mode='jpeg', **backend_options):
         """
         初始化帧存储器
         save_path: 保存路径
-        max_frames: 最大帧数
+        max_frames: 最大帧数（'stream'/'triggered'/'null'模式下可为None，不限制录制时长）
+        mode: 存储后端名称或FrameBackend实例（见frame_backends.py）：
+              'jpeg'在内存中保存JPEG压缩帧，实验结束后生成视频；
+              'stream'通过有界队列交给后台编码线程，录制过程中直接写入视频；
+              'raw'把原始帧拷贝到预分配的内存映射文件中，编码留到实验结束后；
+              'roi'每帧只保存检测ROI条带，完整帧按full_frame_interval抽样保存；
+              'archive'逐帧压缩写入带时间索引的分块归档文件（frame_archive.py）；
+              'arena'与'jpeg'相同但压缩数据拷贝到大块预分配的内存池中（frame_arena.py）；
+              'triggered'只在内存中保留最近几秒的帧，事件触发时保存前后的片段（event_capture.py）；
+              'null'不保存帧，只计数
+        backend_options: 传给后端的参数，如fps/queue_size（'stream'）、frame_shape（'raw'/'roi'/'archive'/'triggered'）、
+                         roi/full_frame_interval（'roi'）、archive_codec/chunk_frames（'archive'）、
+                         arena_chunk_bytes/memory_budget（'arena'）、triggers/pre_seconds/post_seconds/max_events（'triggered'）
         """
+        if isinstance(mode, FrameBackend):
+            self.backend = mode
+        else:
+            self.backend = create_backend(mode, save_path, max_frames, **backend_options)
+        
         self.save_path = save_path
         self.max_frames = max_frames
-        self.frames = []  # 存储帧数据
-        self.timestamps = []  # 存储时间戳
+        self.mode = self.backend.name
         self.frame_count = 0
         self.recording = False
         
         # 创建保存目录
         os.makedirs(save_path, exist_ok=True)
         
-        print(f"帧存储器初始化完成，最大帧数: {max_frames}")
+        print(f"帧存储器初始化完成，模式: {self.mode}, 最大帧数: {max_frames}")
     
     def start_recording(self):
         """开始录制"""
-        self.recording = True
-        self.frames.clear()
-        self.timestamps.clear()
         self.frame_count = 0
+        self.backend.start(time.strftime("%Y%m%d_%H%M%S"))
+        
+        self.recording = True
         print("开始帧数据记录")
     
     def add_frame(self, frame, timestamp):
         """添加一帧数据"""
-        if not self.recording or self.frame_count >= self.max_frames:
+        if not self.recording:
+            return
+        if self.max_frames is not None and self.frame_count >= self.max_frames:
             return
             
         try:
@@ -41,11 +62,8 @@ class FrameStorage:
             if frame.ndim == 3:
                 frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
-            # 压缩帧以节省内存
-            _, compressed_frame = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            
-            self.frames.append(compressed_frame)
-            self.timestamps.append(timestamp)
+            if not self.backend.add(frame, timestamp):
+                return
             self.frame_count += 1
             
             # 每1000帧打印一次进度
@@ -55,6 +73,14 @@ class FrameStorage:
         except Exception as e:
             print(f"保存帧数据时出错: {e}")
     
+    def check_triggers(self, timestamp, error, output, pressure_codes=None, ball_detected=True):
+        """
+        'triggered'模式下由控制循环每个周期调用，用已计算的误差、输出、压力码值和检测状态判断是否触发事件
+        """
+        if not self.recording:
+            return
+        self.backend.check_triggers(timestamp, error, output, pressure_codes, ball_detected)
+    
     def stop_recording(self):
         """停止录制"""
         if not self.recording:
@@ -62,9 +88,71 @@ class FrameStorage:
             
         self.recording = False
         print(f"帧数据记录完成！总共记录了 {self.frame_count} 帧")
+        self.backend.stop()
+    
+    def _render_frame(self, i, timestamp, overlay=None):
+        """解压第i帧并叠加时间和进度信息，返回BGR帧（可在工作线程中并行执行）"""
+        # 由后端解压或读取帧（'raw'/'roi'模式下直接读取内存映射）
+        frame = self.backend.load(i)
+        
+        # 叠加控制数据
+        if overlay is not None:
+            return overlay.render(frame, timestamp)
+        
+        # 转换为彩色以便添加文字信息
+        frame_color = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        
+        # 添加时间戳信息
+        cv2.putText(frame_color, f"Time: {timestamp:.2f}s", (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        
+        # 添加进度信息
+        progress = (i / self.frame_count) * 100
+        cv2.putText(frame_color, f"Progress: {progress:.1f}%", (10, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        return frame_color
+    
+    def _try_render_frame(self, i, timestamp, overlay=None):
+        """同_render_frame，出错时返回异常对象而不是抛出，由写入线程统一报告"""
+        try:
+            return self._render_frame(i, timestamp, overlay)
+        except Exception as e:
+            return e
+    
+    def _rendered_frames(self, timestamps, workers, overlay=None):
+        """
+        按顺序产出(i, BGR帧或异常)
+        workers > 1时解码和叠加信息在线程池中并行执行（OpenCV在这些调用中释放GIL），
+        同时在途的帧数限制为workers的2倍，按提交顺序取回结果以保证写入顺序
+        """
+        if workers <= 1:
+            for i, timestamp in enumerate(timestamps):
+                yield i, self._try_render_frame(i, timestamp, overlay)
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for i, timestamp in enumerate(timestamps):
+                pending.append((i, pool.submit(self._try_render_frame, i, timestamp, overlay)))
+                if len(pending) >= 2 * workers:
+                    j, future = pending.popleft()
+                    yield j, future.result()
+            while pending:
+                j, future = pending.popleft()
+                yield j, future.result()
     
-    def create_video(self, experiment_duration=84.0):
-        """后处理创建视频"""
+    def create_video(self, experiment_duration=84.0, workers=None, overlay=None):
+        """
+        后处理创建视频
+        workers: 解码和叠加信息的工作线程数，默认为CPU核数，1为单线程顺序处理
+        overlay: OverlayRenderer，叠加设定值、位置、PID输出和压力；为None时只叠加时间和进度
+        """
+        if not self.backend.creates_video:
+            print(self.backend.no_video_message)
+            if overlay is not None:
+                print("该模式下帧未保存到实验结束，无法叠加控制数据（需要叠加时使用'jpeg'、'raw'或'archive'模式）")
+            return
+        
         if self.frame_count == 0:
             print("没有帧数据，无法创建视频")
             return
@@ -77,14 +165,17 @@ class FrameStorage:
             video_filename = os.path.join(self.save_path, f"control_experiment_{timestamp}.mp4")
             
             # 计算视频参数
-            actual_duration = self.timestamps[-1] - self.timestamps[0] if len(self.timestamps) > 1 else experiment_duration
+            timestamps = self.backend.timestamps(self.frame_count)
+            actual_duration = timestamps[-1] - timestamps[0] if len(timestamps) > 1 else experiment_duration
             target_fps = self.frame_count / experiment_duration  # 目标帧率，使视频时长为experiment_duration
             
             print(f"视频参数: {self.frame_count} 帧, 目标时长: {experiment_duration:.1f}s, 帧率: {target_fps:.2f}fps")
             
             # 解压第一帧以获取尺寸信息
-            first_frame = cv2.imdecode(self.frames[0], cv2.IMREAD_GRAYSCALE)
+            first_frame = self.backend.load(0)
             frame_height, frame_width = first_frame.shape
+            if overlay is not None and (overlay.frame_height, overlay.frame_width) != (frame_height, frame_width):
+                overlay = overlay.for_shape((frame_height, frame_width))
             
             # 创建VideoWriter
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -99,23 +190,14 @@ class FrameStorage:
                 print("无法创建视频写入器")
                 return
             
-            # 处理每一帧
-            for i, (compressed_frame, timestamp) in enumerate(zip(self.frames, self.timestamps)):
+            if workers is None:
+                workers = os.cpu_count() or 1
+            
+            # 处理每一帧：工作线程解码并叠加信息，主线程按顺序写入视频
+            for i, frame_color in self._rendered_frames(timestamps, workers, overlay):
                 try:
-                    # 解压帧
-                    frame = cv2.imdecode(compressed_frame, cv2.IMREAD_GRAYSCALE)
-                    
-                    # 转换为彩色以便添加文字信息
-                    frame_color = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                    
-                    # 添加时间戳信息
-                    cv2.putText(frame_color, f"Time: {timestamp:.2f}s", (10, 30),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                    
-                    # 添加进度信息
-                    progress = (i / self.frame_count) * 100
-                    cv2.putText(frame_color, f"Progress: {progress:.1f}%", (10, 60),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    if isinstance(frame_color, Exception):
+                        raise frame_color
                     
                     # 写入视频
                     video_writer.write(frame_color)
@@ -141,9 +223,54 @@ class FrameStorage:
                 print(f"视频文件大小: {file_size / 1024 / 1024:.1f} MB")
             
             # 清理内存中的帧数据
-            self.frames.clear()
-            self.timestamps.clear()
+            self.backend.release()
             print("已清理内存中的帧数据")
                 
         except Exception as e:
-            print(f"创建视频时出错: {e}") 
\ No newline at end of file
+            print(f"创建视频时出错: {e}")
+
+
+def benchmark_create_video(num_frames=1000, workers_list=(1, 2, None), save_path=None):
+    """
+    用合成帧比较顺序处理与线程池流水线生成视频的速度
+    num_frames: 合成帧数（640x480 MONO8，JPEG压缩后存入内存）
+    workers_list: 要比较的工作线程数，None为CPU核数（与列表中已有的线程数相同时不重复测试）
+    返回: {实际工作线程数: 每秒处理帧数}
+    """
+    import tempfile
+    save_path = save_path or tempfile.mkdtemp(prefix="frame_storage_bench_")
+    storage = FrameStorage(save_path, max_frames=num_frames)
+    storage.start_recording()
+    
+    # 带噪声的背景加一个移动的暗圆，接近实际画面的压缩率
+    rng = np.random.default_rng(0)
+    background = rng.integers(150, 220, size=(480, 640), dtype=np.uint8)
+    for i in range(num_frames):
+        frame = background.copy()
+        cv2.circle(frame, (40 + (i * 3) % 560, 241), 12, 30, -1)
+        storage.add_frame(frame, i * 0.01)
+    storage.stop_recording()
+    
+    frames = list(storage.backend.frames)
+    timestamps = list(storage.backend.frame_timestamps)
+    results = {}
+    for workers in workers_list:
+        n_workers = workers or os.cpu_count() or 1
+        if n_workers in results:
+            continue
+        # create_video结束后会清空帧数据，每轮前恢复
+        storage.backend.frames = list(frames)
+        storage.backend.frame_timestamps = list(timestamps)
+        storage.frame_count = num_frames
+        start = time.perf_counter()
+        storage.create_video(experiment_duration=num_frames * 0.01, workers=n_workers)
+        results[n_workers] = num_frames / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == '__main__':
+    results = benchmark_create_video()
+    baseline = results[1]
+    print("create_video处理速度")
+    for workers, fps in results.items():
+        print(f"workers={workers:<3d} {fps:8.1f} 帧/秒  加速比 {fps / baseline:.2f}x")
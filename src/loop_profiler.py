@@ -0,0 +1,92 @@
+# coding=utf-8
+import os
+import numpy as np
+
+class StageProfiler:
+    """控制循环分阶段计时器，热路径只向预分配数组写入纳秒时间戳"""
+    # 对数刻度的固定直方图桶：100ns ~ 1s，每十倍程10个桶
+    BUCKET_EDGES_NS = np.round(10 ** np.arange(2.0, 9.05, 0.1)).astype(np.int64)
+
+    def __init__(self, stage_names, capacity):
+        """
+        stage_names: 阶段名称列表，按循环中的执行顺序排列
+        capacity: 最大循环次数
+        """
+        self.stage_names = list(stage_names)
+        self.capacity = capacity
+        # 每行len(stage_names)+1个时间戳，相邻时间戳之差即为各阶段耗时
+        self.stamps = np.zeros((capacity, len(self.stage_names) + 1), dtype=np.int64)
+        self.count = 0
+    
+    def reset(self):
+        """清空上次记录"""
+        self.stamps[:] = 0
+        self.count = 0
+    
+    def durations_ns(self):
+        """返回各阶段耗时（纳秒），形状为(count, 阶段数)"""
+        return np.diff(self.stamps[:self.count], axis=1)
+    
+    def histograms(self):
+        """
+        计算各阶段的对数刻度直方图
+        返回: {阶段名: 各桶计数}，计数数组长度为len(BUCKET_EDGES_NS)+1，首尾分别为下溢和上溢桶
+        """
+        durations = self.durations_ns()
+        result = {}
+        for k, name in enumerate(self.stage_names):
+            bucket_index = np.searchsorted(self.BUCKET_EDGES_NS, durations[:, k], side='right')
+            result[name] = np.bincount(bucket_index, minlength=len(self.BUCKET_EDGES_NS) + 1)
+        return result
+    
+    def summary(self):
+        """
+        计算各阶段耗时统计
+        返回: {阶段名: {'p50': .., 'p99': .., 'p99.9': .., 'max': .., 'mean': ..}}，单位微秒
+        """
+        durations = self.durations_ns()
+        result = {}
+        for k, name in enumerate(self.stage_names):
+            stage = durations[:, k] * 1e-3
+            if len(stage) == 0:
+                continue
+            p50, p99, p999 = np.percentile(stage, [50, 99, 99.9])
+            result[name] = {'p50': p50, 'p99': p99, 'p99.9': p999,
+                            'max': np.max(stage), 'mean': np.mean(stage)}
+        return result
+    
+    def save(self, save_path, timestamp):
+        """
+        保存分阶段计时数据、直方图和统计摘要
+        save_path: 保存目录（与控制数据CSV相同）
+        timestamp: 文件名时间戳（与控制数据CSV相同）
+        """
+        if self.count == 0:
+            print("没有分阶段计时数据")
+            return
+        
+        # 每次循环的各阶段耗时
+        timing_filename = os.path.join(save_path, f"stage_timing_{timestamp}.csv")
+        header = ",".join(f"{name}(us)" for name in self.stage_names)
+        np.savetxt(timing_filename, self.durations_ns() * 1e-3, delimiter=',',
+                   fmt='%.3f', header=header, comments='')
+        
+        # 直方图：每行一个桶，第一列为桶下界（微秒）
+        histogram_filename = os.path.join(save_path, f"stage_histogram_{timestamp}.csv")
+        histograms = self.histograms()
+        lower_edges = np.concatenate(([0], self.BUCKET_EDGES_NS)) * 1e-3
+        data = np.column_stack([lower_edges] + [histograms[name] for name in self.stage_names])
+        header = "Bucket_lower(us)," + ",".join(self.stage_names)
+        np.savetxt(histogram_filename, data, delimiter=',', fmt='%g', header=header, comments='')
+        
+        # 统计摘要
+        summary_filename = os.path.join(save_path, f"stage_summary_{timestamp}.txt")
+        with open(summary_filename, 'w') as f:
+            f.write(f"{'stage':<12s}{'p50(us)':>12s}{'p99(us)':>12s}{'p99.9(us)':>12s}{'max(us)':>12s}{'mean(us)':>12s}\n")
+            for name, stats in self.summary().items():
+                f.write(f"{name:<12s}{stats['p50']:12.1f}{stats['p99']:12.1f}{stats['p99.9']:12.1f}"
+                        f"{stats['max']:12.1f}{stats['mean']:12.1f}\n")
+        
+        print(f"Stage timing saved to {timing_filename}")
+        print(f"Stage histograms saved to {histogram_filename}")
+        print(f"Stage summary saved to {summary_filename}")
@@ -8,6 +8,9 @@ from .experiment_runner import ExperimentRunner
 from .data_processor import DataProcessor
 from .frame_storage import FrameStorage
 from .pressure_sensor import PressureSensor
+from .pressure_acquisition import PressureAcquisition
+from .experiment_clock import ExperimentClock
+from .video_overlay import OverlayRenderer
 
 def signal_handler(signum, frame):
     """信号处理函数"""
@@ -26,20 +29,25 @@ def main():
     data_processor = DataProcessor()
     
     # 初始化帧存储器
+    # 视频中叠加设定值、位置、PID输出和压力时需要在实验结束后生成视频，使用'jpeg'模式；
+    # 否则使用'stream'模式，录制过程中由后台线程编码，实验结束后几秒内即可得到视频
+    video_overlay = True
     save_path = "/home/pi/Downloads/Xiaohui/Test_py/Xiaohui_camera_test/7_1_Dynamic_PID/6.4_test"
     try:
         frame_storage = FrameStorage(
             save_path=save_path,
-            max_frames=8400  # 84秒 × 100fps (10ms一帧)
+            max_frames=8400,  # 84秒 × 100fps (10ms一帧)
+            mode='jpeg' if video_overlay else 'stream'
         )
         print("帧存储器初始化成功，准备记录84秒实验视频")
     except Exception as e:
         print(f"帧存储器初始化失败: {e}")
         frame_storage = None
     
-    # 初始化压力传感器
+    # 初始化压力传感器，并在后台线程中以最高速率采集，控制循环只读取最新值
     try:
-        pressure_sensor = PressureSensor(channels=[0, 1, 2])
+        pressure_sensor = PressureAcquisition(PressureSensor(channels=[0, 1, 2], mode='continuous'))
+        pressure_sensor.start()
         print("压力传感器初始化成功")
     except Exception as e:
         print(f"压力传感器初始化失败: {e}")
@@ -56,11 +64,14 @@ def main():
     capture_thread = None
     control_thread = None
     
+    # 相机采集线程和控制线程共用同一实验时钟，并在同一时刻开始
+    experiment_clock = ExperimentClock(parties=2)
+    
     try:
         # 启动相机采集线程
         capture_thread = Thread(
             target=camera_controller.capture_frames, 
-            args=(frame_storage, lambda: experiment_runner.experiment_running)
+            args=(frame_storage, experiment_clock)
         )
         capture_thread.daemon = False  # 改为非守护线程，确保完成执行
         capture_thread.start()
@@ -71,7 +82,7 @@ def main():
         # 启动控制实验线程
         control_thread = Thread(
             target=experiment_runner.run_control_experiment,
-            args=(camera_controller, frame_storage, pressure_sensor)
+            args=(camera_controller, frame_storage, pressure_sensor, experiment_clock)
         )
         control_thread.daemon = False  # 改为非守护线程，确保完成执行
         control_thread.start()
@@ -96,23 +107,32 @@ def main():
         if frame_storage:
             print("开始创建实验视频...")
             frame_storage.stop_recording()
+            overlay = None
+            if video_overlay:
+                try:
+                    overlay = OverlayRenderer.from_experiment_runner(experiment_runner)
+                except Exception as e:
+                    print(f"创建数据叠加层失败，视频只叠加时间和进度: {e}")
             # 在主线程中创建视频，确保不被中断
-            frame_storage.create_video(experiment_duration=84.0)
+            frame_storage.create_video(experiment_duration=84.0, overlay=overlay)
             print("视频创建完成！")
             
     except KeyboardInterrupt:
         print("Program interrupted by user")
         experiment_runner.experiment_running = False  # 停止实验
+        experiment_clock.stop()
         
     except Exception as e:
         print(f"Program error: {e}")
         experiment_runner.experiment_running = False
+        experiment_clock.stop()
         
     finally:
         print("开始清理资源...")
         
         # 标记实验结束
         experiment_runner.experiment_running = False
+        experiment_clock.stop()
         
         # 等待线程安全结束
         if capture_thread and capture_thread.is_alive():
@@ -123,6 +143,10 @@ def main():
             print("等待控制线程结束...")
             control_thread.join(timeout=5.0)
             
+        # 停止压力采集
+        if pressure_sensor is not None:
+            pressure_sensor.close()
+        
         # 清理相机资源
         camera_controller.release_camera()
 
@@ -0,0 +1,188 @@
+# coding=utf-8
+import time
+import numpy as np
+from threading import Thread, Event
+from .timer import raw_time_ns
+from .pressure_filters import ChannelFilterBank
+
+class PressureAcquisition:
+    """后台压力采集线程：以ADC允许的最高速率采样，并把(t_ns, 通道, 原始码值)写入预分配环形缓冲区"""
+    def __init__(self, pressure_sensor, capacity=65536, window=None,
+                 filter_kind=None, latency_budget=0.01, sample_rate=None):
+        """
+        pressure_sensor: PressureSensor对象，建议使用mode='continuous'
+        capacity: 环形缓冲区容量（样本数）
+        window: read_all_channels返回的滑动平均窗口（秒），None表示返回最新值
+        filter_kind: 采集端过采样滤波器，'boxcar'、'median'或'iir'，None表示不滤波；不能与window同时设置
+        latency_budget: 滤波器的延迟预算（秒）
+        sample_rate: 每个通道的采样率（Hz），默认按ADC最高数据速率在各通道间平分估算
+        """
+        if window is not None and filter_kind is not None:
+            raise ValueError("window与filter_kind不能同时设置：启用滤波时read_all_channels返回滤波后的值")
+        self.sensor = pressure_sensor
+        self.channels = list(pressure_sensor.channels)
+        self.capacity = capacity
+        self.window = window
+        
+        # 环形缓冲区，write_count为累计写入的样本数，下一个写入位置为write_count % capacity
+        self.t_ns = np.zeros(capacity, dtype=np.int64)
+        self.channel = np.zeros(capacity, dtype=np.int8)
+        self.raw_code = np.zeros(capacity, dtype=np.int16)
+        self.write_count = 0
+        
+        # 各通道的最新值，供控制循环无阻塞读取
+        self.latest_codes = {channel: 0 for channel in self.channels}
+        self.latest_t_ns = {channel: 0 for channel in self.channels}
+        
+        # 过采样滤波：采集线程逐样本更新，读取时返回滤波后的码值
+        self.filtered = filter_kind is not None
+        self.filter_bank = None
+        if self.filtered:
+            if sample_rate is None:
+                sample_rate = pressure_sensor.DATA_RATE / len(self.channels)
+            self.filter_bank = ChannelFilterBank(self.channels, filter_kind, latency_budget,
+                                                 {channel: sample_rate for channel in self.channels})
+        
+        self.error_count = 0
+        self._stop_event = Event()
+        self._thread = None
+    
+    def start(self):
+        """启动采集线程"""
+        self._stop_event.clear()
+        self._thread = Thread(target=self._acquisition_loop, name="pressure_acquisition")
+        self._thread.daemon = True
+        self._thread.start()
+        print("压力采集线程已启动")
+    
+    def stop(self):
+        """停止采集线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        print(f"压力采集线程已停止，共采集 {self.write_count} 个样本，读取错误 {self.error_count} 次")
+    
+    def close(self):
+        """停止采集线程并关闭传感器"""
+        self.stop()
+        self.sensor.close()
+    
+    def _push(self, channel, code):
+        """写入一个样本"""
+        t_ns = raw_time_ns()
+        index = self.write_count % self.capacity
+        self.t_ns[index] = t_ns
+        self.channel[index] = channel
+        self.raw_code[index] = code
+        self.latest_codes[channel] = code
+        self.latest_t_ns[channel] = t_ns
+        self.write_count += 1
+        if self.filter_bank is not None:
+            self.filter_bank.update(channel, code)
+    
+    def _acquisition_loop(self):
+        """采集循环：I2C错误只影响本线程，不会阻塞控制循环"""
+        continuous = self.sensor.mode == 'continuous'
+        while not self._stop_event.is_set():
+            try:
+                if continuous:
+                    channel = self.sensor.sequence_step(block=True)
+                    if channel is not None:
+                        self._push(channel, self.sensor.latest_codes[channel])
+                else:
+                    for channel in self.channels:
+                        self._push(channel, self.sensor.read_code(channel))
+            except Exception as e:
+                self.error_count += 1
+                if self.error_count % 100 == 1:
+                    print(f"压力采集错误: {e}")
+                time.sleep(0.001)
+    
+    def snapshot(self, count=None):
+        """
+        按时间顺序复制环形缓冲区中最近的样本
+        count: 样本数，默认为缓冲区中的全部有效样本
+        返回: (t_ns, channel, raw_code)
+        """
+        end = self.write_count
+        available = min(end, self.capacity)
+        count = available if count is None else min(count, available)
+        indices = np.arange(end - count, end) % self.capacity
+        return self.t_ns[indices], self.channel[indices], self.raw_code[indices]
+    
+    def windowed_mean_codes(self, window):
+        """
+        计算各通道在最近window秒内的平均码值，窗口内没有样本的通道返回最新值
+        返回: {通道: 平均码值}
+        """
+        now_ns = raw_time_ns()
+        # 按ADS1015最高速率估算窗口内的最大样本数，只检查缓冲区尾部
+        max_samples = int(window * self.sensor.DATA_RATE) + len(self.channels)
+        t_ns, channel, raw_code = self.snapshot(max_samples)
+        in_window = t_ns >= now_ns - int(window * 1e9)
+        result = {}
+        for ch in self.channels:
+            mask = in_window & (channel == ch)
+            result[ch] = float(np.mean(raw_code[mask])) if np.any(mask) else self.latest_codes[ch]
+        return result
+    
+    @property
+    def pressure_lut(self):
+        """传感器的码值→校准压力查找表"""
+        return self.sensor.pressure_lut
+    
+    @property
+    def channel_names(self):
+        """传感器的通道名称"""
+        return self.sensor.channel_names
+    
+    @property
+    def calibration_params(self):
+        """传感器的校准参数"""
+        return self.sensor.calibration_params
+    
+    def read_codes(self):
+        """
+        无阻塞读取各通道的最新原始码值，启用滤波时为滤波后的（浮点）码值
+        返回: [码值, ...]
+        """
+        if self.filter_bank is not None:
+            return [self.filter_bank.value(channel) for channel in self.channels]
+        return [self.latest_codes[channel] for channel in self.channels]
+    
+    def code_ages_ns(self):
+        """各通道最新值距今的时间（纳秒），顺序与channels相同"""
+        now_ns = raw_time_ns()
+        return [now_ns - self.latest_t_ns[channel] for channel in self.channels]
+    
+    def read_pressures(self):
+        """
+        与PressureSensor.read_pressures格式相同的无阻塞读取，通过查找表转换
+        返回: [校准后压力, ...]
+        """
+        if self.window is None:
+            return [self.sensor.code_to_pressure(code, channel) for code, channel in zip(self.read_codes(), self.channels)]
+        now_ns = raw_time_ns()
+        max_samples = int(self.window * self.sensor.DATA_RATE) + len(self.channels)
+        t_ns, channel, raw_code = self.snapshot(max_samples)
+        in_window = t_ns >= now_ns - int(self.window * 1e9)
+        result = []
+        for ch in self.channels:
+            mask = in_window & (channel == ch)
+            if np.any(mask):
+                result.append(float(np.mean(self.sensor.convert(raw_code[mask], ch))))
+            else:
+                result.append(self.sensor.code_to_pressure(self.latest_codes[ch], ch))
+        return result
+    
+    def read_all_channels(self):
+        """
+        与PressureSensor.read_all_channels格式相同的无阻塞读取
+        返回: [(ADC电压, 传感器电压, 原始压力, 校准后压力), ...]
+        """
+        if self.window is None:
+            codes = dict(zip(self.channels, self.read_codes()))
+        else:
+            codes = self.windowed_mean_codes(self.window)
+        return [self.sensor.code_to_reading(codes[channel], channel) for channel in self.channels]
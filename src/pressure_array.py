@@ -0,0 +1,248 @@
+# coding=utf-8
+import time
+import numpy as np
+from threading import Thread, Event
+from .timer import raw_time_ns
+from .pressure_sensor import PressureSensor
+from .pressure_filters import ChannelFilterBank
+
+class _BusWorker:
+    """单条I2C总线的采集线程：轮询该总线上的所有ADS1015，使不同芯片的转换重叠进行"""
+    def __init__(self, busnum, devices, capacity):
+        """
+        devices: [(PressureSensor, [tap下标, ...]), ...]，tap下标与设备channels一一对应
+        """
+        self.busnum = busnum
+        self.devices = devices
+        self.capacity = capacity
+        
+        # 本线程独占的环形缓冲区，避免多线程写入同一缓冲区
+        self.t_ns = np.zeros(capacity, dtype=np.int64)
+        self.tap = np.zeros(capacity, dtype=np.int16)
+        self.raw_code = np.zeros(capacity, dtype=np.int16)
+        self.write_count = 0
+        self.error_count = 0
+        self.thread = None
+
+
+class PressureSensorArray:
+    """多芯片、多总线压力采集：每条I2C总线一个工作线程，按各测点的目标采样率调度转换"""
+    def __init__(self, taps, adc_factory=None, capacity=65536, filter_kind=None, latency_budget=0.01):
+        """
+        taps: 测点配置列表，每项为字典:
+              {'name': 'P0', 'bus': 1, 'address': 0x48, 'channel': 0,
+               'rate': 500, 'calibration': {'slope': 1.0, 'offset': 0.0}}
+              rate为目标采样率(Hz)，None表示尽可能快；calibration省略时不校准
+        adc_factory: adc_factory(address, busnum)返回ADC对象，默认创建ADS1015
+        capacity: 每条总线环形缓冲区的容量（样本数）
+        filter_kind: 采集端过采样滤波器，'boxcar'、'median'或'iir'，None表示不滤波
+        latency_budget: 滤波器的延迟预算（秒）
+        """
+        self.taps = list(taps)
+        self.tap_names = [tap['name'] for tap in self.taps]
+        self.channels = list(range(len(self.taps)))
+        n_taps = len(self.taps)
+        
+        # 调度状态：每个测点的采样周期（纳秒，0表示不限速）和下次到期时间
+        self.period_ns = np.array([int(1e9 / tap['rate']) if tap.get('rate') else 0 for tap in self.taps],
+                                  dtype=np.int64)
+        self.next_due_ns = np.zeros(n_taps, dtype=np.int64)
+        self.sample_counts = np.zeros(n_taps, dtype=np.int64)
+        
+        # 各测点最新值，供控制循环无阻塞读取
+        self.latest_codes = [0] * n_taps
+        self.latest_t_ns = [0] * n_taps
+        
+        # 按(总线, 地址)分组创建设备，按总线分组创建工作线程
+        device_taps = {}
+        for index, tap in enumerate(self.taps):
+            device_taps.setdefault((tap['bus'], tap['address']), []).append(index)
+        
+        self._tap_device = [None] * n_taps
+        buses = {}
+        for (busnum, address), tap_indices in device_taps.items():
+            channels = [self.taps[i]['channel'] for i in tap_indices]
+            # 未给出校准参数的测点不做校准（slope 1, offset 0），不沿用PressureSensor中A0–A2的标定结果
+            calibration = {self.taps[i]['channel']: self.taps[i].get('calibration', {'slope': 1.0, 'offset': 0.0})
+                           for i in tap_indices}
+            adc = adc_factory(address, busnum) if adc_factory is not None else None
+            sensor = PressureSensor(channels=channels, mode='continuous', adc=adc,
+                                    address=address, busnum=busnum,
+                                    channel_names={self.taps[i]['channel']: self.taps[i]['name'] for i in tap_indices},
+                                    calibration_params=calibration)
+            for i in tap_indices:
+                self._tap_device[i] = sensor
+            buses.setdefault(busnum, []).append((sensor, tap_indices))
+        self.workers = [_BusWorker(busnum, devices, capacity) for busnum, devices in buses.items()]
+        
+        # 过采样滤波：每个测点只由其所在总线的线程更新
+        self.filtered = filter_kind is not None
+        self.filter_bank = None
+        if self.filtered:
+            sample_rates = {}
+            for tap_indices in device_taps.values():
+                for i in tap_indices:
+                    sample_rates[i] = self.taps[i].get('rate') or PressureSensor.DATA_RATE / len(tap_indices)
+            self.filter_bank = ChannelFilterBank(self.channels, filter_kind, latency_budget, sample_rates)
+        
+        self._stop_event = Event()
+        self._start_ns = 0
+        self._stop_ns = 0
+        print(f"压力测点阵列初始化完成: {n_taps} 个测点, {len(device_taps)} 个ADC, {len(self.workers)} 条I2C总线")
+    
+    def start(self):
+        """启动所有总线的采集线程"""
+        self._stop_event.clear()
+        self._start_ns = raw_time_ns()
+        self._stop_ns = 0
+        self.next_due_ns[:] = self._start_ns
+        self.sample_counts[:] = 0
+        for worker in self.workers:
+            worker.thread = Thread(target=self._bus_loop, args=(worker,), name=f"pressure_bus{worker.busnum}")
+            worker.thread.daemon = True
+            worker.thread.start()
+        print("压力测点阵列采集线程已启动")
+    
+    def stop(self):
+        """停止所有采集线程"""
+        self._stop_event.set()
+        for worker in self.workers:
+            if worker.thread is not None:
+                worker.thread.join(timeout=1.0)
+                worker.thread = None
+        self._stop_ns = raw_time_ns()
+        self.print_rates()
+    
+    def close(self):
+        """停止采集并关闭所有ADC"""
+        self.stop()
+        for worker in self.workers:
+            for sensor, _ in worker.devices:
+                sensor.close()
+    
+    def _pick_next(self, tap_indices, current):
+        """最早截止时间优先：选择该设备上最早到期的测点（当前测点按读取后的到期时间计算）"""
+        best = 0
+        best_due = None
+        for k, tap in enumerate(tap_indices):
+            due = self.next_due_ns[tap] + (self.period_ns[tap] if k == current else 0)
+            if best_due is None or due < best_due:
+                best, best_due = k, due
+        return best
+    
+    def _bus_loop(self, worker):
+        """总线采集循环：依次推进每个设备已完成的转换，不在单个芯片上阻塞等待"""
+        while not self._stop_event.is_set():
+            progressed = False
+            for sensor, tap_indices in worker.devices:
+                try:
+                    current = sensor.current_index
+                    tap = tap_indices[current]
+                    now_ns = raw_time_ns()
+                    # 当前测点尚未到期时不读取，留给其他芯片和测点
+                    if now_ns < self.next_due_ns[tap]:
+                        continue
+                    channel = sensor.sequence_step(block=False, next_index=self._pick_next(tap_indices, current))
+                    if channel is None:
+                        continue
+                    self._push(worker, tap, sensor.latest_codes[channel])
+                    progressed = True
+                except Exception as e:
+                    worker.error_count += 1
+                    if worker.error_count % 100 == 1:
+                        print(f"I2C总线{worker.busnum}采集错误: {e}")
+            if not progressed:
+                # 没有完成的转换时短暂让出CPU
+                time.sleep(0.0001)
+    
+    def _push(self, worker, tap, code):
+        """写入一个样本并更新调度状态"""
+        t_ns = raw_time_ns()
+        index = worker.write_count % worker.capacity
+        worker.t_ns[index] = t_ns
+        worker.tap[index] = tap
+        worker.raw_code[index] = code
+        worker.write_count += 1
+        self.latest_codes[tap] = code
+        self.latest_t_ns[tap] = t_ns
+        self.sample_counts[tap] += 1
+        if self.filter_bank is not None:
+            self.filter_bank.update(tap, code)
+        # 到期时间按固定周期推进；落后超过一个周期时从当前时间重新开始，避免集中补采
+        self.next_due_ns[tap] = max(self.next_due_ns[tap] + self.period_ns[tap], t_ns - self.period_ns[tap])
+    
+    @property
+    def channel_names(self):
+        """测点名称，按测点下标索引"""
+        return self.tap_names
+    
+    @property
+    def pressure_lut(self):
+        """各测点的码值→校准压力查找表，形状为(测点数, 4096)，按测点下标索引"""
+        return np.stack([self._tap_device[i].pressure_lut[self.taps[i]['channel']] for i in self.channels])
+    
+    @property
+    def calibration_params(self):
+        """各测点的校准参数，按测点名索引"""
+        return {name: self._tap_device[i].calibration_params.get(self.taps[i]['channel'])
+                for i, name in enumerate(self.tap_names)}
+    
+    def read_codes(self):
+        """无阻塞读取各测点的最新原始码值，启用滤波时为滤波后的（浮点）码值"""
+        if self.filter_bank is not None:
+            return [self.filter_bank.value(i) for i in self.channels]
+        return list(self.latest_codes)
+    
+    def code_ages_ns(self):
+        """各测点最新值距今的时间（纳秒），按测点下标排列"""
+        now_ns = raw_time_ns()
+        return [now_ns - t_ns for t_ns in self.latest_t_ns]
+    
+    def read_pressures(self):
+        """无阻塞读取各测点的最新校准压力"""
+        return [self._tap_device[i].code_to_pressure(code, self.taps[i]['channel'])
+                for i, code in zip(self.channels, self.read_codes())]
+    
+    def read_all_channels(self):
+        """
+        与PressureSensor.read_all_channels格式相同的无阻塞读取，启用滤波时为滤波后的值
+        返回: [(ADC电压, 传感器电压, 原始压力, 校准后压力), ...]，按测点下标排列
+        """
+        return [self._tap_device[i].code_to_reading(code, self.taps[i]['channel'])
+                for i, code in zip(self.channels, self.read_codes())]
+    
+    def achieved_rates(self):
+        """
+        各测点实际达到的采样率
+        返回: {测点名: 采样率(Hz)}
+        """
+        end_ns = self._stop_ns or raw_time_ns()
+        elapsed = max(end_ns - self._start_ns, 1) * 1e-9
+        return {name: self.sample_counts[i] / elapsed for i, name in enumerate(self.tap_names)}
+    
+    def print_rates(self):
+        """打印各测点的目标采样率与实际采样率"""
+        print("压力测点采样率:")
+        for i, (name, rate) in enumerate(self.achieved_rates().items()):
+            target = self.taps[i].get('rate')
+            target_text = f"{target:.0f}Hz" if target else "max"
+            print(f"  {name:8s} 目标 {target_text:>8s}  实际 {rate:8.1f}Hz")
+        errors = sum(worker.error_count for worker in self.workers)
+        if errors:
+            print(f"  读取错误 {errors} 次")
+    
+    def snapshot(self):
+        """
+        合并各总线环形缓冲区中的样本并按时间排序
+        返回: (t_ns, tap, raw_code)
+        """
+        parts = []
+        for worker in self.workers:
+            end = worker.write_count
+            count = min(end, worker.capacity)
+            indices = np.arange(end - count, end) % worker.capacity
+            parts.append((worker.t_ns[indices], worker.tap[indices], worker.raw_code[indices]))
+        t_ns = np.concatenate([p[0] for p in parts])
+        order = np.argsort(t_ns, kind='stable')
+        return (t_ns[order], np.concatenate([p[1] for p in parts])[order],
+                np.concatenate([p[2] for p in parts])[order])
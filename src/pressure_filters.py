@@ -0,0 +1,167 @@
+# coding=utf-8
+import heapq
+import math
+from collections import deque
+
+class BoxcarFilter:
+    """滑动平均滤波器，维护窗口内样本和，每个样本O(1)"""
+    def __init__(self, length):
+        self.length = max(1, int(length))
+        self.reset()
+    
+    def reset(self):
+        self.window = deque()
+        self.total = 0
+        self.value = 0.0
+    
+    def update(self, x):
+        self.window.append(x)
+        self.total += x
+        if len(self.window) > self.length:
+            self.total -= self.window.popleft()
+        self.value = self.total / len(self.window)
+        return self.value
+
+
+class MedianFilter:
+    """
+    滑动中值滤波器，双堆结构：较小的一半样本在最大堆low中，较大的一半在最小堆high中，中值由两个堆顶得到
+    移出窗口的样本只做标记，到达堆顶时才弹出（延迟删除），每个样本O(log N)；
+    堆中积累的过期样本超过窗口长度时重建两个堆，均摊开销不变
+    """
+    def __init__(self, length):
+        self.length = max(1, int(length))
+        self.reset()
+    
+    def reset(self):
+        self.window = deque()  # (样本, 序号)，按到达顺序
+        self.low = []   # 最大堆，元素为(-样本, 序号)
+        self.high = []  # 最小堆，元素为(样本, 序号)
+        self.low_members = set()  # 当前在low中的序号
+        self.expired = set()  # 已移出窗口但仍留在堆中的序号
+        self.low_size = 0  # 各堆中仍在窗口内的样本数
+        self.high_size = 0
+        self.count = 0
+        self.value = 0.0
+    
+    def _prune(self, heap):
+        """弹出堆顶的过期样本"""
+        while heap and heap[0][1] in self.expired:
+            self.expired.discard(heapq.heappop(heap)[1])
+    
+    def _rebuild(self):
+        """只用窗口内的样本重建两个堆"""
+        self.low = [(-x, seq) for x, seq in self.window if seq in self.low_members]
+        self.high = [(x, seq) for x, seq in self.window if seq not in self.low_members]
+        heapq.heapify(self.low)
+        heapq.heapify(self.high)
+        self.expired.clear()
+    
+    def update(self, x):
+        seq = self.count
+        self.count += 1
+        self.window.append((x, seq))
+        self._prune(self.low)
+        if not self.low or x <= -self.low[0][0]:
+            heapq.heappush(self.low, (-x, seq))
+            self.low_members.add(seq)
+            self.low_size += 1
+        else:
+            heapq.heappush(self.high, (x, seq))
+            self.high_size += 1
+        
+        if len(self.window) > self.length:
+            _, old_seq = self.window.popleft()
+            self.expired.add(old_seq)
+            if old_seq in self.low_members:
+                self.low_members.discard(old_seq)
+                self.low_size -= 1
+            else:
+                self.high_size -= 1
+        
+        # 保持 low_size == high_size 或 low_size == high_size + 1
+        self._prune(self.low)
+        self._prune(self.high)
+        while self.low_size > self.high_size + 1:
+            neg_x, moved = heapq.heappop(self.low)
+            self.low_members.discard(moved)
+            heapq.heappush(self.high, (-neg_x, moved))
+            self.low_size -= 1
+            self.high_size += 1
+            self._prune(self.low)
+        while self.high_size > self.low_size:
+            y, moved = heapq.heappop(self.high)
+            self.low_members.add(moved)
+            heapq.heappush(self.low, (-y, moved))
+            self.high_size -= 1
+            self.low_size += 1
+            self._prune(self.high)
+        
+        if len(self.expired) > self.length:
+            self._rebuild()
+        
+        median_low = -self.low[0][0]
+        self.value = median_low if self.low_size > self.high_size else (median_low + self.high[0][0]) / 2
+        return self.value
+
+
+class IIRFilter:
+    """一阶IIR低通滤波器 y += alpha * (x - y)，每个样本O(1)"""
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.reset()
+    
+    def reset(self):
+        self.initialized = False
+        self.value = 0.0
+    
+    def update(self, x):
+        if not self.initialized:
+            self.value = float(x)
+            self.initialized = True
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+def make_filter(kind, latency_budget, sample_rate):
+    """
+    按延迟预算创建滤波器
+    kind: 'boxcar'、'median'或'iir'
+    latency_budget: 允许的滤波延迟（秒），对boxcar/median为窗口长度，对iir为时间常数
+    sample_rate: 该通道的采样率（Hz）
+    """
+    samples = max(1, int(latency_budget * sample_rate))
+    if kind == 'boxcar':
+        return BoxcarFilter(samples)
+    if kind == 'median':
+        return MedianFilter(samples)
+    if kind == 'iir':
+        return IIRFilter(1.0 - math.exp(-1.0 / samples))
+    raise ValueError(f"未知的滤波器类型: {kind}")
+
+
+class ChannelFilterBank:
+    """每个通道一个滤波器，由采集线程逐样本更新，控制循环读取滤波后的值"""
+    def __init__(self, channels, kind, latency_budget, sample_rates):
+        """
+        channels: 通道列表
+        kind: 滤波器类型，见make_filter
+        latency_budget: 延迟预算（秒）
+        sample_rates: {通道: 采样率(Hz)}
+        """
+        self.kind = kind
+        self.latency_budget = latency_budget
+        self.filters = {channel: make_filter(kind, latency_budget, sample_rates[channel]) for channel in channels}
+    
+    def update(self, channel, x):
+        """输入一个新样本"""
+        return self.filters[channel].update(x)
+    
+    def value(self, channel):
+        """通道当前的滤波输出"""
+        return self.filters[channel].value
+    
+    def reset(self):
+        for f in self.filters.values():
+            f.reset()
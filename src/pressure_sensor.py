@@ -1,20 +1,73 @@
 # coding=utf-8
-import Adafruit_ADS1x15
+import time
+import numpy as np
+from .timer import raw_time_ns
+
+try:
+    import Adafruit_ADS1x15
+except ImportError:
+    Adafruit_ADS1x15 = None
+
+def lookup_pressure(lut, rows, codes):
+    """
+    通过查找表把码值转换为校准压力
+    lut: 查找表，每行对应一个通道的4096个码值
+    rows: 查找表行号（标量或可与codes广播的数组）
+    codes: 码值，整数直接查表；浮点数（如滤波后的码值）在相邻两个码值之间线性插值
+    """
+    codes = np.asarray(codes)
+    if np.issubdtype(codes.dtype, np.integer):
+        return lut[rows, codes.astype(np.int64) + PressureSensor.CODE_OFFSET]
+    index = np.clip(codes + PressureSensor.CODE_OFFSET, 0, PressureSensor.NUM_CODES - 1)
+    lower = np.minimum(np.floor(index).astype(np.int64), PressureSensor.NUM_CODES - 2)
+    frac = index - lower
+    return lut[rows, lower] + frac * (lut[rows, lower + 1] - lut[rows, lower])
 
 class PressureSensor:
     """压力传感器类"""
-    def __init__(self, channels=[0, 1, 2]):
+    DATA_RATE = 3300  # ADS1015最高数据速率（SPS）
+    CODE_OFFSET = 2048  # ADS1015为12位有符号码值(-2048~2047)，查找表下标 = 码值 + 2048
+    NUM_CODES = 4096
+    INVALID_CODE = -32768  # 读取失败的周期记录的码值（超出12位码值范围），换算压力时为NaN
+    
+    # ADS1015配置寄存器各字段（与Adafruit_ADS1x15.ADS1x15中的定义相同），用于不阻塞地切换通道
+    CONFIG_REGISTER = 0x01
+    CONFIG_OS_SINGLE = 0x8000
+    CONFIG_MUX_OFFSET = 12
+    CONFIG_GAIN = {2/3: 0x0000, 1: 0x0200, 2: 0x0400, 4: 0x0600, 8: 0x0800, 16: 0x0A00}
+    CONFIG_MODE_CONTINUOUS = 0x0000
+    CONFIG_DR = {128: 0x0000, 250: 0x0020, 490: 0x0040, 920: 0x0060, 1600: 0x0080, 2400: 0x00A0, 3300: 0x00C0}
+    CONFIG_COMP_QUE_DISABLE = 0x0003
+    
+    def __init__(self, channels=[0, 1, 2], mode='single', drdy_pin=None, adc=None,
+                 address=0x48, busnum=1, channel_names=None, calibration_params=None):
+        """
+        channels: 要读取的通道列表
+        mode: 'single'为每次读取发起单次转换，'continuous'为连续转换并按通道轮换
+        drdy_pin: ALERT/RDY引脚的BCM编号，连续转换模式下用于判断转换完成，None表示按转换时间定时轮询
+        adc: ADC对象（如FakeADS1015），为None时创建ADS1015
+        address: ADS1015的I2C地址
+        busnum: I2C总线编号
+        channel_names: 通道名称，按通道号索引（列表或{通道: 名称}字典），默认为['A0', 'A1', 'A2']
+        calibration_params: 校准参数{通道: {'slope': .., 'offset': ..}}，默认使用A0–A2的标定结果
+        """
         # 初始化ADS1015 ADC
-        self.adc = Adafruit_ADS1x15.ADS1015(
-            address=0x48,  # 默认I2C地址
-            busnum=1       # 树莓派I2C总线编号
-        )
+        if adc is None:
+            if Adafruit_ADS1x15 is None:
+                raise ImportError("Adafruit_ADS1x15 is not installed")
+            adc = Adafruit_ADS1x15.ADS1015(
+                address=address,  # 默认I2C地址0x48
+                busnum=busnum     # 树莓派I2C总线编号
+            )
+        self.adc = adc
+        self.address = address
+        self.busnum = busnum
         # 设置增益 - 对应适当的电压范围
         self.GAIN = 4 
         
         # 要读取的通道列表（默认读A0、A1、A2）
         self.channels = channels
-        self.channel_names = ['A0', 'A1', 'A2']
+        self.channel_names = channel_names if channel_names is not None else ['A0', 'A1', 'A2']
         
         # 定义电压和压力的转换参数
         self.MIN_ADC_VOLTAGE = 0.033  # 分压器输出的最小电压 (V)
@@ -33,16 +86,174 @@ class PressureSensor:
             1: {'slope': 1.007, 'offset': -0.007},    # A1 对应 Sensor_2
             2: {'slope': 1.0048, 'offset': 0.0055}    # A2 对应 Sensor_3
         }
+        if calibration_params is not None:
+            self.calibration_params = calibration_params
+        
+        # 每个通道的码值→校准压力查找表，修改校准参数后需调用build_lookup_tables()
+        self.build_lookup_tables()
+        
+        # 连续转换模式的通道轮换状态（单个传感器不做采集端滤波，见PressureAcquisition）
+        self.filtered = False
+        self.mode = mode
+        self.drdy_pin = drdy_pin
+        self._gpio = None
+        self.conversion_time = 1.0 / self.DATA_RATE
+        self.settle_time = self.conversion_time * 1.2  # 切换通道后等待一次完整转换（含余量）
+        self.latest_codes = {channel: 0 for channel in self.channels}
+        self.latest_t_ns = {channel: 0 for channel in self.channels}  # 各通道最新值的读取时间
+        self._seq_index = 0
+        self._switch_time = 0.0
+        if mode == 'continuous':
+            self._start_continuous()
+        elif mode != 'single':
+            raise ValueError(f"未知的采集模式: {mode}")
+    
+    def _start_continuous(self):
+        """启动连续转换，并完整轮换一遍通道以填充最新值缓存"""
+        if self.drdy_pin is not None:
+            import RPi.GPIO as GPIO
+            self._gpio = GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.drdy_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            GPIO.add_event_detect(self.drdy_pin, GPIO.FALLING)
+        # 第一次通过库函数写入完整配置（含比较器阈值），库函数会阻塞等待一次转换
+        self._select_channel(0, use_library=True)
+        for _ in range(len(self.channels)):
+            self.sequence_step(block=True)
+    
+    def _select_channel(self, index, use_library=False):
+        """
+        把多路复用器切换到第index个通道并开始连续转换
+        Adafruit库的start_adc/start_adc_comparator写入配置后会休眠一个转换时间并读取结果，
+        因此切换通道时直接写配置寄存器，不阻塞；ADC对象没有I2C设备（_device）时才使用库函数
+        """
+        self._seq_index = index
+        channel = self.channels[index]
+        device = getattr(self.adc, '_device', None)
+        if device is not None and not use_library:
+            config = (self.CONFIG_OS_SINGLE | ((channel + 0x04) & 0x07) << self.CONFIG_MUX_OFFSET |
+                      self.CONFIG_GAIN[self.GAIN] | self.CONFIG_MODE_CONTINUOUS | self.CONFIG_DR[self.DATA_RATE])
+            # ALERT/RDY模式下比较器字段保持start_adc_comparator设置的值（传统、低有效、非锁存、每次转换触发，均为0）
+            if self.drdy_pin is None:
+                config |= self.CONFIG_COMP_QUE_DISABLE
+            device.writeList(self.CONFIG_REGISTER, [(config >> 8) & 0xFF, config & 0xFF])
+            if self.drdy_pin is not None:
+                self._gpio.event_detected(self.drdy_pin)  # 清除切换前的转换完成事件
+        elif self.drdy_pin is not None:
+            # 阈值寄存器Hi=0x8000、Lo=0x0000时ALERT/RDY在每次转换完成时输出脉冲
+            self.adc.start_adc_comparator(channel, 0x8000, 0x0000, gain=self.GAIN, data_rate=self.DATA_RATE,
+                                          active_low=True, traditional=True, latching=False, num_readings=1)
+            self._gpio.event_detected(self.drdy_pin)  # 清除切换前的转换完成事件
+        else:
+            self.adc.start_adc(channel, gain=self.GAIN, data_rate=self.DATA_RATE)
+        self._switch_time = time.monotonic()
+    
+    def _conversion_ready(self, block):
+        """当前通道是否已完成切换后的第一次转换"""
+        if self.drdy_pin is not None:
+            if self._gpio.event_detected(self.drdy_pin):
+                return True
+            if block:
+                timeout_ms = max(1, int(self.settle_time * 2000))
+                return self._gpio.wait_for_edge(self.drdy_pin, self._gpio.FALLING, timeout=timeout_ms) is not None
+            return False
+        remaining = self._switch_time + self.settle_time - time.monotonic()
+        if remaining <= 0:
+            return True
+        if block:
+            time.sleep(remaining)
+            return True
+        return False
+    
+    @property
+    def current_index(self):
+        """连续转换模式下当前正在转换的通道在channels中的下标"""
+        return self._seq_index
+    
+    def sequence_step(self, block=False, next_index=None):
+        """
+        通道轮换的一步：若当前通道转换完成，则读取结果并切换到下一个通道
+        block: 转换未完成时是否等待
+        next_index: 读取后切换到的通道下标，默认按顺序轮换（供外部调度器指定）
+        返回: 读取到新数据的通道，转换未完成时返回None
+        """
+        if not self._conversion_ready(block):
+            return None
+        channel = self.channels[self._seq_index]
+        self.latest_codes[channel] = self.adc.get_last_result()
+        self.latest_t_ns[channel] = raw_time_ns()
+        if next_index is None:
+            next_index = (self._seq_index + 1) % len(self.channels)
+        # 下一个通道与当前通道相同时无需切换多路复用器，连续转换持续进行，等待下一次转换完成即可
+        if next_index != self._seq_index:
+            self._select_channel(next_index)
+        else:
+            self._switch_time = time.monotonic()
+        return channel
+    
+    def code_ages_ns(self):
+        """
+        各通道最新值距今的时间（纳秒），顺序与channels相同
+        连续转换模式下每次读取只推进一个通道，其余通道返回的是之前的值；单次转换模式下每次都是新值，返回0
+        """
+        if self.mode != 'continuous':
+            return [0] * len(self.channels)
+        now_ns = raw_time_ns()
+        return [now_ns - self.latest_t_ns[channel] for channel in self.channels]
+    
+    def build_lookup_tables(self):
+        """
+        按当前校准参数预计算每个通道全部4096个码值对应的校准压力
+        查找表形状为(4, 4096)，按通道号(0~3)索引
+        """
+        codes = np.arange(self.NUM_CODES) - self.CODE_OFFSET
+        sensor_voltage = self.adc_to_sensor_voltage(self.code_to_voltage(codes))
+        raw_pressure = self.voltage_to_pressure(sensor_voltage)
+        self.pressure_lut = np.empty((4, self.NUM_CODES))
+        for channel in range(4):
+            self.pressure_lut[channel] = self.calibrate_pressure(raw_pressure, channel)
+        # 热路径使用的Python列表，避免逐个读取numpy标量的开销
+        self._lut_lists = {channel: self.pressure_lut[channel].tolist() for channel in self.channels}
+    
+    def convert(self, codes, channel):
+        """
+        用查找表把一批原始码值转换为校准压力，每个样本O(1)
+        codes: 码值数组（浮点码值按线性插值换算）
+        channel: 通道号，或与codes形状相同的通道号数组（混合通道的数据块）
+        返回: 校准压力数组 (Bar)
+        """
+        return lookup_pressure(self.pressure_lut, channel, codes)
+    
+    def code_to_pressure(self, adc_value, channel):
+        """用查找表把单个码值转换为校准压力，浮点码值按线性插值换算"""
+        if isinstance(adc_value, int):
+            return self._lut_lists[channel][adc_value + self.CODE_OFFSET]
+        return float(lookup_pressure(self.pressure_lut, channel, adc_value))
+    
+    def close(self):
+        """停止连续转换并释放ALERT/RDY引脚"""
+        if self.mode == 'continuous':
+            self.adc.stop_adc()
+            if self._gpio is not None:
+                self._gpio.remove_event_detect(self.drdy_pin)
+                self._gpio.cleanup(self.drdy_pin)
+                self._gpio = None
+    
+    def code_to_voltage(self, adc_value):
+        """将ADC码值转换为ADC输入电压"""
+        # ADS1015是12位ADC (0-4095)
+        # 对于增益16，满量程为+/-0.256V，但我们实际使用的是0-0.256V的正电压部分
+        # 因此，有效范围是0-2048
+        return adc_value * 1.024 / 2048
+
+    def read_code(self, channel):
+        """对指定通道进行一次单次转换，返回ADC码值"""
+        return self.adc.read_adc(channel, gain=self.GAIN, data_rate=self.DATA_RATE)
 
     def read_adc_voltage(self, channel):
         """读取指定通道的ADC电压值"""
         # 从指定通道读取电压值
-        adc_value = self.adc.read_adc(channel, gain=self.GAIN, data_rate=3300)
-        # ADS1015是12位ADC (0-4095)
-        # 对于增益16，满量程为+/-0.256V，但我们实际使用的是0-0.256V的正电压部分
-        # 因此，有效范围是0-2048
-        voltage = adc_value * 1.024 / 2048
-        return voltage
+        return self.code_to_voltage(self.read_code(channel))
 
     def adc_to_sensor_voltage(self, adc_voltage):
         """将ADC读取的电压转换回传感器输出的原始电压"""
@@ -78,15 +289,51 @@ class PressureSensor:
             # 如果没有校准参数，返回原始值
             return raw_pressure
 
+    def code_to_reading(self, adc_value, channel):
+        """
+        将ADC码值转换为读数
+        返回: (ADC电压, 传感器电压, 原始压力, 校准后压力)
+        """
+        adc_voltage = self.code_to_voltage(adc_value)
+        sensor_voltage = self.adc_to_sensor_voltage(adc_voltage)
+        raw_pressure = self.voltage_to_pressure(sensor_voltage)
+        calibrated_pressure = self.calibrate_pressure(raw_pressure, channel)
+        return (adc_voltage, sensor_voltage, raw_pressure, calibrated_pressure)
+
+    def read_codes(self):
+        """
+        读取所有配置的通道的原始码值
+        连续转换模式下只推进一个已完成的转换，其余通道为之前读取的值，各值的时间见code_ages_ns()
+        返回: [码值, ...]，顺序与channels相同
+        """
+        if self.mode == 'continuous':
+            self.sequence_step(block=False)
+            return [self.latest_codes[channel] for channel in self.channels]
+        return [self.read_code(channel) for channel in self.channels]
+
+    def read_pressures(self):
+        """
+        读取所有配置的通道，只返回校准后的压力（通过查找表转换）
+        返回: [校准后压力, ...]，顺序与channels相同
+        """
+        if self.mode == 'continuous':
+            self.sequence_step(block=False)
+            return [self.code_to_pressure(self.latest_codes[channel], channel) for channel in self.channels]
+        return [self.code_to_pressure(self.read_code(channel), channel) for channel in self.channels]
+
     def read_all_channels(self):
         """读取所有配置的通道并转换数据"""
         result = []
         
+        # 连续转换模式下只推进已完成的转换，不阻塞等待，返回各通道的最新值
+        if self.mode == 'continuous':
+            self.sequence_step(block=False)
+        
         for channel in self.channels:
-            adc_voltage = self.read_adc_voltage(channel)
-            sensor_voltage = self.adc_to_sensor_voltage(adc_voltage)
-            raw_pressure = self.voltage_to_pressure(sensor_voltage)
-            calibrated_pressure = self.calibrate_pressure(raw_pressure, channel)
-            result.append((adc_voltage, sensor_voltage, raw_pressure, calibrated_pressure))
+            if self.mode == 'continuous':
+                adc_value = self.latest_codes[channel]
+            else:
+                adc_value = self.read_code(channel)
+            result.append(self.code_to_reading(adc_value, channel))
         
         return result 
\ No newline at end of file
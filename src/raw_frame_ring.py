@@ -0,0 +1,67 @@
+# coding=utf-8
+import numpy as np
+
+class RawFrameRing:
+    """
+    预分配的原始帧环形缓冲区
+    帧数据保存在形状为(capacity, H, W)的uint8数组中（指定path时为磁盘上的.npy内存映射文件），
+    每帧只做一次内存拷贝，不在相机线程中压缩编码
+    """
+    def __init__(self, capacity, frame_shape=(480, 640), path=None, wrap=False):
+        """
+        capacity: 最大帧数
+        frame_shape: 帧尺寸(H, W)，MONO8
+        path: .npy文件路径，为None时在内存中分配
+        wrap: 写满后是否覆盖最旧的帧（False时写满后丢弃新帧）
+        """
+        self.capacity = int(capacity)
+        self.frame_shape = tuple(frame_shape)
+        self.path = path
+        self.wrap = wrap
+
+        shape = (self.capacity,) + self.frame_shape
+        if path is None:
+            self.frames = np.empty(shape, dtype=np.uint8)
+        else:
+            # 带.npy文件头的内存映射，事后可直接用np.load(path, mmap_mode='r')读取
+            self.frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.write_count = 0
+
+    def __len__(self):
+        return min(self.write_count, self.capacity)
+
+    def append(self, frame, timestamp):
+        """写入一帧，返回是否写入成功"""
+        if self.write_count >= self.capacity and not self.wrap:
+            return False
+
+        idx = self.write_count % self.capacity
+        np.copyto(self.frames[idx], frame)
+        self.timestamps[idx] = timestamp
+        self.write_count += 1
+        return True
+
+    def ordered_indices(self):
+        """按时间先后顺序返回有效帧的槽位索引"""
+        n = len(self)
+        start = self.write_count - n
+        return (np.arange(start, self.write_count) % self.capacity) if n else np.zeros(0, dtype=np.int64)
+
+    def ordered_timestamps(self):
+        """按时间先后顺序返回有效帧的时间戳"""
+        return self.timestamps[self.ordered_indices()]
+
+    def reset(self):
+        """清空缓冲区（不释放内存）"""
+        self.write_count = 0
+
+    def flush(self):
+        """把内存映射中的数据写回磁盘"""
+        if isinstance(self.frames, np.memmap):
+            self.frames.flush()
+
+    def close(self):
+        """刷新并释放内存映射"""
+        self.flush()
+        self.frames = None
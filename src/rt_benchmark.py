@@ -0,0 +1,265 @@
+# coding=utf-8
+"""
+主机实时能力测试
+Host real-time capability benchmark
+
+使用方法:
+python run_benchmark.py [--samples N] [--output-dir DIR]
+
+或者:
+python -m src.rt_benchmark
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import time
+import numpy as np
+from .timer import Timer, benchmark_clock_backends
+
+# 待评估的控制周期（秒）
+CANDIDATE_PERIODS = [0.01, 0.002]
+
+
+def _latency_stats(samples_ns):
+    """计算延迟分布统计，单位微秒"""
+    samples_us = np.asarray(samples_ns, dtype=np.float64) * 1e-3
+    p50, p99, p999 = np.percentile(samples_us, [50, 99, 99.9])
+    return {
+        'samples': int(len(samples_us)),
+        'min_us': float(np.min(samples_us)),
+        'mean_us': float(np.mean(samples_us)),
+        'p50_us': float(p50),
+        'p99_us': float(p99),
+        'p99.9_us': float(p999),
+        'max_us': float(np.max(samples_us)),
+    }
+
+
+def measure_busy_wait_overshoot(timer, samples, interval_ns=100000):
+    """
+    测量忙等待在目标时间之后返回的超调量
+    busy_wait为控制循环原来使用的浮点秒接口（ctypes读取时钟），busy_wait_ns为整数纳秒接口；
+    busy_wait不返回时间，超调量由返回后再读一次时钟得到，包含一次get_time()的开销
+    返回: {'busy_wait': 统计, 'busy_wait_ns': 统计}
+    """
+    overshoot = np.zeros(samples, dtype=np.int64)
+    start = timer.get_time()
+    interval = interval_ns * 1e-9
+    for i in range(samples):
+        target = start + (i + 1) * interval
+        timer.busy_wait(target)
+        overshoot[i] = int(round((timer.get_time() - target) * 1e9))
+    results = {'busy_wait': _latency_stats(overshoot)}
+    
+    start_ns = timer.get_time_ns()
+    for i in range(samples):
+        target_ns = start_ns + (i + 1) * interval_ns
+        overshoot[i] = timer.busy_wait_ns(target_ns) - target_ns
+    results['busy_wait_ns'] = _latency_stats(overshoot)
+    return results
+
+
+def measure_nanosleep_latency(timer, samples, margins_us=(1, 10, 100), interval_ns=1000000):
+    """
+    测量不同忙等待余量下deadline_wait_ns的唤醒延迟
+    返回: {余量: {'sleep': clock_nanosleep唤醒误差统计, 'wake': 最终唤醒误差统计}}
+    """
+    results = {}
+    for margin_us in margins_us:
+        sleep_error = np.zeros(samples, dtype=np.int64)
+        wake_error = np.zeros(samples, dtype=np.int64)
+        start_ns = timer.get_time_ns()
+        for i in range(samples):
+            target_ns = start_ns + (i + 1) * interval_ns
+            wake_error[i] = timer.deadline_wait_ns(target_ns, spin_margin_ns=margin_us * 1000)
+            sleep_error[i] = int(timer.last_sleep_error * 1e9)
+        results[f"{margin_us}us"] = {
+            'sleep': _latency_stats(sleep_error),
+            'wake': _latency_stats(wake_error),
+        }
+    return results
+
+
+def measure_scheduling_latency(timer, samples, interval_ns=1000000):
+    """
+    类似cyclictest：按绝对时间周期性睡眠，测量唤醒时刻与预定时刻之差
+    """
+    latency = np.zeros(samples, dtype=np.int64)
+    deadline_ns = time.clock_gettime_ns(time.CLOCK_MONOTONIC) + interval_ns
+    for i in range(samples):
+        timer.sleep_until_monotonic_ns(deadline_ns)
+        latency[i] = time.clock_gettime_ns(time.CLOCK_MONOTONIC) - deadline_ns
+        deadline_ns += interval_ns
+    return _latency_stats(latency)
+
+
+def _background_load(stop_event):
+    """合成后台负载：持续占用一个CPU核心"""
+    x = 0
+    while not stop_event.is_set():
+        for _ in range(10000):
+            x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+
+
+def _run_with_policy(timer, samples, policy):
+    """在指定调度策略下测量调度延迟，测量完成后恢复原调度策略"""
+    original_policy = os.sched_getscheduler(0)
+    original_param = os.sched_getparam(0)
+    try:
+        if policy == 'fifo':
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(99))
+        return measure_scheduling_latency(timer, samples)
+    except PermissionError as e:
+        return {'error': f"Failed to set FIFO scheduling: {e}"}
+    finally:
+        try:
+            os.sched_setscheduler(0, original_policy, original_param)
+        except OSError:
+            pass
+
+
+def measure_scheduling_matrix(timer, samples):
+    """测量普通调度与SCHED_FIFO在有无后台负载下的调度延迟"""
+    results = {}
+    for loaded in (False, True):
+        stop_event = multiprocessing.Event()
+        workers = []
+        if loaded:
+            for _ in range(os.cpu_count() or 1):
+                worker = multiprocessing.Process(target=_background_load, args=(stop_event,))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+        try:
+            for policy in ('normal', 'fifo'):
+                key = f"{policy}_{'loaded' if loaded else 'idle'}"
+                print(f"测量调度延迟: {key}")
+                results[key] = _run_with_policy(timer, samples, policy)
+        finally:
+            stop_event.set()
+            for worker in workers:
+                worker.join(timeout=5.0)
+    return results
+
+
+def _host_info():
+    """收集主机与内核信息"""
+    uname = platform.uname()
+    info = {
+        'hostname': uname.node,
+        'machine': uname.machine,
+        'kernel_release': uname.release,
+        'kernel_version': uname.version,
+        'preempt_rt': 'PREEMPT_RT' in uname.version or os.path.exists('/sys/kernel/realtime'),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+    return info
+
+
+def _assess_periods(report):
+    """
+    根据最坏调度延迟评估候选控制周期是否可行（最坏延迟不超过周期的10%）
+    实验在SCHED_FIFO下运行，优先以有负载的FIFO结果为依据，无权限时退回普通调度
+    """
+    scheduling = report['scheduling_latency']
+    basis = next((key for key in ('fifo_loaded', 'normal_loaded') if 'max_us' in scheduling.get(key, {})), None)
+    assessment = {'basis': basis}
+    for period in CANDIDATE_PERIODS:
+        key = f"{period * 1000:g}ms"
+        if basis is None:
+            assessment[key] = None
+        else:
+            assessment[key] = scheduling[basis]['max_us'] <= period * 1e6 * 0.1
+    return assessment
+
+
+def run_benchmark(samples=2000):
+    """执行全部测试，返回报告字典"""
+    timer = Timer()
+    report = {'host': _host_info(), 'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")}
+    
+    print("测量时钟读取开销...")
+    report['clock_overhead_ns'] = benchmark_clock_backends()
+    
+    print("测量busy_wait/busy_wait_ns超调量...")
+    report['busy_wait_overshoot'] = measure_busy_wait_overshoot(timer, samples)
+    
+    print("测量nanosleep唤醒延迟...")
+    report['nanosleep_latency'] = measure_nanosleep_latency(timer, samples)
+    
+    report['scheduling_latency'] = measure_scheduling_matrix(timer, samples)
+    report['feasible_periods'] = _assess_periods(report)
+    return report
+
+
+def format_report(report):
+    """将报告格式化为文本"""
+    lines = []
+    host = report['host']
+    lines.append(f"主机实时能力测试报告 - {report['timestamp']}")
+    lines.append(f"主机: {host['hostname']} ({host['machine']}, {host['cpu_count']} CPU)")
+    lines.append(f"内核: {host['kernel_release']} PREEMPT_RT: {host['preempt_rt']}")
+    lines.append("")
+    
+    lines.append("时钟读取开销:")
+    for name, overhead_ns in report['clock_overhead_ns'].items():
+        lines.append(f"  {name:45s} {overhead_ns:8.1f} ns/call")
+    lines.append("")
+    
+    def stats_line(name, stats):
+        if 'error' in stats:
+            return f"  {name:24s} {stats['error']}"
+        return (f"  {name:24s} p50 {stats['p50_us']:8.1f}  p99 {stats['p99_us']:8.1f}  "
+                f"p99.9 {stats['p99.9_us']:8.1f}  max {stats['max_us']:8.1f} us")
+    
+    lines.append("忙等待超调量:")
+    for name, stats in report['busy_wait_overshoot'].items():
+        lines.append(stats_line(name, stats))
+    lines.append("")
+    
+    lines.append("nanosleep唤醒延迟（按忙等待余量）:")
+    for margin, stats in report['nanosleep_latency'].items():
+        lines.append(stats_line(f"margin {margin} sleep", stats['sleep']))
+        lines.append(stats_line(f"margin {margin} wake", stats['wake']))
+    lines.append("")
+    
+    lines.append("调度延迟:")
+    for key, stats in report['scheduling_latency'].items():
+        lines.append(stats_line(key, stats))
+    lines.append("")
+    
+    assessment = dict(report['feasible_periods'])
+    lines.append(f"控制周期可行性（最坏调度延迟 <= 周期的10%，依据: {assessment.pop('basis')}）:")
+    for period, feasible in assessment.items():
+        lines.append(f"  {period:8s} {'可行' if feasible else '不可行' if feasible is not None else '未知'}")
+    return "\n".join(lines)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="主机实时能力测试")
+    parser.add_argument('--samples', type=int, default=2000, help="每项测试的采样次数")
+    parser.add_argument('--output-dir', default='.', help="报告保存目录")
+    args = parser.parse_args()
+    
+    report = run_benchmark(samples=args.samples)
+    text = format_report(report)
+    print(text)
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    json_filename = os.path.join(args.output_dir, f"rt_benchmark_{timestamp}.json")
+    text_filename = os.path.join(args.output_dir, f"rt_benchmark_{timestamp}.txt")
+    with open(json_filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(text_filename, 'w') as f:
+        f.write(text + "\n")
+    print(f"Report saved to {json_filename}")
+    print(f"Report saved to {text_filename}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# coding=utf-8
+"""
+帧存储后端吞吐测试
+Frame storage backend throughput benchmark
+
+按固定帧率向各存储后端写入合成的640x480 MONO8帧，测量每帧add_frame耗时、CPU占用、峰值内存和结束处理耗时，
+用于为每台实验台选择存储后端
+
+使用方法:
+python run_storage_benchmark.py [--backends jpeg raw ...] [--rates 100 200 500] [--duration S] [--output-dir DIR]
+
+或者:
+python -m src.storage_benchmark
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+from .frame_storage import FrameStorage
+
+DEFAULT_BACKENDS = ['jpeg', 'raw', 'archive', 'stream', 'null']
+DEFAULT_RATES = [100, 200, 500]
+FRAME_SHAPE = (480, 640)
+
+
+def synthetic_frames(count=50, frame_shape=FRAME_SHAPE):
+    """带噪声的背景加一个移动的暗圆，接近实际画面的压缩率"""
+    height, width = frame_shape
+    rng = np.random.default_rng(0)
+    background = rng.integers(150, 220, size=frame_shape, dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        cv2.circle(frame, (40 + (i * 11) % (width - 80), height // 2), 12, 30, -1)
+        frames.append(frame)
+    return frames
+
+
+def _cpu_seconds():
+    """本进程（含所有线程）已使用的用户态和内核态CPU时间"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb():
+    """本进程的峰值常驻内存（Linux下ru_maxrss单位为KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend, fps, duration=3.0):
+    """
+    在当前进程中按fps向backend写入duration秒的合成帧，返回测量结果
+    帧按截止时间定时写入，写入耗时超过帧间隔时不补偿等待；落后截止时间超过一个帧间隔的帧计为迟到
+    """
+    frames = synthetic_frames()
+    num_frames = int(fps * duration)
+    period = 1.0 / fps
+    latencies_ns = np.zeros(num_frames, dtype=np.int64)
+    save_path = tempfile.mkdtemp(prefix=f"storage_bench_{backend}_")
+    rss_before = _peak_rss_mb()
+
+    try:
+        # 后端的进度和保存信息不打印，只保留测试报告
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            options = {'fps': fps} if backend in ('stream', 'triggered') else {}
+            storage = FrameStorage(save_path, max_frames=num_frames, mode=backend, **options)
+            storage.start_recording()
+
+            late_frames = 0
+            cpu_start = _cpu_seconds()
+            wall_start = time.perf_counter()
+            for i in range(num_frames):
+                deadline = wall_start + i * period
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    # 落后超过一个帧间隔才算迟到（第0帧的截止时间即为开始时间，delay总是略小于0）
+                    late_frames += 1
+                t0 = time.perf_counter_ns()
+                storage.add_frame(frames[i % len(frames)], i * period)
+                latencies_ns[i] = time.perf_counter_ns() - t0
+            record_wall = time.perf_counter() - wall_start
+            record_cpu = _cpu_seconds() - cpu_start
+
+            # 结束处理：停止录制（等待编码线程、落盘、写索引）并生成视频
+            finalize_start = time.perf_counter()
+            stored_frames = storage.frame_count
+            storage.stop_recording()
+            storage.create_video(experiment_duration=duration)
+            finalize_time = time.perf_counter() - finalize_start
+
+        latencies_us = latencies_ns * 1e-3
+        p50, p99 = np.percentile(latencies_us, [50, 99])
+        return {
+            'backend': backend,
+            'fps': fps,
+            'frames': num_frames,
+            'stored_frames': int(stored_frames),
+            'late_frames': late_frames,
+            'achieved_fps': num_frames / record_wall,
+            'add_p50_us': float(p50),
+            'add_p99_us': float(p99),
+            'add_max_us': float(np.max(latencies_us)),
+            'cpu_percent': record_cpu / record_wall * 100,
+            'peak_rss_mb': _peak_rss_mb(),
+            'rss_before_mb': rss_before,
+            'finalize_s': finalize_time,
+        }
+    finally:
+        shutil.rmtree(save_path, ignore_errors=True)
+
+
+def _run_in_child(backend, fps, duration, results):
+    try:
+        results.put(run_backend(backend, fps, duration))
+    except Exception as e:
+        results.put({'backend': backend, 'fps': fps, 'error': str(e)})
+
+
+def run_benchmark(backends=None, rates=None, duration=3.0):
+    """
+    每个(后端, 帧率)组合在单独的子进程中运行，峰值内存互不影响
+    返回报告字典
+    """
+    backends = backends or DEFAULT_BACKENDS
+    rates = rates or DEFAULT_RATES
+    context = multiprocessing.get_context('spawn')
+    report = {'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"), 'cpu_count': os.cpu_count(),
+              'frame_shape': list(FRAME_SHAPE), 'duration_s': duration, 'results': []}
+
+    for backend in backends:
+        for fps in rates:
+            print(f"测试后端: {backend} @ {fps} fps")
+            results = context.Queue()
+            child = context.Process(target=_run_in_child, args=(backend, fps, duration, results))
+            child.start()
+            try:
+                result = results.get(timeout=duration * 20 + 60)
+            except Exception:
+                result = {'backend': backend, 'fps': fps, 'error': "测试超时"}
+            child.join()
+            report['results'].append(result)
+    return report
+
+
+def format_report(report):
+    """将报告格式化为文本"""
+    lines = []
+    lines.append(f"帧存储后端吞吐测试报告 - {report['timestamp']}")
+    lines.append(f"帧尺寸: {report['frame_shape'][1]}x{report['frame_shape'][0]} MONO8, "
+                 f"每项 {report['duration_s']:g}s, {report['cpu_count']} CPU")
+    lines.append("")
+    lines.append(f"  {'后端':8s} {'帧率':>5s} {'保存/总帧数':>12s} {'迟到':>6s} {'add p50(us)':>12s} "
+                 f"{'add p99(us)':>12s} {'CPU(%)':>7s} {'峰值RSS(MB)':>12s} {'结束处理(s)':>11s}")
+    for r in report['results']:
+        if 'error' in r:
+            lines.append(f"  {r['backend']:8s} {r['fps']:5d} {r['error']}")
+            continue
+        lines.append(f"  {r['backend']:8s} {r['fps']:5d} {r['stored_frames']:>6d}/{r['frames']:<5d} "
+                     f"{r['late_frames']:6d} {r['add_p50_us']:12.1f} {r['add_p99_us']:12.1f} "
+                     f"{r['cpu_percent']:7.1f} {r['peak_rss_mb']:12.1f} {r['finalize_s']:11.2f}")
+    lines.append("")
+    lines.append("说明: 迟到为add_frame耗时超过帧间隔导致未能按时写入的帧数；"
+                 "结束处理包括stop_recording和create_video；峰值RSS包括Python和OpenCV本身的内存")
+    return "\n".join(lines)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="帧存储后端吞吐测试")
+    parser.add_argument('--backends', nargs='+', default=DEFAULT_BACKENDS, help="要测试的存储后端")
+    parser.add_argument('--rates', nargs='+', type=int, default=DEFAULT_RATES, help="写入帧率（fps）")
+    parser.add_argument('--duration', type=float, default=3.0, help="每项测试的录制时长（秒）")
+    parser.add_argument('--output-dir', default='.', help="报告保存目录")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.backends, args.rates, args.duration)
+    text = format_report(report)
+    print(text)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    json_filename = os.path.join(args.output_dir, f"storage_benchmark_{timestamp}.json")
+    text_filename = os.path.join(args.output_dir, f"storage_benchmark_{timestamp}.txt")
+    with open(json_filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(text_filename, 'w') as f:
+        f.write(text + "\n")
+    print(f"Report saved to {json_filename}")
+    print(f"Report saved to {text_filename}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# coding=utf-8
+import ctypes
+import os
+import struct
+from .timer import Timer, monotonic_ns
+
+class TickSource:
+    """基于Linux timerfd的周期节拍源，读取时返回到期次数，用于精确统计错过的周期"""
+    CLOCK_MONOTONIC = 1
+    TFD_TIMER_ABSTIME = 1
+    TFD_CLOEXEC = 0o2000000
+
+    class Itimerspec(ctypes.Structure):
+        _fields_ = [
+            ('it_interval', Timer.Timespec),
+            ('it_value', Timer.Timespec)
+        ]
+
+    def __init__(self, period):
+        """
+        period: 节拍周期（秒）
+        """
+        self.period_ns = int(round(period * 1e9))
+        self.fd = None
+        self.start_ns = 0        # 第一个节拍的CLOCK_MONOTONIC绝对时间（纳秒）
+        self.tick_count = 0      # 自启动以来累计的到期次数
+        self.missed_periods = 0  # 累计错过的周期数
+        self.last_wake_error_ns = 0
+        
+        # Python 3.13+ 自带timerfd接口，否则通过ctypes调用libc
+        self._use_os_timerfd = hasattr(os, 'timerfd_create')
+        if not self._use_os_timerfd:
+            self.libc = ctypes.CDLL('libc.so.6', use_errno=True)
+            self.libc.timerfd_create.argtypes = [ctypes.c_int, ctypes.c_int]
+            self.libc.timerfd_create.restype = ctypes.c_int
+            self.libc.timerfd_settime.argtypes = [ctypes.c_int, ctypes.c_int,
+                                                  ctypes.POINTER(self.Itimerspec), ctypes.c_void_p]
+            self.libc.timerfd_settime.restype = ctypes.c_int
+    
+    def start(self, start_ns=None):
+        """
+        启动周期节拍
+        start_ns: 第一个节拍的CLOCK_MONOTONIC绝对时间（纳秒），默认为当前时间后一个周期
+        """
+        if start_ns is None:
+            start_ns = monotonic_ns() + self.period_ns
+        self.start_ns = start_ns
+        self.tick_count = 0
+        self.missed_periods = 0
+        
+        if self._use_os_timerfd:
+            self.fd = os.timerfd_create(self.CLOCK_MONOTONIC, flags=os.TFD_CLOEXEC)
+            os.timerfd_settime_ns(self.fd, flags=os.TFD_TIMER_ABSTIME,
+                                  initial=start_ns, interval=self.period_ns)
+        else:
+            self.fd = self.libc.timerfd_create(self.CLOCK_MONOTONIC, self.TFD_CLOEXEC)
+            if self.fd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            spec = self.Itimerspec()
+            spec.it_interval.tv_sec, spec.it_interval.tv_nsec = divmod(self.period_ns, 1000000000)
+            spec.it_value.tv_sec, spec.it_value.tv_nsec = divmod(start_ns, 1000000000)
+            if self.libc.timerfd_settime(self.fd, self.TFD_TIMER_ABSTIME, ctypes.byref(spec), None) != 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                self.fd = None
+                raise OSError(errno, os.strerror(errno))
+    
+    def wait(self):
+        """
+        在内核中阻塞直到下一个节拍
+        返回: 自上次读取以来的到期次数，大于1表示错过了周期
+        """
+        while True:
+            try:
+                expirations = struct.unpack('Q', os.read(self.fd, 8))[0]
+                break
+            except InterruptedError:
+                continue
+        now = monotonic_ns()
+        
+        self.tick_count += expirations
+        self.missed_periods += expirations - 1
+        # 唤醒误差相对于最近一次到期的节拍计算
+        self.last_wake_error_ns = now - self.current_deadline_ns()
+        return expirations
+    
+    def current_deadline_ns(self):
+        """最近一次已到期节拍的CLOCK_MONOTONIC绝对时间（纳秒）"""
+        return self.start_ns + (self.tick_count - 1) * self.period_ns
+    
+    def stop(self):
+        """关闭timerfd"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
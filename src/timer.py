@@ -1,51 +1,230 @@
 # coding=utf-8
 import ctypes
+import functools
 import os
 import time
 
-class Timer:
-    """使用Linux内核时钟的精确定时器类"""
-    CLOCK_MONOTONIC = 1
-    CLOCK_MONOTONIC_RAW = 4
+CLOCK_MONOTONIC = 1
+CLOCK_MONOTONIC_RAW = 4
+
+
+class Timespec(ctypes.Structure):
+    _fields_ = [
+        ('tv_sec', ctypes.c_long),
+        ('tv_nsec', ctypes.c_long)
+    ]
 
-    class Timespec(ctypes.Structure):
-        _fields_ = [
-            ('tv_sec', ctypes.c_long),
-            ('tv_nsec', ctypes.c_long)
-        ]
 
-    def __init__(self):
-        # 尝试加载不同的库名以提高兼容性
+_librt = None
+
+
+def load_librt():
+    """加载librt（不同系统的库名不同，依次尝试），进程内只加载一次"""
+    global _librt
+    if _librt is None:
         try:
-            self.librt = ctypes.CDLL('librt.so.1', use_errno=True)
+            librt = ctypes.CDLL('librt.so.1', use_errno=True)
         except OSError:
             try:
-                self.librt = ctypes.CDLL('librt.so', use_errno=True)
+                librt = ctypes.CDLL('librt.so', use_errno=True)
             except OSError:
-                self.librt = ctypes.CDLL('libc.so.6', use_errno=True)
+                librt = ctypes.CDLL('libc.so.6', use_errno=True)
                 print("Using libc.so.6 for timer functions")
         
         # 设置函数参数和返回类型
-        self.librt.clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(self.Timespec)]
-        self.librt.clock_gettime.restype = ctypes.c_int
+        librt.clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+        librt.clock_gettime.restype = ctypes.c_int
+        librt.clock_nanosleep.argtypes = [ctypes.c_int, ctypes.c_int,
+                                          ctypes.POINTER(Timespec), ctypes.POINTER(Timespec)]
+        librt.clock_nanosleep.restype = ctypes.c_int
+        _librt = librt
+    return _librt
+
+
+def _clock_ns_ctypes(clock_id):
+    """通过ctypes调用clock_gettime获取整数纳秒，每次调用使用独立的结构体以保证线程安全"""
+    ts = Timespec()
+    if load_librt().clock_gettime(clock_id, ctypes.byref(ts)) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return ts.tv_sec * 1000000000 + ts.tv_nsec
+
+
+def clock_functions(clock_backend=None):
+    """
+    按时钟后端返回(CLOCK_MONOTONIC_RAW读取函数, CLOCK_MONOTONIC读取函数)，均返回整数纳秒
+    clock_backend: 'time'使用time.clock_gettime_ns，'ctypes'使用librt，默认优先使用'time'
+    """
+    if clock_backend is None:
+        clock_backend = 'time' if hasattr(time, 'clock_gettime_ns') else 'ctypes'
+    if clock_backend == 'time':
+        return (functools.partial(time.clock_gettime_ns, CLOCK_MONOTONIC_RAW),
+                functools.partial(time.clock_gettime_ns, CLOCK_MONOTONIC))
+    if clock_backend == 'ctypes':
+        return (functools.partial(_clock_ns_ctypes, CLOCK_MONOTONIC_RAW),
+                functools.partial(_clock_ns_ctypes, CLOCK_MONOTONIC))
+    raise ValueError(f"未知的时钟后端: {clock_backend}")
+
+
+# 进程内共用的时钟读取函数（默认后端）：采集线程、实验时钟和节拍源都通过它们读取时间，
+# 与默认构造的Timer使用同一后端
+raw_time_ns, monotonic_ns = clock_functions()
+
+
+class Timer:
+    """使用Linux内核时钟的精确定时器类"""
+    CLOCK_MONOTONIC = CLOCK_MONOTONIC
+    CLOCK_MONOTONIC_RAW = CLOCK_MONOTONIC_RAW
+    TIMER_ABSTIME = 1
+    Timespec = Timespec
+
+    def __init__(self, spin_margin=300e-6, clock_backend=None):
+        """
+        spin_margin: 混合等待模式中，睡眠结束后留给忙等待的时间余量（秒）
+        clock_backend: 纳秒时钟后端，'time'使用time.clock_gettime_ns，'ctypes'使用librt，
+                       默认优先使用'time'
+        """
+        self.librt = load_librt()
+        
+        # 选择纳秒时钟后端（与模块级raw_time_ns/monotonic_ns使用同一选择逻辑）
+        if clock_backend is None:
+            clock_backend = 'time' if hasattr(time, 'clock_gettime_ns') else 'ctypes'
+        self.get_raw_time_ns, self.get_monotonic_ns = clock_functions(clock_backend)
+        self.clock_backend = clock_backend
         
         # 初始化timespec结构体
         self.ts = self.Timespec()
-        self._start_time = self.get_raw_time()
+        self._start_time_ns = self.get_raw_time_ns()
+        self._start_time = self._start_time_ns * 1e-9
         
+        # 混合等待参数与最近一次唤醒误差
+        self.spin_margin = spin_margin
+        self.last_sleep_error = 0.0
+        self.last_wake_error = 0.0
+        self.last_wake_error_ns = 0
+        
+    @property
+    def start_time_ns(self):
+        """计时起点的CLOCK_MONOTONIC_RAW原始时间（整数纳秒）"""
+        return self._start_time_ns
+    
+    def set_start_time_ns(self, raw_ns):
+        """把计时起点设置为指定的CLOCK_MONOTONIC_RAW时间（整数纳秒），用于多个线程共用同一t0"""
+        self._start_time_ns = raw_ns
+        self._start_time = raw_ns * 1e-9
+    
     def get_raw_time(self):
         """获取原始时间"""
         if self.librt.clock_gettime(self.CLOCK_MONOTONIC_RAW, ctypes.byref(self.ts)) != 0:
             errno = ctypes.get_errno()
             raise OSError(errno, os.strerror(errno))
         return self.ts.tv_sec + self.ts.tv_nsec * 1e-9
-        
+    
     def get_time(self):
         """获取相对于开始时间的时间差（秒）"""
         return self.get_raw_time() - self._start_time
+    
+    def get_time_ns(self):
+        """获取相对于开始时间的时间差（整数纳秒）"""
+        return self.get_raw_time_ns() - self._start_time_ns
         
     def busy_wait(self, target_time):
         """忙等待直到目标时间"""
         target_absolute = self._start_time + target_time
         while self.get_raw_time() < target_absolute:
-            pass 
\ No newline at end of file
+            pass
+    
+    def busy_wait_ns(self, target_ns):
+        """忙等待直到目标时间（相对于开始时间的整数纳秒），返回实际时间（纳秒）"""
+        target_absolute = self._start_time_ns + target_ns
+        now = self.get_raw_time_ns()
+        while now < target_absolute:
+            now = self.get_raw_time_ns()
+        return now - self._start_time_ns
+    
+    def sleep_until_monotonic_ns(self, deadline_ns):
+        """
+        使用绝对时间clock_nanosleep睡眠到CLOCK_MONOTONIC上的deadline（整数纳秒）
+        被信号打断(EINTR)时按同一绝对时间继续睡眠
+        """
+        sleep_ts = self.Timespec()
+        sleep_ts.tv_sec, sleep_ts.tv_nsec = divmod(deadline_ns, 1000000000)
+        while True:
+            ret = self.librt.clock_nanosleep(self.CLOCK_MONOTONIC, self.TIMER_ABSTIME,
+                                             ctypes.byref(sleep_ts), None)
+            if ret == 0:
+                return
+            # clock_nanosleep直接返回错误码，而不是设置errno
+            if ret != 4:  # EINTR
+                raise OSError(ret, os.strerror(ret))
+    
+    def deadline_wait_ns(self, target_ns, spin_margin_ns=None):
+        """
+        混合等待直到目标时间：先睡眠到目标前spin_margin_ns纳秒，再忙等待剩余部分
+        target_ns: 相对于开始时间的目标时间（整数纳秒）
+        spin_margin_ns: 忙等待余量（纳秒），默认使用构造时的设置
+        返回: 唤醒误差（整数纳秒），即实际返回时间与目标时间之差
+        """
+        if spin_margin_ns is None:
+            spin_margin_ns = int(self.spin_margin * 1e9)
+        target_absolute = self._start_time_ns + target_ns
+        
+        # clock_nanosleep不支持CLOCK_MONOTONIC_RAW，因此把剩余时间换算到CLOCK_MONOTONIC上
+        remaining = target_absolute - spin_margin_ns - self.get_raw_time_ns()
+        if remaining > 0:
+            wake_deadline = self.get_monotonic_ns() + remaining
+            self.sleep_until_monotonic_ns(wake_deadline)
+            self.last_sleep_error = (self.get_monotonic_ns() - wake_deadline) * 1e-9
+        else:
+            self.last_sleep_error = 0.0
+        
+        # 最后一段忙等待，消除睡眠唤醒的不确定性
+        now = self.get_raw_time_ns()
+        while now < target_absolute:
+            now = self.get_raw_time_ns()
+        
+        self.last_wake_error_ns = now - target_absolute
+        self.last_wake_error = self.last_wake_error_ns * 1e-9
+        return self.last_wake_error_ns
+    
+    def deadline_wait(self, target_time, spin_margin=None):
+        """
+        混合等待直到目标时间：先睡眠到目标前spin_margin秒，再忙等待剩余部分
+        target_time: 相对于开始时间的目标时间（秒）
+        spin_margin: 忙等待余量（秒），默认使用构造时的设置
+        返回: 唤醒误差（秒），即实际返回时间与目标时间之差
+        """
+        spin_margin_ns = None if spin_margin is None else int(spin_margin * 1e9)
+        self.deadline_wait_ns(int(round(target_time * 1e9)), spin_margin_ns)
+        return self.last_wake_error
+
+
+def benchmark_clock_backends(iterations=100000):
+    """
+    测量各时钟读取接口的单次调用开销
+    返回: {接口名: 每次调用的平均开销（纳秒）}
+    """
+    results = {}
+    candidates = [('get_raw_time (ctypes, float)', Timer(clock_backend='ctypes').get_raw_time),
+                  ('get_raw_time_ns (ctypes)', Timer(clock_backend='ctypes').get_raw_time_ns)]
+    if hasattr(time, 'clock_gettime_ns'):
+        candidates.append(('get_raw_time_ns (time.clock_gettime_ns)',
+                           Timer(clock_backend='time').get_raw_time_ns))
+    candidates.append(('time.perf_counter_ns', time.perf_counter_ns))
+    
+    for name, read_clock in candidates:
+        # 预热
+        for _ in range(1000):
+            read_clock()
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            read_clock()
+        elapsed = time.perf_counter_ns() - start
+        results[name] = elapsed / iterations
+    return results
+
+
+if __name__ == '__main__':
+    print("时钟读取开销测试")
+    for name, overhead_ns in benchmark_clock_backends().items():
+        print(f"{name:45s} {overhead_ns:8.1f} ns/call")
@@ -0,0 +1,237 @@
+# coding=utf-8
+import os
+import queue
+import time
+import struct
+import cv2
+from threading import Thread
+
+
+def _mp4_atoms(data, start, end):
+    """遍历data[start:end]中的mp4 atom，返回{类型: (内容起始位置, atom结束位置)}"""
+    atoms = {}
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            break
+        atoms.setdefault(kind, (offset + header, offset + size))
+        offset += size
+    return atoms
+
+
+def _scale_field(data, offset, wide, scale):
+    """把offset处的32位（wide时为64位）时长按scale缩放"""
+    fmt = '>Q' if wide else '>I'
+    value = struct.unpack_from(fmt, data, offset)[0]
+    struct.pack_into(fmt, data, offset, int(round(value * scale)))
+
+
+def rewrite_mp4_fps(video_filename, fps):
+    """
+    原地修改mp4文件的播放帧率，不重新编码
+    只适用于cv2.VideoWriter写出的单视频轨道、每帧时长相同的mp4：修改轨道mdhd的时间刻度，
+    并按同一比例缩放mvhd、tkhd和elst中以影片时间刻度表示的时长
+    返回是否修改成功
+    """
+    with open(video_filename, 'r+b') as f:
+        # 顶层atom中的moov（cv2写出的mp4中位于文件末尾）
+        file_size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while True:
+            if offset + 8 > file_size:
+                return False
+            f.seek(offset)
+            size, kind = struct.unpack('>I4s', f.read(8))
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+            elif size == 0:
+                size = file_size - offset
+            if size < 8:
+                return False
+            if kind == b'moov':
+                break
+            offset += size
+        moov = bytearray(f.read(size - (f.tell() - offset)))
+
+        movie = _mp4_atoms(moov, 0, len(moov))
+        track = _mp4_atoms(moov, *movie.get(b'trak', (0, 0)))
+        media = _mp4_atoms(moov, *track.get(b'mdia', (0, 0)))
+        sample_table = _mp4_atoms(moov, *_mp4_atoms(moov, *media.get(b'minf', (0, 0))).get(b'stbl', (0, 0)))
+        if not all(kind in atoms for atoms, kind in ((movie, b'mvhd'), (track, b'tkhd'),
+                                                      (media, b'mdhd'), (sample_table, b'stts'))):
+            return False
+
+        # 视频帧率 = mdhd时间刻度 / 每帧时长（stts第一项）
+        mdhd = media[b'mdhd'][0]
+        timescale_offset = mdhd + (20 if moov[mdhd] == 1 else 12)
+        timescale = struct.unpack_from('>I', moov, timescale_offset)[0]
+        entry_count, _, frame_duration = struct.unpack_from('>III', moov, sample_table[b'stts'][0] + 4)
+        new_timescale = int(round(fps * frame_duration))
+        if entry_count == 0 or frame_duration == 0 or new_timescale <= 0:
+            return False
+        struct.pack_into('>I', moov, timescale_offset, new_timescale)
+        scale = timescale / new_timescale
+
+        # 以影片时间刻度表示的时长：mvhd、tkhd和编辑列表elst中的各段时长
+        mvhd = movie[b'mvhd'][0]
+        _scale_field(moov, mvhd + (24 if moov[mvhd] == 1 else 16), moov[mvhd] == 1, scale)
+        tkhd = track[b'tkhd'][0]
+        _scale_field(moov, tkhd + (28 if moov[tkhd] == 1 else 20), moov[tkhd] == 1, scale)
+        edit_list = _mp4_atoms(moov, *track.get(b'edts', (0, 0))).get(b'elst')
+        if edit_list is not None:
+            elst = edit_list[0]
+            wide = moov[elst] == 1
+            for k in range(struct.unpack_from('>I', moov, elst + 4)[0]):
+                _scale_field(moov, elst + 8 + k * (20 if wide else 12), wide, scale)
+
+        f.seek(offset + size - len(moov))
+        f.write(moov)
+    return True
+
+
+class StreamingVideoEncoder:
+    """
+    流式视频编码器
+    相机线程把帧放入有界队列后立即返回，后台编码线程边录制边写入mp4，
+    队列满时丢弃新帧并计数，不阻塞相机线程
+    """
+    def __init__(self, video_filename, fps=100.0, queue_size=256, total_frames=None):
+        """
+        video_filename: 输出视频文件路径
+        fps: 视频帧率（与相机采集帧率一致），实际帧率与之相差超过1%时finish()按帧时间戳改写视频帧率
+        queue_size: 队列容量（帧），超过时丢帧
+        total_frames: 预计总帧数，仅用于叠加进度信息
+        """
+        self.video_filename = video_filename
+        self.fps = fps
+        self.queue_size = queue_size
+        self.total_frames = total_frames
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.high_water = max(1, queue_size * 3 // 4)
+
+        # 统计信息
+        self.submitted_frames = 0
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.backpressure_events = 0  # 提交时队列深度超过高水位的次数
+        self.max_queue_depth = 0
+        self.finish_time = 0.0  # 停止录制后写完剩余帧所用时间（秒）
+        self.first_timestamp = None  # 第一帧和最后一帧写入帧的时间戳（秒），用于计算实际帧率
+        self.last_timestamp = None
+        self.actual_fps = None
+
+        self.video_writer = None
+        self.worker = None
+        self.error = None
+
+    def start(self):
+        """启动后台编码线程"""
+        self.worker = Thread(target=self._encode_loop, name="video-encoder")
+        self.worker.daemon = True
+        self.worker.start()
+
+    def submit(self, frame, timestamp):
+        """
+        提交一帧（相机线程调用，不阻塞）
+        frame: 灰度帧，调用方需保证其内容在编码前不会被改写（如先copy）
+        返回是否成功入队
+        """
+        depth = self.frame_queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        if depth >= self.high_water:
+            self.backpressure_events += 1
+
+        try:
+            self.frame_queue.put_nowait((self.submitted_frames, frame, timestamp))
+        except queue.Full:
+            self.dropped_frames += 1
+            return False
+
+        self.submitted_frames += 1
+        return True
+
+    def _open_writer(self, frame_width, frame_height):
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self.video_writer = cv2.VideoWriter(
+            self.video_filename,
+            fourcc,
+            self.fps,
+            (frame_width, frame_height)
+        )
+        if not self.video_writer.isOpened():
+            raise RuntimeError("无法创建视频写入器")
+
+    def _encode_loop(self):
+        """后台编码线程：逐帧叠加信息并写入视频"""
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                break
+
+            if self.error is not None:
+                continue  # 写入器出错后仍继续取空队列，直到收到结束标记
+
+            index, frame, timestamp = item
+            try:
+                if self.video_writer is None:
+                    self._open_writer(frame.shape[1], frame.shape[0])
+
+                frame_color = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                cv2.putText(frame_color, f"Time: {timestamp:.2f}s", (10, 30),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+                if self.total_frames:
+                    progress = (index / self.total_frames) * 100
+                    cv2.putText(frame_color, f"Progress: {progress:.1f}%", (10, 60),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+                self.video_writer.write(frame_color)
+                self.written_frames += 1
+                if self.first_timestamp is None:
+                    self.first_timestamp = timestamp
+                self.last_timestamp = timestamp
+            except Exception as e:
+                self.error = e
+                print(f"流式编码第 {index} 帧时出错: {e}")
+
+    def finish(self):
+        """停止接收新帧，等待队列中剩余帧写完并关闭视频文件"""
+        if self.worker is None:
+            return
+
+        start = time.perf_counter()
+        self.frame_queue.put(None)
+        self.worker.join()
+        self.worker = None
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+            
+            # 写入器按预设帧率打开，实际采集帧率不同时（丢帧、相机帧率变化）按时间戳改写，使视频时长与实验一致
+            if self.written_frames > 1 and self.last_timestamp > self.first_timestamp:
+                self.actual_fps = (self.written_frames - 1) / (self.last_timestamp - self.first_timestamp)
+                if abs(self.actual_fps / self.fps - 1) > 0.01:
+                    try:
+                        if rewrite_mp4_fps(self.video_filename, self.actual_fps):
+                            print(f"视频帧率已由 {self.fps:g} fps 改为实际帧率 {self.actual_fps:.2f} fps")
+                        else:
+                            print(f"无法改写视频帧率，视频按 {self.fps:g} fps 播放（实际 {self.actual_fps:.2f} fps）")
+                    except OSError as e:
+                        print(f"改写视频帧率失败: {e}")
+        self.finish_time = time.perf_counter() - start
+
+    def print_stats(self):
+        """打印编码统计信息"""
+        print(f"流式编码: 写入 {self.written_frames} 帧, 丢弃 {self.dropped_frames} 帧, "
+              f"队列最大深度 {self.max_queue_depth}/{self.queue_size}, "
+              f"背压次数 {self.backpressure_events}, 收尾耗时 {self.finish_time:.2f}s")
+        if os.path.exists(self.video_filename):
+            file_size = os.path.getsize(self.video_filename)
+            print(f"视频已保存到: {self.video_filename} ({file_size / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,253 @@
+# coding=utf-8
+import math
+import cv2
+import numpy as np
+
+class OverlayRenderer:
+    """
+    视频数据叠加渲染器
+    按帧时间戳在控制数据中查找对应的采样点，在画面下方的面板中叠加设定值标记、实际位置、PID输出和各通道压力。
+    面板底色、坐标轴、刻度和标签在构造时渲染一次，字符预先渲染为小图块，
+    每帧只拷贝静态面板并绘制标记、进度条和数字，render()可在多个线程中并行调用
+    """
+    PANEL_COLOR = (32, 32, 32)
+    TEXT_COLOR = (230, 230, 230)
+    AXIS_COLOR = (150, 150, 150)
+    SETPOINT_COLOR = (0, 255, 255)
+    POSITION_COLOR = (0, 255, 0)
+    OUTPUT_COLOR = (0, 140, 255)
+    PRESSURE_COLOR = (255, 160, 0)
+    GLYPH_CHARS = "0123456789.-+eainf "
+    FIELD_WIDTH = 8  # 数值字段的字符数
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+    FONT_SCALE = 0.42
+
+    def __init__(self, time_data, setpoint_data, position_data, output_data,
+                 pressure_data=None, pressure_names=None, frame_shape=(480, 640),
+                 position_range=None, output_range=(0.0, 3.3), pressure_range=None):
+        """
+        time_data: 控制数据的时间（秒，与帧时间戳使用同一实验时钟）
+        setpoint_data/position_data: 设定值和实际位置（mm）
+        output_data: PID输出电压（V）
+        pressure_data: 校准压力，形状为(数据点数, 通道数)，可为None
+        pressure_names: 各压力通道名称
+        frame_shape: 帧尺寸(H, W)，render()只接受该尺寸的帧，其他尺寸用for_shape()创建新的渲染器
+        position_range/pressure_range: 坐标范围(最小, 最大)，默认按数据自动确定
+        """
+        self.time_data = np.asarray(time_data, dtype=np.float64)
+        self.setpoint_data = np.asarray(setpoint_data, dtype=np.float64)
+        self.position_data = np.asarray(position_data, dtype=np.float64)
+        self.output_data = np.asarray(output_data, dtype=np.float64)
+        if pressure_data is not None and np.size(pressure_data) > 0:
+            self.pressure_data = np.asarray(pressure_data, dtype=np.float64).reshape(len(self.time_data), -1)
+        else:
+            self.pressure_data = np.zeros((len(self.time_data), 0))
+        n_pressures = self.pressure_data.shape[1]
+        self.pressure_names = list(pressure_names or [f"P{k}" for k in range(n_pressures)])[:n_pressures]
+
+        self.frame_height, self.frame_width = frame_shape
+        self.position_range = position_range or self._auto_range(
+            np.concatenate((self.setpoint_data, self.position_data)))
+        self.output_range = output_range
+        self.pressure_range = pressure_range or self._auto_range(self.pressure_data)
+
+        self._build_glyphs()
+        self._build_layout()
+        if self.panel_top < 0 or self.bar_right - self.bar_left < 20:
+            raise ValueError(f"帧尺寸{tuple(frame_shape)}太小，放不下数据面板")
+        self._build_static_layer()
+
+    def for_shape(self, frame_shape):
+        """用相同的数据和坐标范围创建适用于另一帧尺寸的渲染器"""
+        return OverlayRenderer(self.time_data, self.setpoint_data, self.position_data, self.output_data,
+                               pressure_data=self.pressure_data, pressure_names=self.pressure_names,
+                               frame_shape=frame_shape, position_range=self.position_range,
+                               output_range=self.output_range, pressure_range=self.pressure_range)
+
+    @classmethod
+    def from_experiment_runner(cls, experiment_runner, frame_shape=(480, 640), **kwargs):
+        """用ExperimentRunner记录的数据创建渲染器，裁剪到有效长度（与DataProcessor相同）"""
+        time_data = np.asarray(experiment_runner.time_data)
+        valid_indices = np.where(time_data > 0)[0]
+        n = valid_indices[-1] + 1 if len(valid_indices) > 0 else 0
+
+        pressure_data = None
+        if len(experiment_runner.pressure_channels) > 0:
+            pressure_data = experiment_runner.calibrated_pressures()[:n]
+        return cls(time_data[:n],
+                   np.asarray(experiment_runner.setpoint_data)[:n],
+                   np.asarray(experiment_runner.position_data)[:n],
+                   np.asarray(experiment_runner.output_data)[:n],
+                   pressure_data=pressure_data,
+                   pressure_names=experiment_runner.pressure_channel_names,
+                   frame_shape=frame_shape, **kwargs)
+
+    @staticmethod
+    def _auto_range(values):
+        """按数据范围加5%余量确定坐标范围，忽略NaN（读取失败的压力等），没有有效值时为(0, 1)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return (0.0, 1.0)
+        low, high = float(np.min(values)), float(np.max(values))
+        margin = max((high - low) * 0.05, 1e-3)
+        return (low - margin, high + margin)
+
+    def _build_glyphs(self):
+        """把数字字符预先渲染为等宽图块"""
+        widths = [cv2.getTextSize(ch, self.FONT, self.FONT_SCALE, 1)[0][0] for ch in self.GLYPH_CHARS]
+        (_, ascent), baseline = cv2.getTextSize("0", self.FONT, self.FONT_SCALE, 1)
+        self.glyph_width = max(widths) + 1
+        self.glyph_height = ascent + baseline + 2
+        self.glyphs = {}
+        for ch in self.GLYPH_CHARS:
+            tile = np.empty((self.glyph_height, self.glyph_width, 3), dtype=np.uint8)
+            tile[:] = self.PANEL_COLOR
+            cv2.putText(tile, ch, (0, ascent + 1), self.FONT, self.FONT_SCALE, self.TEXT_COLOR, 1, cv2.LINE_AA)
+            self.glyphs[ch] = tile
+
+    def _build_layout(self):
+        """计算面板中各元素的位置"""
+        row = self.glyph_height + 6
+        self.bar_left = 70
+        self.value_x = self.frame_width - self.FIELD_WIDTH * self.glyph_width - 6  # 进度条右侧留出数值字段
+        self.bar_right = self.value_x - 8
+
+        # 面板自上而下：数值行、位置坐标轴（含刻度标签）、PID输出条、各通道压力条
+        panel_height = row + 44 + row * (1 + self.pressure_data.shape[1]) + 6
+        self.panel_top = self.frame_height - panel_height
+        y = self.panel_top + 4
+        self.values_y = y
+        y += row
+        self.axis_y = y + 14
+        y += 44
+        self.output_y = y
+        y += row
+        self.pressure_y = [y + k * row for k in range(self.pressure_data.shape[1])]
+        self.bar_height = self.glyph_height
+
+        # 数值行中各数字的位置（标签在静态层中绘制）
+        self.value_fields = {}
+        x = 8
+        for key, label in (('time', 't(s)'), ('setpoint', 'SP'), ('position', 'Pos'), ('error', 'Err')):
+            label_width = cv2.getTextSize(label, self.FONT, self.FONT_SCALE, 1)[0][0]
+            self.value_fields[key] = (x, x + label_width + 4)
+            x += label_width + 4 + self.FIELD_WIDTH * self.glyph_width + 10
+
+    def _scale(self, value, value_range):
+        """把数值映射到进度条的横坐标，数值为NaN或无穷大时返回None"""
+        if not math.isfinite(value):
+            return None
+        low, high = value_range
+        ratio = (value - low) / (high - low) if high > low else 0.0
+        ratio = min(max(ratio, 0.0), 1.0)
+        return int(round(self.bar_left + ratio * (self.bar_right - self.bar_left)))
+
+    def _put_label(self, image, text, x, y):
+        """在静态层中绘制标签（y为面板内的行顶部）"""
+        (_, ascent), _ = cv2.getTextSize(text, self.FONT, self.FONT_SCALE, 1)
+        cv2.putText(image, text, (x, y + ascent + 1), self.FONT, self.FONT_SCALE, self.TEXT_COLOR, 1, cv2.LINE_AA)
+
+    def _build_static_layer(self):
+        """渲染面板底色、坐标轴、刻度、标签和进度条边框"""
+        top = self.panel_top
+        layer = np.empty((self.frame_height - top, self.frame_width, 3), dtype=np.uint8)
+        layer[:] = self.PANEL_COLOR
+
+        for key, label in (('time', 't(s)'), ('setpoint', 'SP'), ('position', 'Pos'), ('error', 'Err')):
+            self._put_label(layer, label, self.value_fields[key][0], self.values_y - top)
+
+        # 位置坐标轴和刻度
+        axis_y = self.axis_y - top
+        self._put_label(layer, "x(mm)", 8, axis_y - self.glyph_height // 2)
+        cv2.line(layer, (self.bar_left, axis_y), (self.bar_right, axis_y), self.AXIS_COLOR, 1)
+        for tick in np.linspace(self.position_range[0], self.position_range[1], 6):
+            x = self._scale(tick, self.position_range)
+            cv2.line(layer, (x, axis_y - 4), (x, axis_y + 4), self.AXIS_COLOR, 1)
+            text = f"{tick:.0f}"
+            text_width = cv2.getTextSize(text, self.FONT, self.FONT_SCALE, 1)[0][0]
+            self._put_label(layer, text, x - text_width // 2, axis_y + 12)
+
+        # PID输出和压力进度条边框
+        self._put_label(layer, "u(V)", 8, self.output_y - top)
+        cv2.rectangle(layer, (self.bar_left, self.output_y - top),
+                      (self.bar_right, self.output_y - top + self.bar_height), self.AXIS_COLOR, 1)
+        for name, y in zip(self.pressure_names, self.pressure_y):
+            self._put_label(layer, f"{name}(Bar)", 8, y - top)
+            cv2.rectangle(layer, (self.bar_left, y - top), (self.bar_right, y - top + self.bar_height),
+                          self.AXIS_COLOR, 1)
+        self.static_layer = layer
+
+    def format_number(self, value, decimals):
+        """把数值格式化为FIELD_WIDTH个字符：放不下时减少小数位，仍放不下时改用科学计数法"""
+        width = self.FIELD_WIDTH
+        for d in range(decimals, -1, -1):
+            text = f"{value:{width}.{d}f}"
+            if len(text) <= width:
+                return text
+        for d in (2, 1, 0):
+            text = f"{value:{width}.{d}e}"
+            if len(text) <= width:
+                return text
+        return text[:width]
+
+    def draw_number(self, image, x, y, text):
+        """逐字符拷贝预渲染的图块，超出画面的字符不绘制"""
+        gw, gh = self.glyph_width, self.glyph_height
+        if y < 0 or y + gh > image.shape[0]:
+            return
+        for ch in text:
+            if x < 0 or x + gw > image.shape[1]:
+                break
+            glyph = self.glyphs.get(ch)
+            if glyph is not None:
+                image[y:y + gh, x:x + gw] = glyph
+            x += gw
+
+    def sample_index(self, timestamp):
+        """返回时间不晚于timestamp的最后一个控制数据点，没有时返回-1"""
+        return int(np.searchsorted(self.time_data, timestamp, side='right')) - 1
+
+    def _draw_bar(self, image, y, value, value_range, color):
+        # 读取失败的数据点（NaN）不画进度条，只显示nan
+        x = self._scale(value, value_range)
+        if x is not None and x > self.bar_left + 1:
+            cv2.rectangle(image, (self.bar_left + 1, y + 1), (x, y + self.bar_height - 1), color, -1)
+        self.draw_number(image, self.value_x, y, self.format_number(value, 3))
+
+    def render(self, frame, timestamp):
+        """
+        在灰度帧上叠加控制数据，返回BGR帧
+        frame: 灰度帧（不修改），尺寸须与构造时的frame_shape相同
+        timestamp: 帧时间戳（秒）
+        """
+        if frame.shape[:2] != (self.frame_height, self.frame_width):
+            raise ValueError(f"帧尺寸{frame.shape[:2]}与叠加面板尺寸{(self.frame_height, self.frame_width)}不一致，"
+                             f"请用for_shape()创建对应尺寸的渲染器")
+        frame_color = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        frame_color[self.panel_top:] = self.static_layer
+
+        self.draw_number(frame_color, self.value_fields['time'][1], self.values_y, self.format_number(timestamp, 2))
+        k = self.sample_index(timestamp)
+        if k < 0:
+            return frame_color
+
+        setpoint = self.setpoint_data[k]
+        position = self.position_data[k]
+        self.draw_number(frame_color, self.value_fields['setpoint'][1], self.values_y, self.format_number(setpoint, 2))
+        self.draw_number(frame_color, self.value_fields['position'][1], self.values_y, self.format_number(position, 2))
+        self.draw_number(frame_color, self.value_fields['error'][1], self.values_y,
+                         self.format_number(setpoint - position, 2))
+
+        # 设定值为竖线，实际位置为圆点
+        x = self._scale(setpoint, self.position_range)
+        if x is not None:
+            cv2.line(frame_color, (x, self.axis_y - 9), (x, self.axis_y + 9), self.SETPOINT_COLOR, 2)
+        x = self._scale(position, self.position_range)
+        if x is not None:
+            cv2.circle(frame_color, (x, self.axis_y), 5, self.POSITION_COLOR, -1)
+
+        self._draw_bar(frame_color, self.output_y, self.output_data[k], self.output_range, self.OUTPUT_COLOR)
+        for c, y in enumerate(self.pressure_y):
+            self._draw_bar(frame_color, y, self.pressure_data[k, c], self.pressure_range, self.PRESSURE_COLOR)
+        return frame_color
@@ -0,0 +1,45 @@
+# coding=utf-8
+"""OverlayRenderer在压力读取失败（NaN）时的渲染"""
+import numpy as np
+from src.video_overlay import OverlayRenderer
+
+
+def _renderer(pressure_range=None):
+    time_data = np.arange(1, 101) * 0.01
+    n = len(time_data)
+    pressure = np.column_stack((np.linspace(0.5, 1.5, n), np.full(n, 1.0)))
+    pressure[10, 0] = np.nan   # 单个读取失败的数据点
+    pressure[:, 1] = np.nan    # 整个通道读取失败
+    return OverlayRenderer(time_data, np.full(n, 100.0), np.full(n, 120.0), np.full(n, 1.5),
+                           pressure_data=pressure, pressure_names=['A0', 'A1'],
+                           pressure_range=pressure_range)
+
+
+def _bar_pixels(renderer, image, channel):
+    """压力进度条内部被填充的像素数"""
+    y = renderer.pressure_y[channel]
+    inside = image[y + 2:y + renderer.bar_height - 2, renderer.bar_left + 2:renderer.bar_right - 2]
+    return int(np.sum(np.all(inside == renderer.PRESSURE_COLOR, axis=-1)))
+
+
+def test_auto_range_ignores_nan():
+    renderer = _renderer()
+    low, high = renderer.pressure_range
+    assert np.isfinite(low) and np.isfinite(high)
+    assert low < 0.5 and high > 1.5
+    assert OverlayRenderer._auto_range(np.full(5, np.nan)) == (0.0, 1.0)
+
+
+def test_render_with_nan_pressures():
+    frame = np.zeros((480, 640), dtype=np.uint8)
+    for pressure_range in (None, (0.0, 2.0)):
+        renderer = _renderer(pressure_range)
+        # 有效数据点正常画出进度条，NaN通道不画
+        image = renderer.render(frame, 0.5)
+        assert image.shape == (480, 640, 3)
+        assert _bar_pixels(renderer, image, 0) > 0
+        assert _bar_pixels(renderer, image, 1) == 0
+        # NaN数据点不抛出异常，也不画进度条
+        image = renderer.render(frame, 0.11)
+        assert _bar_pixels(renderer, image, 0) == 0
+    assert renderer.format_number(np.nan, 3).strip() == 'nan'